@@ -0,0 +1,94 @@
+"""Startup benchmark for the `dopy` entry points.
+
+Compares the Typer app (`dopy.app`) with the fast dispatch path
+(`dopy.cli`) in two ways:
+
+* the import cost reported by `python -X importtime`, and
+* the wall time of running a trivial command end to end.
+
+Run it from the repository root with `python benchmarks/startup.py`.
+"""
+
+from __future__ import annotations
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RUNS = 20
+
+IMPORTS = {
+    "typer app": "import dopy.app",
+    "fast path": "import dopy.cli, dopy.command_loader, dopy.command_utils",
+}
+
+ENTRY_POINTS = {
+    "typer app": "from dopy.app import app; app(args=['noop'], prog_name='dopy')",
+    "fast path": "import sys; from dopy.cli import main; sys.exit(main(['noop']))",
+}
+
+DO_PY = """
+from dopy import command
+
+@command
+def noop():
+    pass
+"""
+
+
+def import_time_us(
+    statement: str, cwd: str, env: dict[str, str]
+) -> tuple[int, list[str]]:
+    """Return the total import time in microseconds and the modules imported."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=cwd,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total = 0
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, _, name = line[len("import time:") :].split("|")
+        total += int(self_us)
+        modules.append(name.strip())
+    return total, modules
+
+
+def wall_time_ms(statement: str, cwd: str, env: dict[str, str]) -> float:
+    """Return the median wall time of running `statement` in a fresh process."""
+    samples = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", statement], cwd=cwd, env=env, check=True)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "do.py"), "w") as f:
+            f.write(DO_PY)
+        env = dict(os.environ, DOPY_HOME=tmp, PYTHONPATH=root)
+
+        print(f"{'':10} {'imports':>10} {'typer/rich':>11} {'wall (median)':>14}")
+        for label, statement in IMPORTS.items():
+            total_us, modules = import_time_us(statement, tmp, env)
+            heavy = any(m in ("typer", "rich") for m in modules)
+            wall = wall_time_ms(ENTRY_POINTS[label], tmp, env)
+            print(
+                f"{label:10} {total_us / 1000:>8.1f}ms {'yes' if heavy else 'no':>11}"
+                f" {wall:>12.1f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
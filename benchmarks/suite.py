@@ -0,0 +1,292 @@
+"""Benchmark suite for dopy's own hot paths.
+
+Times cold and warm startup of `dopy`, `load_commands` on large
+synthetic `do.py` files, `parse_args`/`split_commands` over long argv,
+argument conversion for every supported annotation and completion latency.
+
+Results are written as JSON and compared against a saved baseline:
+
+    python benchmarks/suite.py                   # run, compare, write results
+    python benchmarks/suite.py --save-baseline   # run and store as baseline
+    python benchmarks/suite.py --quick           # smaller sizes, fewer runs
+
+The exit code is 1 when a benchmark is slower than the baseline by more
+than `--threshold` (a fraction, 0.25 by default).
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import inspect
+import json
+import os
+import pathlib
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+RESULTS = os.path.join(ROOT, "bench_output.json")
+
+
+def measure(fn: Callable[[], object], runs: int, setup=None) -> dict[str, float]:
+    """Call `fn` `runs` times and return median/min/max seconds per call."""
+    samples = []
+    for _ in range(runs):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return {
+        "median": statistics.median(samples),
+        "min": min(samples),
+        "max": max(samples),
+        "runs": runs,
+    }
+
+
+def synthetic_do_py(count: int) -> str:
+    parts = ["from dopy import command, sh\n"]
+    for i in range(count):
+        decorator = "@sh" if i % 2 else "@command"
+        parts.append(
+            f"\n{decorator}\ndef task_{i}(name: str, count: int = 1, "
+            f"tags: list[str] = []):\n"
+            f'    """Synthetic task number {i}."""\n'
+            f"    return 'true'\n"
+        )
+    return "".join(parts)
+
+
+def bench_startup(runs: int, tmp: str) -> dict[str, dict[str, float]]:
+    """Wall time of `dopy` (the command listing) in a fresh interpreter.
+
+    Cold runs start with an empty `DOPY_HOME`, so the command index has to be
+    built by importing `do.py`; warm runs reuse the index of the first run.
+    """
+    project = os.path.join(tmp, "startup")
+    os.makedirs(project, exist_ok=True)
+    with open(os.path.join(project, "do.py"), "w") as f:
+        f.write(synthetic_do_py(100))
+    statement = [
+        sys.executable,
+        "-c",
+        "from dopy.app import app; app(args=[], prog_name='dopy')",
+    ]
+
+    def run(home: str) -> None:
+        subprocess.run(
+            statement,
+            cwd=project,
+            env=dict(os.environ, DOPY_HOME=home, PYTHONPATH=ROOT),
+            stdout=subprocess.DEVNULL,
+            check=False,
+        )
+
+    counter = iter(range(runs))
+    warm_home = os.path.join(tmp, "home-warm")
+    run(warm_home)
+    return {
+        "startup.cold": measure(
+            lambda: run(os.path.join(tmp, f"home-cold-{next(counter)}")), runs
+        ),
+        "startup.warm": measure(lambda: run(warm_home), runs),
+    }
+
+
+def bench_load_commands(
+    sizes: list[int], runs: int, tmp: str
+) -> dict[str, dict[str, float]]:
+    from dopy import command_loader
+    from dopy.command import COMMANDS, DEPENDENCIES, OPTIONS
+
+    results = {}
+    cwd = os.getcwd()
+    for size in sizes:
+        project = os.path.join(tmp, f"project-{size}")
+        os.makedirs(project, exist_ok=True)
+        with open(os.path.join(project, "do.py"), "w") as f:
+            f.write(synthetic_do_py(size))
+        os.chdir(project)
+        try:
+
+            def reset() -> None:
+                for registry in (COMMANDS, DEPENDENCIES, OPTIONS):
+                    registry.clear()
+
+            command_loader.load_commands()  # compile the bytecode once
+            results[f"load_commands.{size}"] = measure(
+                command_loader.load_commands, runs, reset
+            )
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+def _register(count: int) -> list[str]:
+    from dopy.command import COMMANDS, DEPENDENCIES, OPTIONS, command
+
+    for registry in (COMMANDS, DEPENDENCIES, OPTIONS):
+        registry.clear()
+    names = []
+    for i in range(count):
+
+        def task(name: str, count: int = 1, tags: list[str] | None = None):
+            """Synthetic task."""
+
+        task.__name__ = f"task_{i}"
+        command(task)
+        names.append(task.__name__)
+    return names
+
+
+def bench_parse_args(length: int, runs: int) -> dict[str, dict[str, float]]:
+    from dopy.command_utils import parse_args, split_commands
+
+    names = _register(1000)
+    argv = []
+    while len(argv) < length:
+        i = len(argv) % len(names)
+        argv += [names[i], f"value{i}", f"count={i}", "tags=a,b,c"]
+    positional = [token for token in argv if "=" not in token]
+    return {
+        f"parse_args.{len(argv)}": measure(lambda: parse_args(argv), runs),
+        f"split_commands.{len(positional)}": measure(
+            lambda: split_commands(positional), runs
+        ),
+    }
+
+
+def bench_convert_value(calls: int, runs: int) -> dict[str, dict[str, float]]:
+    from dopy.command_utils import _convert_value
+
+    cases = {
+        "bool": (bool, "yes"),
+        "int": (int, "42"),
+        "float": (float, "3.14"),
+        "str": (str, "text"),
+        "Path": (pathlib.Path, "/tmp/file"),
+        "datetime": (datetime.datetime, "2024-01-02 03:04:05"),
+        "list[int]": (list[int], "1,2,3,4"),
+        "set[str]": (set[str], "a,b,c"),
+        "tuple[float, ...]": (tuple[float, ...], "1.5,2.5"),
+        "unannotated": (inspect.Parameter.empty, "raw"),
+    }
+    results = {}
+    for label, (annotation, value) in cases.items():
+
+        def convert(annotation=annotation, value=value) -> None:
+            for _ in range(calls):
+                _convert_value(value, annotation)
+
+        results[f"convert_value.{label}"] = measure(convert, runs)
+    return results
+
+
+def bench_complete(count: int, runs: int) -> dict[str, dict[str, float]]:
+    from types import SimpleNamespace
+
+    from dopy.command_helper import complete_commands
+
+    names = _register(count)
+    commands_ctx = SimpleNamespace(params={"args": []})
+    params_ctx = SimpleNamespace(params={"args": [names[0], "x", "count", "=", "2"]})
+    return {
+        f"complete.commands.{count}": measure(
+            lambda: complete_commands(commands_ctx, "task_1"), runs
+        ),
+        f"complete.params.{count}": measure(
+            lambda: complete_commands(params_ctx, ""), runs
+        ),
+    }
+
+
+def run_suite(quick: bool) -> dict[str, dict[str, float]]:
+    runs = 3 if quick else 10
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        # Keep the index and caches of the benchmarked code out of ~/.dopy.
+        os.environ["DOPY_HOME"] = tmp
+        sys.path.insert(0, ROOT)
+        results.update(bench_startup(runs, tmp))
+        sizes = [1000] if quick else [1000, 10000]
+        results.update(bench_load_commands(sizes, runs, tmp))
+        results.update(bench_parse_args(1000 if quick else 10000, runs))
+        results.update(bench_convert_value(1000 if quick else 10000, runs))
+        results.update(bench_complete(1000, runs))
+    return results
+
+
+def compare(
+    results: dict[str, dict[str, float]],
+    baseline: dict[str, dict[str, float]],
+    threshold: float,
+) -> list[str]:
+    """Print every benchmark next to its baseline and return the regressions."""
+    regressions = []
+    print(f"{'benchmark':36} {'median':>12} {'baseline':>12} {'change':>8}")
+    for name, result in results.items():
+        median = result["median"]
+        base = baseline.get(name, {}).get("median")
+        if base:
+            change = median / base - 1
+            flag = "  REGRESSION" if change > threshold else ""
+            if flag:
+                regressions.append(name)
+            print(
+                f"{name:36} {median * 1000:>10.3f}ms {base * 1000:>10.3f}ms"
+                f" {change:>+8.1%}{flag}"
+            )
+        else:
+            print(f"{name:36} {median * 1000:>10.3f}ms {'-':>12} {'-':>8}")
+    return regressions
+
+
+def parse_cli(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--quick", action="store_true", help="smaller, faster run")
+    parser.add_argument("--output", default=RESULTS, help="where to write results")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline JSON file")
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="store results as baseline"
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=0.25, help="allowed slowdown (fraction)"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_cli(argv)
+    results = run_suite(args.quick)
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "quick": args.quick,
+        "results": results,
+    }
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.threshold)
+    target = args.baseline if args.save_baseline else args.output
+    with open(target, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {target}")
+    if regressions:
+        print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
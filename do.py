@@ -9,7 +9,7 @@ def uv(fun):
         return "uv run " + fun(*args, **kwargs)
     return wrapper
 
-@sh
+@sh(inputs=["dopy/**/*.py", "pyproject.toml", "README.md", "LICENSE"], outputs="dist/*")
 def build():
     """Build"""
     return "uv build"
@@ -39,8 +39,9 @@ def formatter():
     return "ruff format dopy"
 
 @command
-def lint_all(): 
+def lint_all():
     """Formatter + Linter + type_checker"""
+    # In this order: the checks must see the formatted files.
     formatter()
     linter()
     type_checker()
@@ -57,6 +58,19 @@ def coverage():
     """Run tests with coverage"""
     return "pytest --cov=dopy --cov-report=term-missing"
 
+@sh
+@uv
+def bench_startup():
+    """Benchmark dopy startup (typer app vs fast dispatch path)"""
+    return "python benchmarks/startup.py"
+
+@sh
+@uv
+def bench(save_baseline: bool = False, quick: bool = False):
+    """Run the benchmark suite and compare it against the saved baseline"""
+    flags = " --save-baseline" * save_baseline + " --quick" * quick
+    return "python benchmarks/suite.py" + flags
+
 @sh
 def install_dev_dependencies():
     """Install dependencies for developing the project"""
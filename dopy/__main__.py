@@ -1,4 +1,6 @@
-from dopy.app import app
+import sys
+
+from dopy.cli import main
 
 if __name__ == "__main__":
-    app()
+    sys.exit(main())
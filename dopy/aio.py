@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import asyncio
+import inspect
+import os
+import threading
+from collections.abc import Awaitable, Callable
+from concurrent.futures import Future
+from functools import wraps
+from typing import Any, TextIO
+
+from dopy import output
+
+_loop: asyncio.AbstractEventLoop | None = None
+_thread: threading.Thread | None = None
+_lock = threading.Lock()
+
+
+def shared_loop() -> asyncio.AbstractEventLoop:
+    """Return the event loop shared by all async commands of this process.
+
+    It runs in a daemon thread that is started on first use, so async
+    commands called from the main thread and from `-j` worker threads all
+    overlap on the same loop.
+    """
+    global _loop, _thread
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            _thread = threading.Thread(
+                target=_loop.run_forever, name="dopy-asyncio", daemon=True
+            )
+            _thread.start()
+        return _loop
+
+
+def _forget_loop() -> None:
+    # The loop thread does not survive fork (daemon, watch mode).
+    global _loop, _thread
+    _loop = _thread = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_loop)
+
+
+def in_shared_loop() -> bool:
+    """Return True when called from a coroutine running on the shared loop."""
+    return _thread is not None and threading.current_thread() is _thread
+
+
+async def _with_sink(awaitable: Awaitable, sink: TextIO | None) -> Any:
+    if sink is not None:
+        # Each task has its own context, so this only affects this command.
+        output.task_sink.set(sink)
+    return await awaitable
+
+
+def run(awaitable: Awaitable) -> Any:
+    """Run `awaitable` on the shared loop and block until it is done.
+
+    Output is sent to the caller's sink (see `dopy.output.capture`). On
+    Ctrl-C the task is cancelled, giving it the chance to stop its
+    subprocesses, before `KeyboardInterrupt` is re-raised.
+    """
+    from dopy.process import KILL_GRACE_PERIOD
+
+    future: Future = asyncio.run_coroutine_threadsafe(
+        _with_sink(awaitable, output.current_sink()), shared_loop()
+    )
+    try:
+        return future.result()
+    except KeyboardInterrupt:
+        future.cancel()
+        try:
+            future.result(KILL_GRACE_PERIOD * 2)
+        except BaseException:
+            pass
+        raise
+
+
+def as_async(wrapper: Callable) -> Callable:
+    """Return `wrapper` as a coroutine function, awaiting what it returns.
+
+    Lets factories written for plain functions (`return func(...)`) be used
+    on `async def` commands.
+    """
+    if inspect.iscoroutinefunction(wrapper):
+        return wrapper
+
+    @wraps(wrapper)
+    async def async_wrapper(*args, **kwargs):
+        result = wrapper(*args, **kwargs)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    return async_wrapper
+
+
+def bridge(wrapper: Callable) -> Callable:
+    """Make an async command callable like a plain function.
+
+    Called from synchronous code (`execute_command`, other commands, worker
+    threads) it runs on the shared loop and returns the result. Called from
+    another async command it returns the coroutine, to be awaited.
+    """
+
+    @wraps(wrapper)
+    def bridged(*args, **kwargs):
+        coroutine = wrapper(*args, **kwargs)
+        if in_shared_loop():
+            return coroutine
+        return run(coroutine)
+
+    return bridged
@@ -3,11 +3,16 @@ from __future__ import annotations
 import typer
 from typing import Annotated
 from rich.console import Console
-from dopy.command_loader import load_commands
-from dopy.command_utils import parse_args, execute_command
+from dopy.command_index import load_index
+from dopy.command_loader import ensure_commands_loaded
+from dopy.command_utils import parse_args, split_kwargs
+from dopy.output import routing
+from dopy.scheduler import run_commands
 from dopy.command_helper import (
     complete_commands,
+    print_cache_stats,
     print_help,
+    print_run_stats,
     print_commands_help,
     print_version,
 )
@@ -20,7 +25,7 @@ app = typer.Typer(
 )
 """Typer application which is the main componenet"""
 
-load_commands()
+load_index()
 
 
 @app.command(context_settings={"allow_extra_args": True})
@@ -34,6 +39,57 @@ def main(
         False, "--help", "-h", help="Show help message and exit."
     ),
     version: bool = typer.Option(False, "--version", "-v", help="Show dopy version."),
+    jobs: int = typer.Option(
+        1,
+        "--jobs",
+        "-j",
+        help="Number of commands to run in parallel (0: as many as the cores allow).",
+    ),
+    cache_clear: bool = typer.Option(
+        False, "--cache-clear", help="Drop all cached command results."
+    ),
+    cache_stats: bool = typer.Option(
+        False, "--cache-stats", help="Show command cache hits and misses."
+    ),
+    profile: bool = typer.Option(
+        False,
+        "--profile",
+        help="Print per-command timings and keep cProfile dumps in .dopy/profile.",
+    ),
+    trace_out: str | None = typer.Option(
+        None, "--trace-out", help="Write a Chrome trace (Perfetto) JSON file."
+    ),
+    watch: bool = typer.Option(
+        False, "--watch", "-w", help="Run again whenever watched files change."
+    ),
+    batch: str | None = typer.Option(
+        None,
+        "--batch",
+        help="Run the invocations listed in FILE (one per line, '-' for stdin).",
+    ),
+    output: str = typer.Option(
+        "group",
+        "--output",
+        help="Output of parallel commands: group, prefix or raw.",
+    ),
+    workers: str | None = typer.Option(
+        None,
+        "--workers",
+        help="Run the commands on these workers (comma separated HOST:PORT or socket paths).",
+    ),
+    log_dir: str | None = typer.Option(
+        None, "--log-dir", help="Also write each command's output to DIR/<name>.log."
+    ),
+    stats: bool = typer.Option(
+        False,
+        "--stats",
+        help="Show latency percentiles of past runs (of the given commands).",
+    ),
+    plan: bool = typer.Option(
+        False,
+        "--plan",
+        help="Show what would run, with estimated durations, without running it.",
+    ),
 ):
     """DO: A simple task runner"""
     # If no commands provided, display custom help
@@ -42,18 +98,75 @@ def main(
             print_version(console)
             return
 
-        if not args:
-            print_help(console)
+        if cache_clear:
+            from dopy import memo
+
+            memo.clear()
+            console.print("Command cache cleared.")
             return
 
-        commands = parse_args(args)
+        if cache_stats:
+            print_cache_stats(console)
+            return
 
-        if help:
-            print_commands_help(commands, console)
+        if stats:
+            print_run_stats(console, args or ())
             return
 
-        for fn, args, kwargs in commands:
-            execute_command(fn, *args, **kwargs)
+        with routing(output, log_dir):
+            if batch:
+                from dopy.batch import run_batch
+
+                ensure_commands_loaded()
+                if run_batch(batch, jobs=jobs).failed:
+                    raise typer.Exit(code=1)
+                return
+
+            if not args:
+                print_help(console)
+                return
+
+            ensure_commands_loaded()
+            commands = parse_args(args)
+
+            if help:
+                print_commands_help(commands, console)
+                return
+
+            if plan:
+                from dopy.plan import format_plan
+
+                print(format_plan(commands, jobs, split_kwargs(args)[1]), end="")
+                return
+
+            if watch:
+                from dopy.watch import watch as watch_files
+
+                watch_files(args, jobs=jobs, kwargs=split_kwargs(args)[1])
+                return
+
+            if workers:
+                from dopy.worker import Remote
+
+                with Remote(workers.split(",")) as remote:
+                    run_commands(
+                        commands,
+                        jobs=jobs if jobs > 1 else remote.slots,
+                        kwargs=split_kwargs(args)[1],
+                        remote=remote,
+                    )
+                return
+
+            if profile or trace_out:
+                from dopy.trace import tracing
+
+                with tracing(trace_out=trace_out, profile=profile):
+                    run_commands(commands, jobs=jobs, kwargs=split_kwargs(args)[1])
+                return
+
+            run_commands(commands, jobs=jobs, kwargs=split_kwargs(args)[1])
+    except typer.Exit:
+        raise
     except Exception as e:
         console.print(f"[bold red]Error:[/bold red] {e}")
         raise typer.Exit(code=1)
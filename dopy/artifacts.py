@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import stat
+import sys
+import threading
+from collections.abc import Iterable
+from typing import IO, Any
+
+from dopy.config import DOPY_HOME
+from dopy.incremental import StateStore, as_patterns, fingerprint, scan
+
+ARTIFACTS_VERSION = 1
+"""Part of every action key; bumped when the layout of the store changes."""
+
+ARTIFACT_DIR = os.getenv("DOPY_ARTIFACT_DIR") or os.path.join(
+    DOPY_HOME, "cache", "artifacts"
+)
+"""Default store; point `DOPY_ARTIFACT_DIR` at a shared directory for CI."""
+
+MAX_SIZE = int(os.getenv("DOPY_ARTIFACT_MAX_SIZE", str(10 << 30)))
+"""Bytes of blobs kept in a store; least recently used ones are evicted."""
+
+HARD_LINKS = os.getenv("DOPY_ARTIFACT_HARDLINKS") == "1"
+"""Restore outputs as hard links to the (read-only) blobs where reflinks are
+not supported. Saves space, but restored outputs are then read-only."""
+
+_FICLONE = 0x40049409
+
+
+def _hash_file(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def _reflink(src: str, dst: str) -> bool:
+    """Clone `src` to `dst` sharing its blocks (Btrfs, XFS); False if unsupported."""
+    if not sys.platform.startswith("linux"):
+        return False
+    import fcntl
+
+    try:
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+    except OSError:
+        try:
+            os.unlink(dst)
+        except OSError:
+            pass
+        return False
+    return True
+
+
+def _place(src: str, dst: str, link: bool) -> None:
+    """Make `dst` a copy of `src`: reflink, hard link (with `link`), or copy."""
+    tmp = f"{dst}.{os.getpid()}.{threading.get_ident()}.tmp"
+    if not _reflink(src, tmp):
+        try:
+            if not link:
+                raise OSError
+            os.link(src, tmp)
+        except OSError:
+            shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+class ArtifactStore:
+    """Content-addressed store of task outputs.
+
+    Blobs live in `blobs/<sha256[:2]>/<sha256>`, read-only and shared by
+    every action producing that content. An action (`actions/<key>.json`)
+    maps output paths to blob digests. A blob's mtime is its last use, for
+    the least-recently-used eviction down to `max_size` bytes. Files are
+    cloned with reflinks where the file system supports them, otherwise
+    copied, or hard linked on restore with `hard_links`.
+    """
+
+    def __init__(
+        self,
+        root: str = ARTIFACT_DIR,
+        max_size: int = MAX_SIZE,
+        hard_links: bool = HARD_LINKS,
+    ):
+        self.root = root
+        self.max_size = max_size
+        self.hard_links = hard_links
+
+    def _blob(self, digest: str) -> str:
+        return os.path.join(self.root, "blobs", digest[:2], digest)
+
+    def _action(self, key: str) -> str:
+        return os.path.join(self.root, "actions", f"{key}.json")
+
+    def put(self, path: str) -> tuple[str, bool]:
+        """Add the file at `path` and return `(digest, executable)`."""
+        digest = _hash_file(path)
+        executable = bool(os.stat(path).st_mode & stat.S_IXUSR)
+        blob = self._blob(digest)
+        if os.path.exists(blob):
+            os.utime(blob)
+        else:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            # Never hard link the live output: later in-place writes to it
+            # would change the blob.
+            _place(path, blob, link=False)
+            os.chmod(blob, 0o555 if executable else 0o444)
+        return digest, executable
+
+    def save(self, key: str, outputs: dict[str, Any]) -> None:
+        """Record the action `key`, whose blobs are already stored."""
+        target = self._action(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(outputs, f)
+        os.replace(tmp, target)
+        self.evict()
+
+    def load(self, key: str) -> dict[str, Any] | None:
+        """Return the action `key` if it and all of its blobs exist."""
+        try:
+            with open(self._action(key), encoding="utf-8") as f:
+                action = json.load(f)
+        except (OSError, ValueError):
+            return None
+        digests = [digest for digest, _ in action["files"].values()]
+        if action.get("stdout"):
+            digests.append(action["stdout"])
+        if not all(os.path.exists(self._blob(digest)) for digest in digests):
+            return None
+        return action
+
+    def restore(self, action: dict[str, Any]) -> None:
+        """Put every output of `action` in place, relative to the cwd."""
+        for path, (digest, executable) in action["files"].items():
+            blob = self._blob(digest)
+            os.utime(blob)
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            if os.path.isfile(path) and _hash_file(path) == digest:
+                continue
+            _place(blob, path, link=self.hard_links)
+            if not self.hard_links:
+                os.chmod(path, 0o755 if executable else 0o644)
+
+    def open_blob(self, digest: str) -> IO[bytes]:
+        """Open a blob for reading; the caller closes it."""
+        return open(self._blob(digest), "rb")
+
+    def evict(self) -> None:
+        """Remove least recently used blobs while over `max_size`."""
+        blobs = []
+        total = 0
+        for directory, _, names in os.walk(os.path.join(self.root, "blobs")):
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                blobs.append((st.st_mtime_ns, st.st_size, path))
+                total += st.st_size
+        if total <= self.max_size:
+            return
+        for _, size, path in sorted(blobs):
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_size:
+                return
+
+
+class Artifacts:
+    """Restores the outputs of an `@sh` command instead of running it again.
+
+    The action key covers the task name, the command string, the content of
+    every `inputs` file and the values of the `env` allowlist. After a
+    successful run every file matched by `outputs` (and the captured
+    stdout) is stored; when the key is found later, they are restored.
+
+    Input hashes are kept in `.dopy/state/<name>.artifacts.json`, like
+    `dopy.incremental` does, so only files whose mtime or size changed are
+    hashed again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        inputs: str | Iterable[str] = (),
+        outputs: str | Iterable[str] = (),
+        env: Iterable[str] = (),
+        store: str | ArtifactStore | None = None,
+    ):
+        self.name = name
+        self.inputs = as_patterns(inputs)
+        self.outputs = as_patterns(outputs)
+        self.env = sorted(env)
+        if not isinstance(store, ArtifactStore):
+            store = ArtifactStore(store or ARTIFACT_DIR)
+        self.store = store
+
+    def key(self, command: str, env: dict[str, str] | None = None) -> str:
+        environ = {**os.environ, **(env or {})}
+        state = StateStore(f"{self.name}.artifacts")
+        previous = state.load()
+        current = fingerprint(self.inputs, previous)
+        if current != previous:
+            state.save(current)
+        inputs = {path: file_state[2] for path, file_state in current.items()}
+        data = json.dumps(
+            [
+                ARTIFACTS_VERSION,
+                self.name,
+                command,
+                sorted(inputs.items()),
+                [(key, environ.get(key)) for key in self.env],
+            ]
+        )
+        return hashlib.sha256(data.encode()).hexdigest()
+
+    def restore(self, key: str) -> dict[str, Any] | None:
+        """Restore the outputs of `key` and return its action, if cached."""
+        action = self.store.load(key)
+        if action is None:
+            return None
+        self.store.restore(action)
+        print(f"dopy: restored '{self.name}' from the artifact cache.", file=sys.stderr)
+        return action
+
+    def save(self, key: str, stdout: IO[bytes] | None = None) -> None:
+        """Store the current outputs (and `stdout`) as the result of `key`."""
+        files = {}
+        for pattern in self.outputs:
+            matched = scan([pattern])
+            if not matched:
+                # An output is missing; do not cache a partial result.
+                return
+            for path in matched:
+                files[os.path.relpath(path)] = self.store.put(path)
+        action: dict[str, Any] = {"files": files, "stdout": None}
+        if stdout is not None:
+            stdout.seek(0)
+            digest = hashlib.file_digest(stdout, "sha256").hexdigest()
+            blob = self.store._blob(digest)
+            if not os.path.exists(blob):
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                stdout.seek(0)
+                tmp = f"{blob}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp, "wb") as f:
+                    shutil.copyfileobj(stdout, f)
+                os.chmod(tmp, 0o444)
+                os.replace(tmp, blob)
+            action["stdout"] = digest
+        self.store.save(key, action)
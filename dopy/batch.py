@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import json
+import shlex
+import sys
+import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import IO
+
+from dopy.command_utils import parse_args, split_kwargs
+from dopy.output import capture, routed
+from dopy.scheduler import run_commands
+
+
+def parse_line(line: str) -> list[str] | None:
+    """Return the argv of one batch line, or None for blank and `#` lines.
+
+    A line is either shell-quoted (`build target=prod`) or JSON: a list of
+    tokens, or an object whose `argv` holds that list.
+    """
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    if line[0] in "[{":
+        data = json.loads(line)
+        argv = data.get("argv") if isinstance(data, dict) else data
+        if not isinstance(argv, list):
+            raise ValueError("JSON invocations need an 'argv' list")
+        return [str(token) for token in argv]
+    return shlex.split(line)
+
+
+def _open(source: str) -> IO[str]:
+    return sys.stdin if source == "-" else open(source)
+
+
+def invocations(
+    lines: Iterable[str],
+) -> Iterator[tuple[int, str, list[str] | Exception]]:
+    """Yield `(line_number, line, argv or parse error)` for each invocation."""
+    for number, line in enumerate(lines, 1):
+        try:
+            argv = parse_line(line)
+        except ValueError as e:
+            yield number, line, e
+            continue
+        if argv is not None:
+            yield number, line, argv
+
+
+def _run(argv: list[str]) -> None:
+    run_commands(parse_args(argv), kwargs=split_kwargs(argv)[1])
+
+
+def _run_captured(argv: list[str]) -> str:
+    with capture() as buffer:
+        try:
+            _run(argv)
+        except Exception as e:
+            e.dopy_output = buffer.getvalue()  # type: ignore[attr-defined]
+            raise
+    return buffer.getvalue()
+
+
+class Summary:
+    """Counts of a batch run; prints one status line per invocation."""
+
+    def __init__(self) -> None:
+        self.ok = 0
+        self.failed = 0
+        self.start = time.monotonic()
+
+    def report(self, number: int, error: BaseException | None, duration: float):
+        if error is None:
+            self.ok += 1
+            sys.stderr.write(f"dopy: line {number}: ok ({duration:.3f}s)\n")
+        else:
+            self.failed += 1
+            sys.stderr.write(f"dopy: line {number}: failed: {error}\n")
+        sys.stderr.flush()
+
+    def __str__(self) -> str:
+        total = self.ok + self.failed
+        elapsed = time.monotonic() - self.start
+        return (
+            f"dopy: {total} invocations, {self.ok} ok, {self.failed} failed"
+            f" in {elapsed:.2f}s"
+        )
+
+
+def run_batch(source: str, jobs: int = 1) -> Summary:
+    """Run every invocation read from the file `source` (`-` for stdin).
+
+    Lines are read as a stream and parsed with `parse_line`; each one runs
+    like a separate `dopy` call (prerequisites included), but in this
+    process. With `jobs > 1` up to `jobs` lines run at the same time, each
+    with its output buffered and written as one block, and never more than
+    `jobs` lines are held in memory. A status line per invocation and a
+    summary are written to stderr; failures do not stop the batch.
+    """
+    summary = Summary()
+    stream = _open(source)
+    try:
+        if jobs <= 1:
+            for number, _, argv in invocations(stream):
+                start = time.monotonic()
+                error = argv if isinstance(argv, Exception) else None
+                if error is None:
+                    try:
+                        _run(argv)  # type: ignore[arg-type]
+                    except Exception as e:
+                        error = e
+                summary.report(number, error, time.monotonic() - start)
+        else:
+            _run_parallel(stream, jobs, summary)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    sys.stderr.write(f"{summary}\n")
+    return summary
+
+
+def _run_parallel(lines: Iterable[str], jobs: int, summary: Summary) -> None:
+    stdout = sys.stdout
+    running: dict[Future, tuple[int, float]] = {}
+
+    def collect() -> None:
+        done, _ = wait(running, return_when=FIRST_COMPLETED)
+        for future in done:
+            number, start = running.pop(future)
+            error = future.exception()
+            stdout.write(
+                getattr(error, "dopy_output", "") if error else future.result()
+            )
+            summary.report(number, error, time.monotonic() - start)
+
+    with routed(), ThreadPoolExecutor(max_workers=jobs) as pool:
+        for number, _, argv in invocations(lines):
+            if isinstance(argv, Exception):
+                summary.report(number, argv, 0.0)
+                continue
+            if len(running) >= jobs:
+                collect()
+            running[pool.submit(_run_captured, argv)] = (number, time.monotonic())
+        while running:
+            collect()
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import datetime
+import inspect
+import pathlib
+from collections.abc import Callable
+from functools import cached_property
+from typing import Any, get_args, get_origin
+
+Converter = Callable[[str], Any]
+
+_TRUE = frozenset(("1", "true", "yes", "y", "on"))
+_FALSE = frozenset(("0", "false", "no", "n", "off"))
+
+_converters: dict[Any, Converter] = {}
+
+
+def _identity(value: str) -> Any:
+    return value
+
+
+def _to_bool(value: str) -> Any:
+    low = str(value).lower()
+    if low in _TRUE:
+        return True
+    if low in _FALSE:
+        return False
+    return value
+
+
+def _to_datetime(value: str) -> Any:
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        pass
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
+        try:
+            return datetime.datetime.strptime(value, fmt)
+        except (TypeError, ValueError):
+            continue
+    return value
+
+
+def _safe(convert: Callable[[str], Any]) -> Converter:
+    """Return `convert`, falling back to the original string when it fails."""
+
+    def converter(value: str) -> Any:
+        try:
+            return convert(value)
+        except Exception:
+            return value
+
+    return converter
+
+
+def _collection(origin: type, elem: Converter | None) -> Converter:
+    def converter(value: str) -> Any:
+        if value == "":
+            elements = []
+        elif elem is None:
+            elements = [s.strip() for s in value.split(",")]
+        else:
+            elements = [elem(s.strip()) for s in value.split(",")]
+        return elements if origin is list else origin(elements)
+
+    return _safe(converter)
+
+
+def _compile(annotation: Any) -> Converter:
+    if annotation is inspect.Parameter.empty:
+        return _identity
+    if annotation is bool:
+        return _safe(_to_bool)
+    if annotation is pathlib.Path:
+        return _safe(pathlib.Path)
+    if annotation is datetime.datetime:
+        return _to_datetime
+    origin = get_origin(annotation)
+    if origin in (list, set, tuple):
+        args = get_args(annotation)
+        return _collection(origin, compile_converter(args[0]) if args else None)
+    if annotation in (int, float, str):
+        return _safe(annotation)
+    return _identity
+
+
+def compile_converter(annotation: Any) -> Converter:
+    """Return a function converting a CLI string to `annotation`.
+
+    Supported are `bool`, `int`, `float`, `str`, `pathlib.Path`,
+    `datetime.datetime` and `list[T]`/`set[T]`/`tuple[T, ...]` of those
+    (comma separated). When a conversion fails, the converter returns the
+    original string. Converters are cached per annotation.
+    """
+    try:
+        return _converters[annotation]
+    except KeyError:
+        converter = _converters[annotation] = _compile(annotation)
+        return converter
+    except TypeError:
+        # Unhashable annotation object.
+        return _compile(annotation)
+
+
+class Binder:
+    """Argument binding of one command, analysed once and then reused.
+
+    Holds the command's parameters, whether it accepts `**kwargs` and one
+    specialised converter per parameter, so binding CLI strings is a loop
+    over the given values with a dict lookup each.
+    """
+
+    def __init__(self, fn: Callable):
+        self.fn = fn
+
+    @cached_property
+    def signature(self) -> inspect.Signature:
+        return inspect.signature(self.fn)
+
+    @cached_property
+    def params(self) -> list[inspect.Parameter]:
+        return list(self.signature.parameters.values())
+
+    @cached_property
+    def has_var_kw(self) -> bool:
+        return any(p.kind == inspect.Parameter.VAR_KEYWORD for p in self.params)
+
+    @cached_property
+    def converters(self) -> list[Converter]:
+        return [compile_converter(p.annotation) for p in self.params]
+
+    @cached_property
+    def by_name(self) -> dict[str, tuple[int, Converter]]:
+        return {p.name: (i, self.converters[i]) for i, p in enumerate(self.params)}
+
+    def bind(
+        self, positional_args: list[str], passed_kwargs: dict[str, str]
+    ) -> tuple[list[Any], dict[str, Any]]:
+        """Convert CLI strings into call arguments; see `resolve_arguments`."""
+        converters = self.converters
+        count = len(converters)
+        converted_pos = [
+            converters[i](val) if i < count else val
+            for i, val in enumerate(positional_args)
+        ]
+        if self.has_var_kw:
+            return converted_pos, dict(passed_kwargs)
+        provided = len(converted_pos)
+        by_name = self.by_name
+        kw = {}
+        for name, value in passed_kwargs.items():
+            entry = by_name.get(name)
+            if entry is not None and entry[0] >= provided:
+                kw[name] = entry[1](value)
+        return converted_pos, kw
+
+
+def binder_for(fn: Callable) -> Binder:
+    """Return the `Binder` of `fn`, creating and attaching it if needed.
+
+    Registered commands get theirs at registration time (`_make_decorator`).
+    """
+    binder = getattr(fn, "__dopy_binder__", None)
+    if binder is None or binder.fn is not fn:
+        binder = Binder(fn)
+        try:
+            fn.__dopy_binder__ = binder  # type: ignore[attr-defined]
+        except (AttributeError, TypeError):
+            pass
+    return binder
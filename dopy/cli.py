@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import os
+import sys
+
+
+def _is_plain_dispatch(argv: list[str]) -> bool:
+    """Return True for `dopy <cmd> [k=v...]` invocations without any option.
+
+    Help, version, completion and every other option go through the Typer
+    app, which is the only place typer and rich are needed.
+    """
+    if not argv or "_DOPY_COMPLETE" in os.environ:
+        return False
+    return not any(arg.startswith("-") for arg in argv)
+
+
+def _is_command(name: str) -> bool:
+    """Return True if the loaded `do.py` files define the command `name`."""
+    from dopy.command import COMMANDS
+    from dopy.command_loader import LAZY, ensure_commands_loaded
+
+    ensure_commands_loaded()
+    return name in COMMANDS or name in LAZY
+
+
+def print_error(error: BaseException) -> None:
+    """Render an error the same way the Typer app does."""
+    from rich.console import Console
+
+    Console().print(f"[bold red]Error:[/bold red] {error}")
+
+
+def run(argv: list[str]) -> int:
+    """Load the commands, then parse and execute `argv` with prerequisites."""
+    from dopy.command_loader import ensure_commands_loaded
+    from dopy.command_utils import parse_args, split_kwargs
+    from dopy.scheduler import run_commands
+
+    try:
+        ensure_commands_loaded()
+        run_commands(parse_args(argv), kwargs=split_kwargs(argv)[1])
+    except KeyboardInterrupt:
+        print("Aborted!", file=sys.stderr)
+        return 130
+    except Exception as e:
+        print_error(e)
+        return 1
+    return 0
+
+
+def dispatch(argv: list[str]) -> int:
+    """Run one `dopy` invocation in this process.
+
+    Plain command invocations are dispatched directly with `parse_args` and
+    the scheduler, shell completion requests are answered from the command
+    index (see `dopy.completion`) and `dopy worker ...` serves the project
+    to remote clients (see `dopy.worker`), unless a `do.py` defines a
+    command named `worker`; anything else is handed over to
+    `dopy.app.app`.
+    """
+    instruction = os.environ.get("_DOPY_COMPLETE")
+    if instruction is not None or argv[:1] == ["__complete"]:
+        from dopy.completion import complete_shell, complete_words
+
+        if instruction is None:
+            return complete_words(argv[1:])
+        code = complete_shell(instruction)
+        if code is not None:
+            return code
+    if argv[:1] == ["worker"] and not _is_command("worker"):
+        from dopy.worker import main as serve
+
+        return serve(argv[1:])
+    if _is_plain_dispatch(argv):
+        return run(argv)
+    from dopy.app import app
+
+    app(args=argv, prog_name="dopy")
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Console entry point of `dopy`.
+
+    With `DOPY_DAEMON=1` the invocation is forwarded to a running daemon
+    (see `dopy.daemon`); otherwise, or when none is running, it is
+    dispatched locally.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    if os.environ.get("DOPY_DAEMON") == "1":
+        from dopy.daemon import forward
+
+        code = forward(argv)
+        if code is not None:
+            return code
+    return dispatch(argv)
@@ -1,20 +1,161 @@
 from __future__ import annotations
 
-from typing import ParamSpec, TypeVar
-from collections.abc import Callable
+from typing import TYPE_CHECKING, Any, ParamSpec, TypeVar
+from collections.abc import Callable, Mapping
 from functools import wraps
+import inspect
 import os
 
+if TYPE_CHECKING:
+    from dopy.artifacts import Artifacts
+    from dopy.process import ShellResult
+
 P = ParamSpec("P")
 R = TypeVar("R")
 
 COMMANDS = {}
 
+DEPENDENCIES: dict[str, list[str]] = {}
+"""Prerequisites declared with `depends=[...]`, keyed like `COMMANDS`."""
+
+OPTIONS: dict[str, dict[str, Any]] = {}
+"""Options given to the registration decorators, keyed like `COMMANDS`."""
+
+_GENERIC_OPTIONS = {
+    "depends",
+    "inputs",
+    "outputs",
+    "cache",
+    "cache_ttl",
+    "cache_maxsize",
+    "executor",
+    "map",
+    "map_jobs",
+    "artifacts",
+    "artifact_env",
+    "cpus",
+    "mem",
+    "lock",
+}
+
 
 def _make_decorator(factory):
-    def decorator(func: Callable[P, R]) -> Callable[P, R]:
-        wrapper = factory(func)
-        COMMANDS[func.__name__] = wrapper
+    def decorator(func=None, /, **options):
+        """Register `func` as a command.
+
+        Can be used bare (`@sh`) or with options (`@sh(depends=["build"])`):
+
+        - `depends`: commands that must run before this one (see
+          `dopy.scheduler`).
+        - `inputs` / `outputs`: glob patterns; the command is skipped while
+          they are unchanged since its last successful run (see
+          `dopy.incremental`).
+        - `cache`: memoize results on the converted arguments, in memory
+          (`True`/`"memory"`) or also on disk (`"disk"`), bounded by
+          `cache_maxsize` entries and expiring after `cache_ttl` seconds
+          (see `dopy.memo`).
+        - `executor`: `"process"` runs each call in a reusable pool of
+          worker processes, one per core, for CPU-bound Python code (see
+          `dopy.pool`); the default `"thread"` runs it in the caller.
+        - `map`: name of a parameter taking a comma separated list; the
+          command runs once per element, up to `map_jobs` at a time, and
+          returns the list of results (see `dopy.fanout`).
+        - `artifacts`: for `@sh` with `outputs`, restore the outputs from a
+          content-addressed cache instead of running a command seen before
+          with the same inputs and `artifact_env` variables; `True` for the
+          default store or the path of a shared one (see `dopy.artifacts`).
+        - `cpus` / `mem` / `lock`: cores, memory (`"8G"`) and named locks
+          (one name or a list) the command needs; parallel runs only start
+          it when they are free, and a lock is shared by all dopy processes
+          (see `dopy.resources`).
+
+        Any other option is passed on to the factory as a keyword argument
+        (e.g. `@sh(timeout=60)`). Every call of the registered command is
+        recorded while `dopy.trace.tracing` is active.
+
+        `async def` commands run on the event loop shared by the whole
+        invocation (see `dopy.aio`): called from plain code they block until
+        done, inside other async commands they are awaited.
+        """
+        if func is None:
+            return lambda f: decorator(f, **options)
+        name = func.__name__
+        if {"cpus", "mem", "lock"} & options.keys():
+            from dopy.resources import requirements
+
+            try:
+                requirements(options)
+            except ValueError as e:
+                raise ValueError(f"Command '{name}': {e}") from None
+        if options.get("cache"):
+            from dopy.memo import memoize
+
+            func = memoize(
+                func,
+                name,
+                options["cache"],
+                ttl=options.get("cache_ttl"),
+                maxsize=options.get("cache_maxsize"),
+            )
+        factory_options = {
+            key: value for key, value in options.items() if key not in _GENERIC_OPTIONS
+        }
+        if options.get("artifacts"):
+            from dopy.artifacts import Artifacts
+
+            store = options["artifacts"]
+            factory_options["artifacts"] = Artifacts(
+                name,
+                inputs=options.get("inputs", ()),
+                outputs=options.get("outputs", ()),
+                env=options.get("artifact_env", ()),
+                store=None if store is True else store,
+            )
+        wrapper = factory(func, **factory_options)
+        executor = options.get("executor", "thread")
+        if executor != "thread":
+            from dopy.pool import EXECUTORS, in_process_pool
+
+            if executor not in EXECUTORS:
+                raise ValueError(f"Command '{name}': unknown executor {executor!r}")
+            wrapper = in_process_pool(wrapper, name, func)
+        if options.get("map"):
+            from dopy.fanout import fan_out
+
+            if inspect.iscoroutinefunction(func):
+                raise ValueError(
+                    f"Command '{name}': use asyncio.gather to map async commands"
+                )
+            wrapper = fan_out(wrapper, name, options["map"], options.get("map_jobs"))
+        is_async = inspect.iscoroutinefunction(func)
+        if is_async:
+            from dopy.aio import as_async
+
+            wrapper = as_async(wrapper)
+        if options.get("inputs") or options.get("outputs"):
+            from dopy.incremental import skip_when_up_to_date
+
+            wrapper = skip_when_up_to_date(
+                wrapper,
+                name,
+                inputs=options.get("inputs", ()),
+                outputs=options.get("outputs", ()),
+            )
+        if is_async:
+            from dopy.aio import bridge
+
+            wrapper = bridge(wrapper)
+        from dopy.binder import Binder
+        from dopy.trace import traced
+
+        shell = getattr(wrapper, "__dopy_shell__", None)
+        wrapper = traced(wrapper, name)
+        wrapper.__dopy_binder__ = Binder(wrapper)
+        if shell is not None:
+            wrapper.__dopy_shell__ = shell
+        COMMANDS[name] = wrapper
+        DEPENDENCIES[name] = list(options.get("depends", ()))
+        OPTIONS[name] = options
         return wrapper
 
     return decorator
@@ -32,6 +173,8 @@ def dopy_command(factory):
         return wrapper
 
     After decoration, `sh_factory` becomes a decorator named `sh_factory`.
+    Like the built-in decorators it also accepts options, e.g.
+    `@sh_factory(depends=["build"])`.
     """
     return _make_decorator(factory)
 
@@ -39,6 +182,13 @@ def dopy_command(factory):
 @dopy_command
 def command(func: Callable[P, R]) -> Callable[P, R]:
     """Basic command decorator that registers the function as a command."""
+    if inspect.iscoroutinefunction(func):
+
+        @wraps(func)
+        async def async_wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            return await func(*args, **kwargs)
+
+        return async_wrapper  # type: ignore[return-value]
 
     @wraps(func)
     def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
@@ -48,24 +198,110 @@ def command(func: Callable[P, R]) -> Callable[P, R]:
 
 
 @dopy_command
-def sh(func: Callable[P, str]) -> Callable[P, str]:
+def sh(
+    func: Callable[P, str],
+    *,
+    capture: bool = False,
+    timeout: float | None = None,
+    env: Mapping[str, str] | None = None,
+    cwd: str | os.PathLike[str] | None = None,
+    artifacts: Artifacts | None = None,
+) -> Callable[P, ShellResult]:
     """Execute the returned string as a shell command.
 
     The wrapped function should return a shell command string. The
-    wrapper runs it via `os.system` and raises `RuntimeError` if the
-    command exits with a non-zero status.
+    wrapper runs it via `dopy.process.run_shell` and raises `RuntimeError`
+    if the command exits with a non-zero status (or is killed by a signal).
+    It returns a `ShellResult`: the command string, plus its exit code,
+    duration and, with `capture=True`, its output. `timeout`, `env` and
+    `cwd` are passed on to `run_shell`. With `artifacts` (set up by the
+    `artifacts=` option) a command whose outputs are cached is not run:
+    they are restored and an empty result is returned.
+
+    On an `async def` function the command runs through
+    `dopy.process.run_shell_async` instead, so many of them can overlap on
+    the shared event loop.
+
+    `func` is kept as the wrapper's `__dopy_shell__`, so `dopy --plan` can
+    show the command strings without running them.
     """
+    from dopy.process import run_shell, run_shell_async
+
+    if inspect.iscoroutinefunction(func):
+
+        @wraps(func)
+        async def async_wrapper(*args: P.args, **kwargs: P.kwargs) -> ShellResult:
+            command: str = await func(*args, **kwargs)
+            key, restored = _restore(artifacts, command, env)
+            if restored is not None:
+                return restored
+            result = await run_shell_async(
+                str(command), capture=capture, timeout=timeout, env=env, cwd=cwd
+            )
+            return _store(artifacts, key, _check_exit(command, result))
+
+        async_wrapper.__dopy_shell__ = func  # type: ignore[attr-defined]
+        return async_wrapper  # type: ignore[return-value]
 
     @wraps(func)
-    def wrapper(*args: P.args, **kwargs: P.kwargs) -> str:
+    def wrapper(*args: P.args, **kwargs: P.kwargs) -> ShellResult:
         command: str = func(*args, **kwargs)
-        if os.system(str(command)) > 0:
-            raise RuntimeError(f"Shell command failed: {command}")
-        return command
+        key, restored = _restore(artifacts, command, env)
+        if restored is not None:
+            return restored
+        result = run_shell(
+            str(command), capture=capture, timeout=timeout, env=env, cwd=cwd
+        )
+        return _store(artifacts, key, _check_exit(command, result))
 
+    wrapper.__dopy_shell__ = func  # type: ignore[attr-defined]
     return wrapper
 
 
+def _restore(
+    artifacts: Artifacts | None, command: str, env: Mapping[str, str] | None
+) -> tuple[str, ShellResult | None]:
+    """Return the artifact key of `command`, and a result when its outputs
+    were restored from the cache instead."""
+    if artifacts is None:
+        return "", None
+    import shutil
+    import tempfile
+
+    from dopy.process import CAPTURE_MEMORY_LIMIT, ShellResult
+
+    key = artifacts.key(str(command), dict(env or {}))
+    action = artifacts.restore(key)
+    if action is None:
+        return key, None
+    result = ShellResult(str(command))
+    if action.get("stdout"):
+        # A copy, like a captured run's, so no blob handle stays open. The
+        # result owns it.
+        output = tempfile.SpooledTemporaryFile(max_size=CAPTURE_MEMORY_LIMIT)  # noqa: SIM115
+        with artifacts.store.open_blob(action["stdout"]) as blob:
+            shutil.copyfileobj(blob, output)
+        result._output = output
+    return key, result
+
+
+def _store(artifacts: Artifacts | None, key: str, result: ShellResult) -> ShellResult:
+    if artifacts is not None:
+        artifacts.save(key, result._output)
+    return result
+
+
+def _check_exit(command: str, result: ShellResult) -> ShellResult:
+    """Raise `RuntimeError` (carrying `result`) for a non-zero exit code."""
+    if result.returncode != 0:
+        error = RuntimeError(
+            f"Shell command failed: {command} (exit code {result.returncode})"
+        )
+        error.dopy_result = result  # type: ignore[attr-defined]
+        raise error
+    return result
+
+
 @dopy_command
 def echo(func: Callable[P, R]) -> Callable[P, R]:
     """Decorator that prints the wrapped function's result to stdout.
@@ -73,6 +309,15 @@ def echo(func: Callable[P, R]) -> Callable[P, R]:
     Useful for simple CLI helpers that should both display and return
     their result.
     """
+    if inspect.iscoroutinefunction(func):
+
+        @wraps(func)
+        async def async_wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            result = await func(*args, **kwargs)
+            print(result)
+            return result
+
+        return async_wrapper  # type: ignore[return-value]
 
     @wraps(func)
     def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
@@ -1,13 +1,19 @@
 from __future__ import annotations
 
-from typing import Any
+from typing import TYPE_CHECKING, Any
 from collections.abc import Callable
-import inspect
-import platform
 
 from dopy import __version__
-from dopy.command import COMMANDS
-from dopy.command_utils import parse_args
+from dopy.command import COMMANDS, DEPENDENCIES
+from dopy.command_index import INDEX
+
+if TYPE_CHECKING:
+    import inspect
+
+
+def _short_doc(func: Callable) -> str:
+    """Return the first line of the docstring of `func` (or "")."""
+    return (func.__doc__ or "").strip().split("\n")[0]
 
 
 def all_commands_for_help(incomplete: str) -> list[tuple[str, str]]:
@@ -15,17 +21,12 @@ def all_commands_for_help(incomplete: str) -> list[tuple[str, str]]:
     the given `incomplete` prefix.
 
     The short doc is the first line of the command's docstring (or empty
-    string if none is present).
+    string if none is present). Commands only known from the on-disk index
+    are listed without being imported.
     """
-    items: list[tuple[str, str]] = []
-    for name, func in COMMANDS.items():
-        if not name.startswith(incomplete):
-            continue
-        doc = (func.__doc__ or "").strip().split("\n")[0]
-        if not doc:
-            doc = ""
-        items.append((name, doc))
-    return items
+    docs = {name: entry["doc"] for name, entry in INDEX.items()}
+    docs.update((name, _short_doc(func)) for name, func in COMMANDS.items())
+    return [(name, doc) for name, doc in docs.items() if name.startswith(incomplete)]
 
 
 def format_parameter_signature(param: inspect.Parameter) -> tuple[str, str]:
@@ -42,6 +43,62 @@ def format_parameter_signature(param: inspect.Parameter) -> tuple[str, str]:
     return (f"{param.name}=", desc)
 
 
+def describe_parameters(func: Callable) -> list[dict[str, Any]]:
+    """Return the JSON-friendly parameter descriptions used by completion."""
+    from dopy.binder import binder_for
+
+    return [
+        {
+            "name": p.name,
+            "kind": p.kind.name,
+            "default": p.default is not p.empty,
+            "signature": list(format_parameter_signature(p)),
+        }
+        for p in binder_for(func).params
+    ]
+
+
+def describe_command(name: str, func: Callable) -> dict[str, Any]:
+    """Return the index entry (name, short doc, parameters) of a command."""
+    return {
+        "name": name,
+        "doc": _short_doc(func),
+        "params": describe_parameters(func),
+    }
+
+
+def _command_parameters(name: str) -> list[dict[str, Any]]:
+    func = COMMANDS.get(name)
+    if func is not None:
+        return describe_parameters(func)
+    return INDEX[name]["params"]
+
+
+def _last_invocation(tokens: list[str]) -> tuple[str, int, set[str]] | None:
+    """Return `(command, positional_count, keyword_names)` for the last command.
+
+    Mirrors the grouping of `parse_args` without converting any value, so it
+    also works for commands that are only known from the index. Returns None
+    when the tokens do not start with a command.
+    """
+    last: str | None = None
+    positional = 0
+    keywords: set[str] = set()
+    for token in tokens:
+        if "=" in token:
+            keywords.add(token.split("=", 1)[0])
+        elif token in COMMANDS or token in INDEX:
+            last = token
+            positional = 0
+        elif last is None:
+            return None
+        else:
+            positional += 1
+    if last is None:
+        return None
+    return last, positional, keywords
+
+
 def decode_params(previous_params: list[str]):
     """Decode a flattened list of args where `a = b` may have been split.
 
@@ -66,41 +123,44 @@ def complete_commands(ctx, incomplete: str):
     `incomplete` token, return either matching command names + docs or
     parameter signature completions for the last command.
     """
-    previous_params = decode_params(list(ctx.params["args"]))
+    return completion_candidates(decode_params(list(ctx.params["args"])), incomplete)
+
+
+def completion_candidates(
+    previous_params: list[str], incomplete: str
+) -> list[tuple[str, str]]:
+    """Return the completions after the (decoded) `previous_params`.
+
+    Shared by the Typer completion and the fast path in `dopy.completion`.
+    """
     if not previous_params:
         return all_commands_for_help(incomplete)
-    try:
-        commands = parse_args(previous_params)
-        if not commands:
-            return all_commands_for_help(incomplete)
-    except Exception:
+    last_command = _last_invocation(previous_params)
+    if last_command is None:
         return all_commands_for_help(incomplete)
-    last_command = commands[-1]
-    sig = inspect.signature(last_command[0])
-    params_missing: list[Any] = []
-    for i, p in enumerate(sig.parameters.values()):
-        if i < len(last_command[1]):
+    name, positional, keywords = last_command
+    params_missing: list[dict[str, Any]] = []
+    for i, p in enumerate(_command_parameters(name)):
+        if i < positional:
             continue
-        if p.name in last_command[2]:
+        if p["name"] in keywords:
             continue
-        if p.default != p.empty:
+        if p["default"]:
             continue
-        if p.kind in (p.VAR_POSITIONAL, p.VAR_KEYWORD):
+        if p["kind"] in ("VAR_POSITIONAL", "VAR_KEYWORD"):
             continue
         params_missing.append(p)
 
-    if (
-        not params_missing
-        or params_missing[0].kind == inspect.Parameter.VAR_POSITIONAL
-        or params_missing[0].kind == inspect.Parameter.VAR_KEYWORD
-    ):
+    if not params_missing:
         return all_commands_for_help(incomplete)
-    return [format_parameter_signature(p) for p in params_missing]
+    return [tuple(p["signature"]) for p in params_missing]
 
 
 def get_command_information(commands: Callable) -> tuple[str, str, dict[str, str]]:
     """Get the command signature, docstring, and parameter docs for a command."""
-    sig = inspect.signature(commands)
+    from dopy.binder import binder_for
+
+    sig = binder_for(commands).signature
     command_signature = f"{commands.__name__}{sig}"
     command_doc = commands.__doc__ or ""
     param_docs: dict[str, str] = {}
@@ -118,6 +178,33 @@ def print_help(console):
     console.print("[bold]Usage:[/bold]")
     console.print("\tdopy <command> [args...] (Repeat)")
     console.print("\tAdd param=value for defining command arguments by name.")
+    console.print(
+        "\tdopy [cyan]-j N[/cyan] <command>... to run up to N commands at once"
+    )
+    console.print(
+        "\tdopy [cyan]--output group|prefix|raw[/cyan] / [cyan]--log-dir DIR[/cyan] -j N <command>... to route their output"
+    )
+    console.print(
+        "\tdopy [cyan]--workers ADDR,...[/cyan] <command>... to run on workers started with 'dopy worker ADDR'"
+    )
+    console.print(
+        "\tdopy [cyan]--batch FILE[/cyan] to run one invocation per line of FILE ('-' for stdin)"
+    )
+    console.print(
+        "\tdopy [cyan]--watch[/cyan] <command>... to run again on every file change"
+    )
+    console.print(
+        "\tdopy [cyan]--plan[/cyan] <command>... to show what would run and how long it may take"
+    )
+    console.print(
+        "\tdopy [cyan]--stats[/cyan] [command...] to show latency percentiles of past runs"
+    )
+    console.print(
+        "\tdopy [cyan]--profile[/cyan] / [cyan]--trace-out FILE[/cyan] <command>... to time commands"
+    )
+    console.print(
+        "\tdopy [cyan]--cache-stats[/cyan] / [cyan]--cache-clear[/cyan] to inspect or drop cached results"
+    )
     console.print("\tdopy [cyan]--version[/cyan] to show dopy version")
     console.print("\tdopy [cyan]--help[/cyan] to show this message")
     console.print(
@@ -142,6 +229,10 @@ def print_command_help(commands, console):
     if command_doc:
         console.print(command_doc)
         console.print()
+    depends = DEPENDENCIES.get(commands.__name__)
+    if depends:
+        console.print(f"[bold]Depends on:[/bold] {', '.join(depends)}")
+        console.print()
     if param_docs:
         console.print("[bold]Parameters:[/bold]")
         for name, doc in param_docs.items():
@@ -158,7 +249,53 @@ def print_commands_help(commands, console):
     return
 
 
+def print_cache_stats(console):
+    """Display hits, misses and size of the command result caches."""
+    from dopy.memo import stats
+
+    rows = stats()
+    if not rows:
+        console.print("No cached command results.")
+        return
+    console.print("[bold]Command cache:[/bold]")
+    for command, entries, size, hits, misses in rows:
+        console.print(
+            f"\t{command}: {hits} hits, {misses} misses, "
+            f"{entries} stored entries ({size} bytes)"
+        )
+
+
+def print_run_stats(console, commands=()):
+    """Display latency percentiles of past runs, flagging regressions."""
+    from dopy.history import stats
+    from dopy.plan import format_duration
+
+    rows = stats(commands)
+    if not rows:
+        console.print("No recorded runs.")
+        return
+    console.print(
+        f"[bold]{'command':24} {'runs':>5} {'failed':>6} {'p50':>8} {'p95':>8} "
+        f"{'p99':>8} {'last':>8}[/bold]"
+    )
+    for row in rows:
+        line = (
+            f"{row.command:24} {row.runs:>5} {row.failures:>6} "
+            f"{format_duration(row.p50):>8} {format_duration(row.p95):>8} "
+            f"{format_duration(row.p99):>8} {format_duration(row.last):>8}"
+        )
+        if row.regressed:
+            assert row.baseline is not None
+            line += (
+                f" [bold red]regressed[/bold red]"
+                f" (rolling median {format_duration(row.baseline)})"
+            )
+        console.print(line, highlight=False, soft_wrap=True)
+
+
 def print_version(console):
+    import platform
+
     console.print(
         "Running DoPy {version} with {py_implementation} {py_version} on {system}".format(  # noqa: UP032
             version=__version__,
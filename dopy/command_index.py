@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sys
+from typing import Any
+
+from dopy.config import DOPY_HOME
+from dopy.command import COMMANDS
+from dopy.command_loader import STUBS, command_sources, load_commands, scan_commands
+
+INDEX_VERSION = 1
+"""Bumped whenever the layout of an index file changes."""
+
+INDEX: dict[str, dict[str, Any]] = {}
+"""Commands known from the on-disk index but not imported yet.
+
+Filled by `load_index` when every `do.py` could be answered from the cache;
+help and completion fall back to it for names missing from `COMMANDS`.
+"""
+
+
+def _interpreter() -> str:
+    return f"{sys.implementation.cache_tag}:{sys.executable}"
+
+
+def _index_path(path: str) -> str:
+    """Return the cache file for the `do.py` at `path` and this interpreter."""
+    key = f"{INDEX_VERSION}\0{os.path.abspath(path)}\0{_interpreter()}"
+    digest = hashlib.sha256(key.encode()).hexdigest()[:32]
+    return os.path.join(DOPY_HOME, "cache", "index", f"{digest}.json")
+
+
+def _file_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def _file_state(path: str) -> list[Any]:
+    """Return `[mtime_ns, size, sha256]` for `path`."""
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size, _file_hash(path)]
+
+
+def _source_file(func) -> str | None:
+    """Return the file defining the user function behind a command wrapper."""
+    import inspect
+
+    code = getattr(inspect.unwrap(func), "__code__", None)
+    if code is None or not os.path.exists(code.co_filename):
+        return None
+    return os.path.abspath(code.co_filename)
+
+
+def _is_fresh(files: dict[str, list[Any]]) -> bool:
+    """Check recorded file states, stat first and hashing only on mismatch.
+
+    Files whose content is unchanged but whose stat differs (e.g. after a
+    `touch` or a fresh checkout) get their recorded stat refreshed in place.
+    """
+    for path, (mtime_ns, size, digest) in files.items():
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        if st.st_mtime_ns == mtime_ns and st.st_size == size:
+            continue
+        if st.st_size != size or _file_hash(path) != digest:
+            return False
+        files[path] = [st.st_mtime_ns, st.st_size, digest]
+    return True
+
+
+def _read_index(path: str) -> list[dict[str, Any]] | None:
+    """Return the cached command entries for `path`, or None if stale."""
+    try:
+        with open(_index_path(path), encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != INDEX_VERSION or data.get("interpreter") != (
+        _interpreter()
+    ):
+        return None
+    files = data.get("files", {})
+    recorded = json.dumps(files, sort_keys=True)
+    if not _is_fresh(files):
+        return None
+    if json.dumps(files, sort_keys=True) != recorded:
+        _write_index(path, files, data["commands"])
+    return data["commands"]
+
+
+def _write_index(
+    path: str, files: dict[str, list[Any]], commands: list[dict[str, Any]]
+) -> None:
+    target = _index_path(path)
+    data = {
+        "version": INDEX_VERSION,
+        "path": os.path.abspath(path),
+        "interpreter": _interpreter(),
+        "files": files,
+        "commands": commands,
+    }
+    try:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = f"{target}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, target)
+    except OSError:
+        # The index is only an optimisation; a read-only DOPY_HOME must not
+        # break the CLI.
+        pass
+
+
+def _build_index(registered: dict[str, list[str]]) -> None:
+    """Write an index file for every loaded `do.py` from the live registry."""
+    from dopy.command_helper import describe_command
+
+    for path, names in registered.items():
+        # Names overridden by a task module are no longer in `COMMANDS`.
+        names = [name for name in names if name in COMMANDS]
+        commands = [describe_command(name, COMMANDS[name]) for name in names]
+        sources = {os.path.abspath(path)}
+        for name in names:
+            source = _source_file(COMMANDS[name])
+            if source is not None:
+                sources.add(source)
+        try:
+            files = {source: _file_state(source) for source in sorted(sources)}
+        except OSError:
+            continue
+        _write_index(path, files, commands)
+
+
+def load_index() -> bool:
+    """Make the available commands known without importing them if possible.
+
+    When every existing `do.py` has a fresh index entry, `INDEX` is filled
+    from the cache and nothing is imported. Otherwise the files are loaded
+    with `load_commands` and their index entries are rebuilt. Returns True
+    when the commands were answered from the cache. Either way the stubs of
+    task modules (see `dopy.command_loader.sources`) are added to `INDEX`.
+    """
+    INDEX.clear()
+    known: dict[str, list[dict[str, Any]]] = {}
+    for path, _ in command_sources():
+        if not os.path.exists(path):
+            continue
+        cached = _read_index(path)
+        if cached is None:
+            _build_index(load_commands())
+            INDEX.update(STUBS)
+            return False
+        known[path] = cached
+    scan_commands(
+        {path: [e["name"] for e in entries] for path, entries in known.items()}
+    )
+    for entries in known.values():
+        for entry in entries:
+            INDEX[entry["name"]] = entry
+    INDEX.update(STUBS)
+    return True
@@ -3,6 +3,52 @@ from __future__ import annotations
 import os
 import importlib.util
 from dopy.config import DOPY_HOME
+from dopy.command import COMMANDS, DEPENDENCIES, OPTIONS
+
+_loaded = False
+"""Whether `load_commands` has already imported the `do.py` files."""
+
+TASK_DIRS = ("do", "tasks")
+"""Directories next to a `do.py` whose modules are imported on demand."""
+
+LAZY: dict[str, tuple[str, str]] = {}
+"""Commands found in task modules that are not imported yet, mapped to
+the `(path, module_name)` of the module defining them."""
+
+STUBS: dict[str, dict] = {}
+"""Index entries (see `dopy.stubs.parse`) of the commands in `LAZY`."""
+
+
+def sources() -> list[tuple[str, str, bool]]:
+    """Return `(path, module_name, lazy)` for every file defining commands.
+
+    For `DOPY_HOME` and then the current directory: `do.py`, imported on
+    load, followed by the modules in its `do/` and `tasks/` directories
+    (sorted, skipping `_*.py`), which are only imported when one of their
+    commands is used. Later sources override commands of earlier ones.
+    """
+    result = []
+    for root, base in ((DOPY_HOME, "do_default"), (os.getcwd(), "do")):
+        result.append((os.path.join(root, "do.py"), base, False))
+        for directory in TASK_DIRS:
+            try:
+                names = sorted(os.listdir(os.path.join(root, directory)))
+            except OSError:
+                continue
+            for name in names:
+                if name.endswith(".py") and not name.startswith("_"):
+                    path = os.path.join(root, directory, name)
+                    result.append((path, f"{base}_{directory}_{name[:-3]}", True))
+    return result
+
+
+def command_sources() -> list[tuple[str, str]]:
+    """Return the `(path, module_name)` pairs of the `do.py` files to load.
+
+    The order matters: later sources override commands registered by
+    earlier ones.
+    """
+    return [(path, module_name) for path, module_name, lazy in sources() if not lazy]
 
 
 def _load_module_from_path(path: str, module_name: str) -> None:
@@ -25,14 +71,95 @@ def _load_module_from_path(path: str, module_name: str) -> None:
         pass
 
 
-def load_commands() -> None:
+def _add_stubs(path: str, module_name: str) -> None:
+    from dopy.stubs import scan
+
+    for entry in scan(path):
+        LAZY[entry["name"]] = (path, module_name)
+        STUBS[entry["name"]] = entry
+
+
+def _shadow(names) -> None:
+    """Drop stubs overridden by commands of a later `do.py`."""
+    for name in names:
+        LAZY.pop(name, None)
+        STUBS.pop(name, None)
+
+
+def scan_commands(known: dict[str, list[str]]) -> None:
+    """Fill `LAZY` and `STUBS` without importing any file.
+
+    `known` maps each `do.py` to the names it registers (from the command
+    index), so the override order is the same as with `load_commands`.
+    """
+    LAZY.clear()
+    STUBS.clear()
+    for path, module_name, lazy in sources():
+        if not os.path.exists(path):
+            continue
+        if lazy:
+            _add_stubs(path, module_name)
+        else:
+            _shadow(known.get(path, ()))
+
+
+def load_commands() -> dict[str, list[str]]:
     """Load `do.py` from the DOPY_HOME (default) and then from cwd.
 
     The cwd version is loaded second so its command registrations override
-    the defaults (if they share names).
+    the defaults (if they share names). Task modules are only scanned for
+    stubs (see `sources`). Returns the names registered by each existing
+    `do.py`, keyed by its path.
+    """
+    global _loaded
+    registered: dict[str, list[str]] = {}
+    LAZY.clear()
+    STUBS.clear()
+    for path, module_name, lazy in sources():
+        if not os.path.exists(path):
+            continue
+        if lazy:
+            _add_stubs(path, module_name)
+            continue
+        before = dict(COMMANDS)
+        _load_module_from_path(path, module_name)
+        registered[path] = [
+            name for name, func in COMMANDS.items() if before.get(name) is not func
+        ]
+        _shadow(registered[path])
+    for name in LAZY:
+        # A task module of a later source overrides this command.
+        COMMANDS.pop(name, None)
+    _loaded = True
+    return registered
+
+
+def import_lazy(name: str) -> bool:
+    """Import the task module defining `name` if it is not imported yet.
+
+    Other commands of that module are registered too, except those
+    overridden by another source, which keep their current registration.
+    Returns True if a module was imported.
     """
-    default_path = os.path.join(DOPY_HOME, "do.py")
-    _load_module_from_path(default_path, "do_default")
+    owner = LAZY.get(name)
+    if owner is None:
+        return False
+    registries = (COMMANDS, DEPENDENCIES, OPTIONS)
+    before = [dict(registry) for registry in registries]
+    _load_module_from_path(*owner)
+    for registry, previous in zip(registries, before):
+        for key in [k for k in registry if registry[k] is not previous.get(k)]:
+            if LAZY.get(key) == owner:
+                continue
+            if key in previous:
+                registry[key] = previous[key]
+            else:
+                del registry[key]
+    _shadow([key for key, module in list(LAZY.items()) if module == owner])
+    return True
+
 
-    cwd_path = os.path.join(os.getcwd(), "do.py")
-    _load_module_from_path(cwd_path, "do")
+def ensure_commands_loaded() -> None:
+    """Call `load_commands` unless the `do.py` files were already imported."""
+    if not _loaded:
+        load_commands()
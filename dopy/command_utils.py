@@ -2,20 +2,22 @@ from __future__ import annotations
 
 from typing import Any
 from collections.abc import Callable
+from dopy import history
 from dopy.exception import CommandNotFoundException, InvalidCommandArgumentsException
 from dopy.command import COMMANDS
-import inspect
-from typing import get_origin, get_args
-import pathlib
-import datetime
+from dopy.command_loader import LAZY, import_lazy
+from dopy.binder import binder_for, compile_converter
 
 
 def get_command(name: str):
     """Return the registered command callable for `name`.
 
-    Raises `CommandNotFoundException` if the name is not registered.
+    Commands of task modules are imported on first use. Raises
+    `CommandNotFoundException` if the name is not registered.
     """
     comm = COMMANDS.get(name)
+    if comm is None and import_lazy(name):
+        comm = COMMANDS.get(name)
     if comm is None:
         raise CommandNotFoundException(f"Command '{name}' not found.")
     return comm
@@ -26,11 +28,13 @@ def execute_command(attr: Callable, *args, **kwargs) -> None:
 
     A `TypeError` (wrong arguments) is mapped to
     `InvalidCommandArgumentsException` to provide a clearer API-level error.
+    The call is recorded in `dopy.history`.
     """
-    try:
-        attr(*args, **kwargs)
-    except TypeError as e:
-        raise InvalidCommandArgumentsException(str(e))
+    with history.recording(attr.__name__, args, kwargs):
+        try:
+            attr(*args, **kwargs)
+        except TypeError as e:
+            raise InvalidCommandArgumentsException(str(e))
 
 
 def split_commands(args) -> list[tuple[str, list[str]]]:
@@ -44,7 +48,7 @@ def split_commands(args) -> list[tuple[str, list[str]]]:
     current_cmd = None
     current_params: list[str] = []
     for arg in args:
-        if arg in COMMANDS:
+        if arg in COMMANDS or arg in LAZY:
             if current_cmd:
                 result.append((current_cmd, current_params))
             current_cmd = arg
@@ -63,69 +67,7 @@ def _convert_value(value: str, annotation):
     possible. If conversion cannot be performed, return the original
     `value` string.
     """
-    if annotation is inspect._empty:
-        return value
-    # handle common builtins
-    try:
-        if annotation is bool:
-            low = str(value).lower()
-            if low in ("1", "true", "yes", "y", "on"):
-                return True
-            if low in ("0", "false", "no", "n", "off"):
-                return False
-            # fallback: raise to fallthrough
-            raise ValueError()
-        # pathlib.Path
-        if annotation is pathlib.Path:
-            return pathlib.Path(value)
-        # datetime
-        if annotation is datetime.datetime:
-            # try common ISO formats
-            try:
-                return datetime.datetime.fromisoformat(value)
-            except Exception:
-                # fallback to parsing common formats
-                from datetime import datetime as _dt
-
-                for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d"):
-                    try:
-                        return _dt.strptime(value, fmt)
-                    except Exception:
-                        continue
-                # if all fail, fall through to generic conversion
-        # list/set types (e.g. list[str], set[int], typing.List[str])
-        origin = get_origin(annotation)
-        if origin in (list, set, tuple):
-            # split by comma into elements (empty string -> empty list)
-            if value == "":
-                elements = []
-            else:
-                elements = [s.strip() for s in value.split(",")]
-            elem_type = None
-            args = get_args(annotation)
-            if args:
-                elem_type = args[0]
-            converted = []
-            for el in elements:
-                if elem_type:
-                    try:
-                        converted.append(_convert_value(el, elem_type))
-                    except Exception:
-                        converted.append(el)
-                else:
-                    converted.append(el)
-            if origin is set:
-                return set(converted)
-            if origin is tuple:
-                return tuple(converted)
-            return converted
-        # For simple types like int, float, str
-        if annotation in (int, float, str):
-            return annotation(value)
-        return value
-    except Exception:
-        # If conversion fails, return the original string
-        return value
+    return compile_converter(annotation)(value)
 
 
 def resolve_arguments(
@@ -134,38 +76,28 @@ def resolve_arguments(
     """Resolve positional and keyword arguments for `fn`, converting types
     based on annotations when available.
 
-    `passed_kwargs` is a per-run dict parsed from `key=value` args.
+    `passed_kwargs` is a per-run dict parsed from `key=value` args. Positional
+    values take precedence over keywords of the same parameter; if `fn`
+    accepts `**kwargs`, all keywords are passed through unconverted. The
+    signature analysis is cached on `fn` (see `dopy.binder`).
     """
-    sig = inspect.signature(fn)
-    params = list(sig.parameters.values())
-
-    # Convert positional args according to parameter annotations
-    converted_pos = []
-    for i, val in enumerate(positional_args):
-        if i < len(params):
-            ann = params[i].annotation
-            converted_pos.append(_convert_value(val, ann))
-        else:
-            converted_pos.append(val)
-
-    # If function accepts **kwargs, pass all passed_kwargs through (no annotation info)
-    has_var_kw = any(p.kind == inspect.Parameter.VAR_KEYWORD for p in params)
-    if has_var_kw:
-        return converted_pos, dict(passed_kwargs)
+    return binder_for(fn).bind(positional_args, passed_kwargs)
 
-    # Otherwise, map provided key-values into named parameters and convert types
-    kw = {}
-    # Determine which parameter names were already provided positionally
-    positional_param_names = [p.name for p in params[: len(converted_pos)]]
 
-    for name, p in sig.parameters.items():
-        # Skip parameters already provided positionally
-        if name in positional_param_names:
-            continue
-        if name in passed_kwargs:
-            kw[name] = _convert_value(passed_kwargs[name], p.annotation)
+def split_kwargs(args: list[str]) -> tuple[list[str], dict[str, str]]:
+    """Separate `key=value` tokens from the other tokens.
 
-    return converted_pos, kw
+    Returns the remaining tokens in order and the per-run keyword dict.
+    """
+    params: list[str] = []
+    local_kwargs: dict[str, str] = {}
+    for arg in args:
+        if "=" in arg:
+            key, value = arg.split("=", 1)
+            local_kwargs[key] = value
+        else:
+            params.append(arg)
+    return params, local_kwargs
 
 
 def parse_args(args: list[str]):
@@ -176,14 +108,7 @@ def parse_args(args: list[str]):
     where possible.
     """
     commands: list[tuple[Callable, list[Any], dict[str, Any]]] = []
-    params: list[str] = []
-    local_kwargs: dict[str, str] = {}
-    for arg in args:
-        if "=" in arg:
-            key, value = arg.split("=", 1)
-            local_kwargs[key] = value
-        else:
-            params.append(arg)
+    params, local_kwargs = split_kwargs(args)
     functions = split_commands(params)
     for func_name, func_params in functions:
         func = get_command(func_name)
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import os
+import re
+import shlex
+import sys
+
+
+def split_arg_string(string: str) -> list[str]:
+    """Split a command line like click does, keeping an unfinished last token."""
+    lex = shlex.shlex(string, posix=True)
+    lex.whitespace_split = True
+    lex.commenters = ""
+    out = []
+    try:
+        for token in lex:
+            out.append(token)
+    except ValueError:
+        out.append(lex.token)
+    return out
+
+
+def candidates(args: list[str], incomplete: str) -> list[tuple[str, str]]:
+    """Return `(value, help)` completions for the words after `dopy`.
+
+    Uses the command index, so the `do.py` files are only imported when it
+    is missing or stale. No argument value is converted.
+    """
+    from dopy.command_helper import completion_candidates, decode_params
+    from dopy.command_index import load_index
+
+    load_index()
+    return completion_candidates(decode_params(args), incomplete)
+
+
+def _completion_args(shell: str) -> tuple[list[str], str]:
+    if shell == "bash":
+        words = split_arg_string(os.environ["COMP_WORDS"])
+        cword = int(os.environ["COMP_CWORD"])
+        return words[1:cword], words[cword] if cword < len(words) else ""
+    line = os.environ.get("_TYPER_COMPLETE_ARGS", "")
+    words = split_arg_string(line)
+    if shell in ("powershell", "pwsh"):
+        incomplete = os.environ.get("_TYPER_COMPLETE_WORD_TO_COMPLETE", "")
+        return (words[1:-1] if incomplete else words[1:]), incomplete
+    args = words[1:]
+    if args and not line.endswith(" "):
+        return args[:-1], args[-1]
+    return args, ""
+
+
+def _zsh_escape(s: str) -> str:
+    return (
+        s.replace('"', '""')
+        .replace("'", "''")
+        .replace("$", "\\$")
+        .replace("`", "\\`")
+        .replace(":", r"\\:")
+    )
+
+
+def _format(shell: str, items: list[tuple[str, str]]) -> tuple[str, int]:
+    """Render `items` the way typer's completion scripts expect them."""
+    if shell == "bash":
+        return "\n".join(value for value, _ in items), 0
+    if shell == "zsh":
+        if not items:
+            return "_files", 0
+        lines = [
+            f'"{_zsh_escape(value)}":"{_zsh_escape(help)}"'
+            if help
+            else f'"{_zsh_escape(value)}"'
+            for value, help in items
+        ]
+        return "_arguments '*: :((" + "\n".join(lines) + "))'", 0
+    if shell == "fish":
+        action = os.environ.get("_TYPER_COMPLETE_FISH_ACTION", "")
+        if action == "is-args":
+            return "", 0 if items else 1
+        lines = [
+            value + "\t" + re.sub(r"\s", " ", help) if help else value
+            for value, help in items
+        ]
+        return "\n".join(lines) if action == "get-args" else "", 0
+    return "\n".join(f"{value}:::{help or ' '}" for value, help in items), 0
+
+
+def complete_shell(instruction: str) -> int | None:
+    """Answer a `_DOPY_COMPLETE=complete_<shell>` request without typer.
+
+    Returns the exit code, or None when the request needs typer: other
+    instructions (such as printing the completion script), unknown shells
+    and completing options.
+    """
+    shell = instruction.removeprefix("complete_")
+    if shell == instruction or shell not in (
+        "bash",
+        "zsh",
+        "fish",
+        "powershell",
+        "pwsh",
+    ):
+        return None
+    try:
+        args, incomplete = _completion_args(shell)
+    except (KeyError, ValueError):
+        return None
+    if any(word.startswith("-") for word in [*args, incomplete]):
+        return None
+    output, code = _format(shell, candidates(args, incomplete))
+    if output:
+        sys.stdout.write(output + "\n")
+    return code
+
+
+def complete_words(words: list[str]) -> int:
+    """`dopy __complete <word>...`: print `value<TAB>help` candidates.
+
+    The last word is the one being completed (pass "" for a new word). This
+    is a shell-agnostic entry point for custom completion scripts.
+    """
+    args, incomplete = (words[:-1], words[-1]) if words else ([], "")
+    for value, help in candidates(args, incomplete):
+        sys.stdout.write(f"{value}\t{help}\n" if help else f"{value}\n")
+    return 0
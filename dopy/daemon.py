@@ -0,0 +1,323 @@
+from __future__ import annotations
+
+import json
+import os
+import socket
+import struct
+import sys
+
+from dopy.config import DOPY_HOME
+
+REQUEST_TIMEOUT = 5.0
+"""Seconds a client may take to send its request before it is dropped."""
+
+_HEADER = struct.Struct("!I")
+_STATUS = struct.Struct("!i")
+
+
+def socket_path() -> str:
+    return os.path.join(DOPY_HOME, "dopy.sock")
+
+
+def pid_path() -> str:
+    return os.path.join(DOPY_HOME, "dopy.pid")
+
+
+def _recv_exact(conn: socket.socket, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed by peer.")
+        data += chunk
+    return data
+
+
+def forward(argv: list[str]) -> int | None:
+    """Run `argv` on the daemon and return its exit code.
+
+    Returns None when no daemon is listening, so the caller can run the
+    command itself. Ctrl-C is forwarded to the running command.
+    """
+    try:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(socket_path())
+    except OSError:
+        return None
+    with conn:
+        request = json.dumps(
+            {"argv": argv, "cwd": os.getcwd(), "env": dict(os.environ)}
+        ).encode()
+        socket.send_fds(conn, [_HEADER.pack(len(request))], [0, 1, 2])
+        conn.sendall(request)
+        while True:
+            try:
+                return _STATUS.unpack(_recv_exact(conn, _STATUS.size))[0]
+            except KeyboardInterrupt:
+                conn.sendall(b"I")
+            except ConnectionError:
+                return 1
+
+
+class Server:
+    """Opt-in background server that keeps dopy and the `do.py` files warm.
+
+    Clients (see `forward`) send argv, cwd and environment over a Unix domain
+    socket under `DOPY_HOME`, together with their stdin/stdout/stderr file
+    descriptors. The server forks one child per request, so requests cannot
+    leak state into each other, while the parent keeps typer, rich and every
+    project's `do.py` modules (and their imports) loaded.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._listener: socket.socket | None = None
+        self.projects: dict[str, tuple[list, dict, dict, dict, dict, dict]] = {}
+        """cwd -> (source stamps, COMMANDS, DEPENDENCIES, OPTIONS, LAZY, STUBS)
+        snapshot."""
+
+    def _stamps(self) -> list:
+        from dopy.command_loader import sources
+
+        stamps = []
+        for path, _, _ in sources():
+            try:
+                stamps.append((path, os.stat(path).st_mtime_ns))
+            except OSError:
+                stamps.append((path, None))
+        return stamps
+
+    def activate(self, cwd: str) -> None:
+        """Make the registry hold the commands of the project at `cwd`.
+
+        The `do.py` files are only executed again when their mtime changed
+        since they were last loaded for this project.
+        """
+        from dopy import command_loader
+        from dopy.command import COMMANDS, DEPENDENCIES, OPTIONS
+        from dopy.command_index import INDEX
+
+        os.chdir(cwd)
+        INDEX.clear()
+        stamps = self._stamps()
+        cached = self.projects.get(cwd)
+        registries = (
+            COMMANDS,
+            DEPENDENCIES,
+            OPTIONS,
+            command_loader.LAZY,
+            command_loader.STUBS,
+        )
+        for registry in registries:
+            registry.clear()
+        command_loader._loaded = False
+        if cached is not None and cached[0] == stamps:
+            for registry, snapshot in zip(registries, cached[1:]):
+                registry.update(snapshot)
+            command_loader._loaded = True
+            return
+        self.projects.pop(cwd, None)
+        try:
+            command_loader.load_commands()
+        except Exception:
+            # Leave the registry unloaded; the request reloads and reports it.
+            for registry in registries:
+                registry.clear()
+            command_loader._loaded = False
+            return
+        self.projects[cwd] = (stamps, *(dict(registry) for registry in registries))
+
+    def handle(self, conn: socket.socket) -> None:
+        """Read one request and run it in a forked child.
+
+        Requests are read one at a time, so a client that stays silent is
+        dropped after `REQUEST_TIMEOUT` seconds instead of blocking the rest.
+        """
+        conn.settimeout(REQUEST_TIMEOUT)
+        header, fds, _, _ = socket.recv_fds(conn, _HEADER.size, 3)
+        try:
+            header += _recv_exact(conn, _HEADER.size - len(header))
+            request = json.loads(_recv_exact(conn, _HEADER.unpack(header)[0]))
+            try:
+                self.activate(request["cwd"])
+            except OSError:
+                pass
+            sys.stdout.flush()
+            sys.stderr.flush()
+            if os.fork() == 0:
+                try:
+                    if self._listener is not None:
+                        self._listener.close()
+                    conn.settimeout(None)
+                    _run_request(conn, fds, request)
+                finally:
+                    os._exit(1)
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+    def serve(self) -> None:
+        import signal
+
+        import dopy.app  # noqa: F401  (warm up typer and rich)
+
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+            server.bind(self.path)
+            # Requests carry argv and env to run; only the owner may connect.
+            # Before listen(), so no one connects while it is still open.
+            os.chmod(self.path, 0o600)
+            server.listen(64)
+            server.settimeout(1.0)
+            self._listener = server
+            try:
+                while True:
+                    _reap_children()
+                    try:
+                        conn, _ = server.accept()
+                    except TimeoutError:
+                        continue
+                    with conn:
+                        try:
+                            self.handle(conn)
+                        except (OSError, ValueError, KeyError):
+                            continue
+            finally:
+                if os.path.exists(self.path):
+                    os.unlink(self.path)
+
+
+def _reap_children() -> None:
+    while True:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+
+
+def _watch_interrupts(conn: socket.socket) -> None:
+    """Turn an interrupt byte (or a vanished client) into SIGINT."""
+    import signal
+    import threading
+
+    def watch():
+        try:
+            data = conn.recv(1)
+        except OSError:
+            data = b""
+        if data == b"I" or not data:
+            os.kill(os.getpid(), signal.SIGINT)
+
+    threading.Thread(target=watch, daemon=True).start()
+
+
+def _run_request(conn: socket.socket, fds: list[int], request: dict) -> None:
+    """Body of the forked child: adopt the client's stdio and env, then run."""
+    import signal
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+    os.environ.clear()
+    os.environ.update(request["env"])
+    sys.stdout.reconfigure(line_buffering=os.isatty(1))  # type: ignore[union-attr]
+    app = sys.modules.get("dopy.app")
+    if app is not None:
+        # Detect the client's terminal instead of the daemon's log file.
+        app.console = app.Console()
+    _watch_interrupts(conn)
+    from dopy import history
+    from dopy.cli import dispatch
+
+    try:
+        code = dispatch(request["argv"])
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except KeyboardInterrupt:
+        code = 130
+    # os._exit skips the atexit hooks.
+    history.flush()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    try:
+        conn.sendall(_STATUS.pack(code))
+    finally:
+        os._exit(0)
+
+
+def is_running() -> bool:
+    """Return True if a daemon accepts connections on the socket."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        try:
+            conn.connect(socket_path())
+        except OSError:
+            return False
+    return True
+
+
+def start() -> None:
+    """Start the daemon in the background, detached from the terminal."""
+    if os.fork() > 0:
+        return
+    os.setsid()
+    if os.fork() > 0:
+        os._exit(0)
+    os.makedirs(DOPY_HOME, exist_ok=True)
+    with open(pid_path(), "w") as f:
+        f.write(str(os.getpid()))
+    log = os.open(
+        os.path.join(DOPY_HOME, "daemon.log"), os.O_WRONLY | os.O_CREAT | os.O_APPEND
+    )
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.dup2(log, 1)
+    os.dup2(log, 2)
+    try:
+        Server(socket_path()).serve()
+    finally:
+        os._exit(0)
+
+
+def stop() -> bool:
+    """Stop a running daemon. Returns False if none was running."""
+    import signal
+
+    try:
+        with open(pid_path()) as f:
+            pid = int(f.read())
+        os.kill(pid, signal.SIGTERM)
+    except (OSError, ValueError):
+        return False
+    os.unlink(pid_path())
+    return True
+
+
+def main(argv: list[str] | None = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    action = argv[0] if argv else "status"
+    if action == "start":
+        start()
+    elif action == "stop":
+        if not stop():
+            print("dopy daemon is not running")
+            return 1
+    elif action == "serve":
+        Server(socket_path()).serve()
+    elif action == "status":
+        running = is_running()
+        print(f"dopy daemon is {'running' if running else 'not running'}")
+        return 0 if running else 1
+    else:
+        print("usage: python -m dopy.daemon [start|stop|status|serve]")
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,3 +8,20 @@ class CommandNotFoundException(DopyException):
 
 class InvalidCommandArgumentsException(DopyException):
     """Raised when command arguments are invalid"""
+
+
+class DependencyCycleException(DopyException):
+    """Raised when command dependencies form a cycle"""
+
+
+class FanOutException(DopyException):
+    """Raised when runs of a command mapped over a list fail
+
+    `errors` holds the `(element, exception)` pairs of the failed runs and
+    `results` the result of every element in input order (None on failure).
+    """
+
+    def __init__(self, message: str, errors: list, results: list):
+        super().__init__(message)
+        self.errors = errors
+        self.results = results
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import inspect
+import sys
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from functools import wraps
+from typing import Any
+
+from dopy.exception import FanOutException
+from dopy.output import capture, routed
+
+
+def _run_captured(wrapper: Callable, args: tuple, kwargs: dict) -> tuple[str, Any]:
+    with capture() as buffer:
+        try:
+            result = wrapper(*args, **kwargs)
+        except Exception as e:
+            e.dopy_output = buffer.getvalue()  # type: ignore[attr-defined]
+            raise
+    return buffer.getvalue(), result
+
+
+def _list_signature(wrapper: Callable, param: str) -> inspect.Signature:
+    signature = inspect.signature(wrapper)
+    parameter = signature.parameters[param]
+    annotation = parameter.annotation
+    if annotation is inspect.Parameter.empty or isinstance(annotation, str):
+        annotation = list
+    else:
+        annotation = list[annotation]  # type: ignore[valid-type]
+    parameters = [
+        p.replace(annotation=annotation) if p.name == param else p
+        for p in signature.parameters.values()
+    ]
+    return signature.replace(parameters=parameters)
+
+
+def fan_out(
+    wrapper: Callable, name: str, param: str, jobs: int | None = None
+) -> Callable:
+    """Run `wrapper` once per element of its list argument `param`.
+
+    The parameter is annotated as the element type (`region: str`) and
+    accepts a list on the command line (`region=eu,us,ap`); each element is
+    converted like a single value. Up to `jobs` elements run at the same
+    time, each with its output printed as one block when it finishes. The
+    results are returned in input order. Every element runs even when some
+    fail; failures are then raised together as a `FanOutException`.
+
+    A value that is not a list, set or tuple runs the command once.
+    """
+    signature = inspect.signature(wrapper)
+    if param not in signature.parameters:
+        raise ValueError(f"Command '{name}' has no parameter {param!r} to map over")
+    position = list(signature.parameters).index(param)
+
+    @wraps(wrapper)
+    def mapped(*args, **kwargs):
+        args_list = list(args)
+        if position < len(args_list):
+            values = args_list[position]
+        elif param in kwargs:
+            values = kwargs[param]
+        else:
+            return wrapper(*args, **kwargs)
+        if not isinstance(values, (list, set, tuple)):
+            return wrapper(*args, **kwargs)
+        values = list(values)
+
+        def call(value: Any) -> tuple[str, Any]:
+            if position < len(args_list):
+                call_args = [*args_list]
+                call_args[position] = value
+                return _run_captured(wrapper, tuple(call_args), kwargs)
+            return _run_captured(wrapper, args, {**kwargs, param: value})
+
+        return _map(name, call, values, jobs)
+
+    mapped.__signature__ = _list_signature(wrapper, param)  # type: ignore[attr-defined]
+    return mapped
+
+
+def _map(name: str, call: Callable, values: list[Any], jobs: int | None) -> list[Any]:
+    stdout = sys.stdout
+    results: list[Any] = [None] * len(values)
+    errors: list[tuple[int, BaseException]] = []
+    with routed(), ThreadPoolExecutor(max_workers=jobs) as pool:
+        running: dict[Future, int] = {
+            pool.submit(call, value): index for index, value in enumerate(values)
+        }
+        try:
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = running.pop(future)
+                    error = future.exception()
+                    if error is None:
+                        output, results[index] = future.result()
+                    else:
+                        output = getattr(error, "dopy_output", "")
+                        errors.append((index, error))
+                    stdout.write(output)
+        except KeyboardInterrupt:
+            from dopy.process import terminate_running
+
+            for future in running:
+                future.cancel()
+            terminate_running()
+            raise
+    if errors:
+        errors.sort(key=lambda item: item[0])
+        details = "; ".join(f"{values[i]}: {error}" for i, error in errors)
+        raise FanOutException(
+            f"{len(errors)} of {len(values)} runs of '{name}' failed: {details}",
+            [(values[i], error) for i, error in errors],
+            results,
+        )
+    return results
@@ -0,0 +1,321 @@
+from __future__ import annotations
+
+import atexit
+import hashlib
+import math
+import os
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+from collections.abc import Iterable, Iterator
+from contextlib import closing, contextmanager
+from contextvars import ContextVar
+from typing import Any, NamedTuple
+
+from dopy.config import DOPY_HOME
+from dopy.incremental import _stable_repr
+
+HISTORY_VERSION = 2
+"""Stored as the database's `user_version`; older databases are reset."""
+
+KEEP = 200
+"""Runs kept per command when the store is compacted."""
+
+COMPACT_EVERY = 512
+"""Inserted runs between two compactions of the store."""
+
+FLUSH_SIZE = 64
+"""Buffered runs that trigger a write before the end of the invocation."""
+
+SAMPLES = 10
+"""Recent successful runs whose median is a command's estimated duration."""
+
+RECENT = 3
+"""Latest successful runs compared against the rolling median."""
+
+BASELINE = 20
+"""Successful runs before the `RECENT` ones forming the rolling median."""
+
+REGRESSION = 1.5
+"""Factor over the rolling median above which a command is flagged."""
+
+
+class Run(NamedTuple):
+    """One finished command call."""
+
+    command: str
+    args: str
+    started: float
+    duration: float
+    status: int
+    rss: int
+    child_cpu: float
+
+
+class Stats(NamedTuple):
+    """Latency summary of a command's successful runs (see `stats`)."""
+
+    command: str
+    runs: int
+    failures: int
+    p50: float
+    p95: float
+    p99: float
+    last: float
+    baseline: float | None
+    regressed: bool
+
+
+class Usage:
+    """Resources of the shell commands run by the current command call."""
+
+    __slots__ = ("child_cpu", "rss")
+
+    def __init__(self) -> None:
+        self.child_cpu = 0.0
+        self.rss = 0
+
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS runs (
+        command TEXT, args TEXT, started REAL, duration REAL, status INTEGER,
+        rss INTEGER, child_cpu REAL
+    );
+    CREATE INDEX IF NOT EXISTS runs_command ON runs (command, started);
+"""
+
+_usage: ContextVar[Usage | None] = ContextVar("dopy_usage", default=None)
+_pending: list[Run] = []
+_lock = threading.Lock()
+_estimates: tuple[int, dict[str, float]] | None = None
+
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+_RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def db_path() -> str:
+    return os.path.join(DOPY_HOME, "cache", "history.sqlite")
+
+
+def _connect() -> sqlite3.Connection:
+    os.makedirs(os.path.dirname(db_path()), exist_ok=True)
+    conn = sqlite3.connect(db_path(), timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    if conn.execute("PRAGMA user_version").fetchone()[0] != HISTORY_VERSION:
+        conn.executescript(
+            f"DROP TABLE IF EXISTS runs; PRAGMA user_version = {HISTORY_VERSION};"
+        )
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def args_hash(args: tuple, kwargs: dict[str, Any]) -> str:
+    """Return a short hash of converted arguments, to tell invocations apart."""
+    data = _stable_repr(args) + "\0" + _stable_repr(kwargs)
+    return hashlib.sha1(data.encode()).hexdigest()[:12]
+
+
+def account(rusage: Any) -> None:
+    """Add the resource usage of a finished shell command to the current call."""
+    usage = _usage.get()
+    if usage is not None and rusage is not None:
+        usage.child_cpu += rusage.ru_utime + rusage.ru_stime
+        usage.rss = max(usage.rss, rusage.ru_maxrss * _RSS_UNIT)
+
+
+def _peak_rss() -> int:
+    try:
+        import resource
+    except ImportError:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _RSS_UNIT
+
+
+@contextmanager
+def recording(command: str, args: tuple, kwargs: dict[str, Any]) -> Iterator[None]:
+    """Time the command call in the block and buffer its `Run`.
+
+    The peak RSS is that of the largest shell command the call ran (see
+    `account`), or of this process for commands that ran none. Runs are
+    written by `flush`.
+    """
+    usage = Usage()
+    token = _usage.set(usage)
+    started = time.time()
+    start = time.perf_counter()
+    status = 0
+    try:
+        yield
+    except BaseException as e:
+        status = 130 if isinstance(e, KeyboardInterrupt) else 1
+        raise
+    finally:
+        duration = time.perf_counter() - start
+        _usage.reset(token)
+        run = Run(
+            command,
+            args_hash(args, kwargs),
+            started,
+            duration,
+            status,
+            usage.rss or _peak_rss(),
+            usage.child_cpu,
+        )
+        with _lock:
+            _pending.append(run)
+            full = len(_pending) >= FLUSH_SIZE
+        if full:
+            flush()
+
+
+def flush() -> None:
+    """Write the buffered runs in one transaction.
+
+    History is best effort: a read-only or locked home is ignored.
+    """
+    with _lock:
+        runs = list(_pending)
+        _pending.clear()
+    record(runs)
+
+
+atexit.register(flush)
+
+
+def record(runs: Iterable[Run]) -> None:
+    """Append `runs` to the store, compacting it every `COMPACT_EVERY` runs."""
+    runs = list(runs)
+    if not runs:
+        return
+    try:
+        with closing(_connect()) as conn, conn:
+            before = conn.execute("SELECT MAX(rowid) FROM runs").fetchone()[0] or 0
+            conn.executemany("INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?)", runs)
+            if before // COMPACT_EVERY != (before + len(runs)) // COMPACT_EVERY:
+                _compact(conn)
+    except sqlite3.Error:
+        pass
+
+
+def _compact(conn: sqlite3.Connection) -> None:
+    """Keep only the last `KEEP` runs of every command."""
+    conn.execute(
+        "DELETE FROM runs WHERE rowid IN (SELECT rowid FROM ("
+        "SELECT rowid, ROW_NUMBER() OVER ("
+        "PARTITION BY command ORDER BY started DESC) AS n FROM runs"
+        ") WHERE n > ?)",
+        (KEEP,),
+    )
+
+
+def _durations() -> dict[str, list[tuple[float, int]]]:
+    """Return the `(duration, status)` of every command's runs, newest first."""
+    runs: dict[str, list[tuple[float, int]]] = {}
+    if not os.path.exists(db_path()):
+        return runs
+    try:
+        with closing(_connect()) as conn, conn:
+            rows = conn.execute(
+                "SELECT command, duration, status FROM runs ORDER BY started DESC"
+            ).fetchall()
+    except sqlite3.Error:
+        return runs
+    for command, duration, status in rows:
+        runs.setdefault(command, []).append((duration, status))
+    return runs
+
+
+def _stamp() -> int | None:
+    # With WAL, new runs land in the -wal file first.
+    try:
+        return sum(
+            os.stat(path).st_mtime_ns
+            for path in (db_path(), db_path() + "-wal")
+            if os.path.exists(path)
+        )
+    except OSError:
+        return None
+
+
+def estimates() -> dict[str, float]:
+    """Return the estimated duration in seconds of every command with history.
+
+    The estimate is the median of its last `SAMPLES` successful runs. The
+    result is kept until the store changes.
+    """
+    global _estimates
+    stamp = _stamp()
+    if not stamp:
+        return {}
+    with _lock:
+        if _estimates is not None and _estimates[0] == stamp:
+            return _estimates[1]
+    result = {}
+    for command, runs in _durations().items():
+        samples = [duration for duration, status in runs if status == 0][:SAMPLES]
+        if samples:
+            result[command] = statistics.median(samples)
+    with _lock:
+        _estimates = (stamp, result)
+    return result
+
+
+def estimate(command: str) -> float | None:
+    """Return the estimated duration of `command`, None without history."""
+    return estimates().get(command)
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Return the nearest-rank `q`th percentile of `values`."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(q / 100 * len(ordered)) - 1, 0)]
+
+
+def stats(commands: Iterable[str] = ()) -> list[Stats]:
+    """Summarize the kept runs of `commands` (all by default).
+
+    A command is flagged as `regressed` when the median of its last
+    `RECENT` successful runs exceeds `REGRESSION` times the median of the
+    `BASELINE` runs before them.
+    """
+    wanted = set(commands)
+    rows = []
+    for command, runs in sorted(_durations().items()):
+        if wanted and command not in wanted:
+            continue
+        durations = [duration for duration, status in runs if status == 0]
+        if not durations:
+            continue
+        recent = durations[:RECENT]
+        before = durations[RECENT : RECENT + BASELINE]
+        baseline = statistics.median(before) if len(before) >= RECENT else None
+        rows.append(
+            Stats(
+                command,
+                len(runs),
+                len(runs) - len(durations),
+                percentile(durations, 50),
+                percentile(durations, 95),
+                percentile(durations, 99),
+                durations[0],
+                baseline,
+                baseline is not None
+                and statistics.median(recent) > REGRESSION * baseline,
+            )
+        )
+    return rows
+
+
+def clear() -> None:
+    global _estimates
+    with _lock:
+        _estimates = None
+        _pending.clear()
+    for suffix in ("", "-wal", "-shm"):
+        try:
+            os.remove(db_path() + suffix)
+        except FileNotFoundError:
+            pass
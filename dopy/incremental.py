@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import glob
+import hashlib
+import inspect
+import json
+import os
+import sys
+import threading
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from typing import Any
+
+STATE_DIR = ".dopy"
+"""Project-local directory (relative to cwd) holding dopy's run state."""
+
+FileState = list[Any]
+"""`[mtime_ns, size, sha256]` of one file."""
+
+
+def as_patterns(patterns: str | Iterable[str]) -> list[str]:
+    """Normalise a single glob or an iterable of globs into a list."""
+    if isinstance(patterns, str):
+        return [patterns]
+    return list(patterns)
+
+
+def _walk(directory: str) -> Iterable[tuple[str, os.stat_result]]:
+    stack = [directory]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    yield entry.path, entry.stat()
+
+
+def scan(patterns: list[str]) -> dict[str, os.stat_result]:
+    """Return the stat of every file matched by `patterns`.
+
+    Patterns are `glob` patterns (`**` is recursive); a matched directory
+    stands for every file below it.
+    """
+    files: dict[str, os.stat_result] = {}
+    for pattern in patterns:
+        for path in glob.iglob(pattern, recursive=True):
+            if os.path.isdir(path):
+                files.update(_walk(path))
+            elif path not in files:
+                try:
+                    files[path] = os.stat(path)
+                except OSError:
+                    continue
+    return files
+
+
+def _hash_file(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def fingerprint(
+    patterns: list[str], previous: dict[str, FileState] | None = None
+) -> dict[str, FileState]:
+    """Return `{path: [mtime_ns, size, sha256]}` for the files in `patterns`.
+
+    Files whose mtime and size match `previous` reuse the recorded hash, so
+    an unchanged tree costs one `stat` per file. The remaining files are
+    hashed in parallel.
+    """
+    previous = previous or {}
+    result: dict[str, FileState] = {}
+    to_hash: list[tuple[str, os.stat_result]] = []
+    for path, st in scan(patterns).items():
+        old = previous.get(path)
+        if old is not None and old[0] == st.st_mtime_ns and old[1] == st.st_size:
+            result[path] = old
+        else:
+            to_hash.append((path, st))
+    if to_hash:
+        with ThreadPoolExecutor() as pool:
+            digests = pool.map(_hash_file, [path for path, _ in to_hash])
+            for (path, st), digest in zip(to_hash, digests):
+                result[path] = [st.st_mtime_ns, st.st_size, digest]
+    return result
+
+
+def _stable_repr(value: Any) -> str:
+    """`repr` that does not depend on set ordering or dict insertion order."""
+    if isinstance(value, set | frozenset):
+        return "{" + ", ".join(sorted(_stable_repr(v) for v in value)) + "}"
+    if isinstance(value, dict):
+        items = sorted((repr(k), _stable_repr(v)) for k, v in value.items())
+        return "{" + ", ".join(f"{k}: {v}" for k, v in items) + "}"
+    if isinstance(value, list | tuple):
+        return type(value).__name__ + str([_stable_repr(v) for v in value])
+    return repr(value)
+
+
+def task_source(func: Callable) -> str:
+    """Return the source of the user function behind `func`."""
+    inner = inspect.unwrap(func)
+    try:
+        return inspect.getsource(inner)
+    except (OSError, TypeError):
+        code = getattr(inner, "__code__", None)
+        return code.co_code.hex() if code is not None else repr(inner)
+
+
+def invocation_key(func: Callable, args: tuple, kwargs: dict[str, Any]) -> str:
+    """Hash the task source together with its (converted) arguments."""
+    data = "\0".join([task_source(func), _stable_repr(args), _stable_repr(kwargs)])
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class StateStore:
+    """Last successful run of one task, stored as JSON under `.dopy/state`."""
+
+    def __init__(self, name: str):
+        self.path = os.path.join(os.getcwd(), STATE_DIR, "state", f"{name}.json")
+
+    def load(self) -> dict[str, Any]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self, state: dict[str, Any]) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+
+    def clear(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _digests(files: dict[str, FileState]) -> dict[str, str]:
+    return {path: state[2] for path, state in files.items()}
+
+
+def _outputs_state(patterns: list[str]) -> dict[str, list[int]] | None:
+    """Return `{path: [mtime_ns, size]}` of the outputs, or None if one is
+    missing (a pattern that matches nothing)."""
+    result: dict[str, list[int]] = {}
+    for pattern in patterns:
+        matched = scan([pattern])
+        if not matched:
+            return None
+        for path, st in matched.items():
+            result[path] = [st.st_mtime_ns, st.st_size]
+    return result
+
+
+def skip_when_up_to_date(
+    wrapper: Callable,
+    name: str,
+    inputs: str | Iterable[str] = (),
+    outputs: str | Iterable[str] = (),
+) -> Callable:
+    """Wrap a command so it is skipped when nothing it depends on changed.
+
+    A run is skipped (returning None) when the task source, its arguments,
+    the content of every `inputs` file and the stat of every `outputs` file
+    are the same as after the last successful run. The state is recorded in
+    `.dopy/state/<name>.json` of the current project and removed when the
+    task fails.
+    """
+    input_patterns = as_patterns(inputs)
+    output_patterns = as_patterns(outputs)
+
+    def check(args, kwargs) -> tuple[StateStore, str, dict] | None:
+        """Return what `record` needs, or None when the run can be skipped."""
+        store = StateStore(name)
+        state = store.load()
+        key = invocation_key(wrapper, args, kwargs)
+        current = fingerprint(input_patterns, state.get("inputs"))
+        outputs = _outputs_state(output_patterns)
+        if (
+            outputs is not None
+            and state.get("key") == key
+            and _digests(state.get("inputs", {})) == _digests(current)
+            and outputs == state.get("outputs")
+        ):
+            print(f"dopy: '{name}' is up to date.", file=sys.stderr)
+            return None
+        store.clear()
+        return store, key, current
+
+    def record(store: StateStore, key: str, current: dict) -> None:
+        # The inputs as the run saw them: an edit made meanwhile must make
+        # the next run happen.
+        store.save(
+            {
+                "key": key,
+                "inputs": current,
+                "outputs": _outputs_state(output_patterns),
+            }
+        )
+
+    if inspect.iscoroutinefunction(wrapper):
+
+        @wraps(wrapper)
+        async def async_incremental_wrapper(*args, **kwargs):
+            pending = check(args, kwargs)
+            if pending is None:
+                return None
+            result = await wrapper(*args, **kwargs)
+            record(*pending)
+            return result
+
+        return async_incremental_wrapper
+
+    @wraps(wrapper)
+    def incremental_wrapper(*args, **kwargs):
+        pending = check(args, kwargs)
+        if pending is None:
+            return None
+        result = wrapper(*args, **kwargs)
+        record(*pending)
+        return result
+
+    return incremental_wrapper
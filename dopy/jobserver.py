@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import os
+import re
+import select
+import shutil
+import stat
+import tempfile
+import threading
+from collections.abc import Iterator, Mapping
+from contextlib import contextmanager
+
+POLL_INTERVAL = 0.1
+"""Seconds between two checks for cancellation while waiting for a token."""
+
+_AUTH = re.compile(r"^--jobserver-(?:auth|fds)=(?:fifo:(.+)|(\d+),(\d+))$")
+
+IMPLICIT = b""
+"""The token every process holds just by running; never written back."""
+
+
+class Jobserver:
+    """Job slots shared with GNU make and nested dopy runs.
+
+    Follows the protocol of make's jobserver: a pipe (or named FIFO) holds
+    one byte per free slot besides the implicit one each process owns.
+    Starting a job takes a byte out, finishing it writes the same byte
+    back. `makeflags` and `child_fds` let child processes (`make`, `dopy`)
+    join the same pool.
+    """
+
+    def __init__(
+        self,
+        read_fd: int,
+        write_fd: int,
+        makeflags: str,
+        child_fds: tuple[int, ...] = (),
+        owned: list[int] | None = None,
+        directory: str | None = None,
+    ):
+        self.makeflags = makeflags
+        self.child_fds = child_fds
+        self._read = read_fd
+        self._write = write_fd
+        self._owned = owned or []
+        self._directory = directory
+        self._implicit = threading.Lock()
+
+    def acquire(self, stop: threading.Event | None = None) -> bytes | None:
+        """Wait for a slot and return its token; None once `stop` is set."""
+        while True:
+            if self._implicit.acquire(blocking=False):
+                return IMPLICIT
+            try:
+                token = os.read(self._read, 1)
+                if token:
+                    return token
+            except (BlockingIOError, InterruptedError):
+                pass
+            if stop is not None and stop.is_set():
+                return None
+            select.select([self._read], [], [], POLL_INTERVAL)
+
+    def release(self, token: bytes | None) -> None:
+        if token is None:
+            return
+        if token == IMPLICIT:
+            self._implicit.release()
+        else:
+            os.write(self._write, token)
+
+    @contextmanager
+    def slot(self, stop: threading.Event | None = None) -> Iterator[bool]:
+        """Hold a slot in the block; yields False if `stop` was set instead."""
+        token = self.acquire(stop)
+        try:
+            yield token is not None
+        finally:
+            self.release(token)
+
+    def close(self) -> None:
+        for fd in self._owned:
+            os.close(fd)
+        self._owned = []
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+
+
+_current: Jobserver | None = None
+_inherited: Jobserver | None = None
+_parsed = False
+_lock = threading.Lock()
+
+
+def _reopen(fd: int) -> int:
+    """Open the pipe behind `fd` again, non-blocking, without sharing flags."""
+    try:
+        return os.open(f"/proc/self/fd/{fd}", os.O_RDWR | os.O_NONBLOCK)
+    except OSError:
+        os.set_blocking(fd, False)
+        return os.dup(fd)
+
+
+def _is_fifo(fd: int) -> bool:
+    try:
+        return stat.S_ISFIFO(os.fstat(fd).st_mode)
+    except OSError:
+        return False
+
+
+def from_makeflags(makeflags: str) -> Jobserver | None:
+    """Join the jobserver announced in `makeflags`, if it is reachable.
+
+    Understands `--jobserver-auth=fifo:PATH` (make 4.4) and
+    `--jobserver-auth=R,W` / `--jobserver-fds=R,W` with inherited file
+    descriptors. Like make, an unreachable jobserver is ignored.
+    """
+    auth = None
+    for word in makeflags.split():
+        if word == "--":
+            break
+        match = _AUTH.match(word)
+        if match is not None:
+            auth = match
+    if auth is None:
+        return None
+    path, read_fd, write_fd = auth.groups()
+    if path is not None:
+        try:
+            fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+        except OSError:
+            return None
+        return Jobserver(fd, fd, makeflags, owned=[fd])
+    read_fd, write_fd = int(read_fd), int(write_fd)
+    if not (_is_fifo(read_fd) and _is_fifo(write_fd)):
+        return None
+    fd = _reopen(read_fd)
+    return Jobserver(fd, fd, makeflags, child_fds=(read_fd, write_fd), owned=[fd])
+
+
+def inherited() -> Jobserver | None:
+    """Return the jobserver of a parent `make` or `dopy`, if any."""
+    global _inherited, _parsed
+    with _lock:
+        if not _parsed:
+            _parsed = True
+            _inherited = from_makeflags(os.environ.get("MAKEFLAGS", ""))
+        return _inherited
+
+
+def current() -> Jobserver | None:
+    """Return the jobserver shell commands started now should join."""
+    return _current or inherited()
+
+
+def _makeflags(existing: str, jobs: int, read_fd: int, write_fd: int) -> str:
+    words = existing.split()
+    if words and not words[0].startswith("-"):
+        # The first word holds make's single-letter flags without a dash.
+        words[0] = "-" + words[0]
+    words = [word for word in words if not word.startswith(("-j", "--jobserver"))]
+    return " ".join([f"-j{jobs}", f"--jobserver-auth={read_fd},{write_fd}", *words])
+
+
+def create(jobs: int) -> Jobserver:
+    """Create a jobserver with `jobs` slots, the implicit one included.
+
+    The slots live in a FIFO in a temporary directory. Children get their
+    own blocking descriptors for it, since make 4.3 only understands
+    inherited `R,W` descriptors.
+    """
+    directory = tempfile.mkdtemp(prefix="dopy-jobserver-")
+    path = os.path.join(directory, "fifo")
+    os.mkfifo(path, 0o600)
+    fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+    child_read = os.open(path, os.O_RDWR)
+    child_write = os.open(path, os.O_WRONLY)
+    os.write(fd, b"+" * (jobs - 1))
+    makeflags = _makeflags(
+        os.environ.get("MAKEFLAGS", ""), jobs, child_read, child_write
+    )
+    return Jobserver(
+        fd,
+        fd,
+        makeflags,
+        child_fds=(child_read, child_write),
+        owned=[fd, child_read, child_write],
+        directory=directory,
+    )
+
+
+@contextmanager
+def serving(jobs: int) -> Iterator[Jobserver | None]:
+    """Provide `jobs` slots to this run and its children while in the block.
+
+    Joins the inherited jobserver instead when there is one, so a nested
+    run shares its parent's slots. Yields None where FIFOs are unsupported.
+    """
+    global _current
+    server = inherited()
+    if server is not None:
+        yield server
+        return
+    if not hasattr(os, "mkfifo") or jobs <= 1:
+        yield None
+        return
+    server = create(jobs)
+    previous, _current = _current, server
+    try:
+        yield server
+    finally:
+        _current = previous
+        server.close()
+
+
+def child_env(
+    env: Mapping[str, str] | None,
+) -> tuple[dict[str, str] | None, tuple[int, ...]]:
+    """Return the environment and descriptors for a shell command.
+
+    With an active jobserver `MAKEFLAGS` points to it (unless `env` sets
+    it) and its descriptors are passed on; otherwise `env` is added to the
+    current environment as before.
+    """
+    server = current()
+    if server is None:
+        return (None if env is None else {**os.environ, **env}), ()
+    return {**os.environ, "MAKEFLAGS": server.makeflags, **(env or {})}, (
+        server.child_fds
+    )
+
+
+def _forget() -> None:
+    # A forked child (watch mode, daemon) sets up its own runs.
+    global _current
+    _current = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget)
@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import inspect
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from contextlib import closing
+from functools import wraps
+from typing import Any
+
+from dopy.config import DOPY_HOME
+from dopy.incremental import invocation_key
+
+DEFAULT_MAXSIZE = 128
+"""Entries kept per command when `cache_maxsize` is not given."""
+
+_MISSING = object()
+
+
+def db_path() -> str:
+    return os.path.join(DOPY_HOME, "cache", "memo.sqlite")
+
+
+class MemoryCache:
+    """Thread-safe in-process LRU cache with an optional TTL."""
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        """Return the cached value or `_MISSING`."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (self.ttl is None or entry[0] > time.time()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self._entries.pop(key, None)
+            self.misses += 1
+            return _MISSING
+
+    def set(self, key: str, value: Any, created: float | None = None) -> None:
+        expires = (created or time.time()) + (self.ttl or 0)
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class DiskCache:
+    """Pickled results in an sqlite database under `DOPY_HOME/cache`.
+
+    Entries are evicted least-recently-used once a command has more than
+    `maxsize` of them, and ignored (then deleted) once older than `ttl`.
+    Hits and misses are counted per command for `dopy --cache-stats`.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS entries (
+            command TEXT, key TEXT, value BLOB, created REAL, accessed REAL,
+            PRIMARY KEY (command, key)
+        );
+        CREATE TABLE IF NOT EXISTS stats (
+            command TEXT PRIMARY KEY, hits INTEGER, misses INTEGER
+        );
+    """
+
+    def __init__(
+        self, command: str, maxsize: int = DEFAULT_MAXSIZE, ttl: float | None = None
+    ):
+        self.command = command
+        self.maxsize = maxsize
+        self.ttl = ttl
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(db_path()), exist_ok=True)
+        conn = sqlite3.connect(db_path(), timeout=30)
+        conn.executescript(self._SCHEMA)
+        return conn
+
+    def _count(self, conn: sqlite3.Connection, column: str) -> None:
+        conn.execute(
+            "INSERT INTO stats VALUES (?, 0, 0) ON CONFLICT(command) DO NOTHING",
+            (self.command,),
+        )
+        conn.execute(
+            f"UPDATE stats SET {column} = {column} + 1 WHERE command = ?",
+            (self.command,),
+        )
+
+    def get(self, key: str) -> tuple[Any, float]:
+        """Return `(value, created)` or `(_MISSING, 0)`."""
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute(
+                "SELECT value, created FROM entries WHERE command = ? AND key = ?",
+                (self.command, key),
+            ).fetchone()
+            if row is not None and (self.ttl is None or row[1] + self.ttl > now):
+                try:
+                    value = pickle.loads(row[0])
+                except Exception:
+                    value = _MISSING
+                if value is not _MISSING:
+                    conn.execute(
+                        "UPDATE entries SET accessed = ? WHERE command = ? AND key = ?",
+                        (now, self.command, key),
+                    )
+                    self._count(conn, "hits")
+                    return value, row[1]
+            if row is not None:
+                conn.execute(
+                    "DELETE FROM entries WHERE command = ? AND key = ?",
+                    (self.command, key),
+                )
+            self._count(conn, "misses")
+        return _MISSING, 0.0
+
+    def set(self, key: str, value: Any) -> None:
+        try:
+            blob = pickle.dumps(value)
+        except Exception:
+            return
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                (self.command, key, blob, now, now),
+            )
+            conn.execute(
+                """DELETE FROM entries WHERE command = ? AND key NOT IN (
+                    SELECT key FROM entries WHERE command = ?
+                    ORDER BY accessed DESC LIMIT ?)""",
+                (self.command, self.command, self.maxsize),
+            )
+
+
+_caches: dict[str, tuple[MemoryCache, DiskCache | None]] = {}
+"""Command name -> its in-process and (optional) persistent cache."""
+
+
+def memoize(
+    func: Callable,
+    name: str,
+    cache: bool | str = True,
+    ttl: float | None = None,
+    maxsize: int | None = None,
+) -> Callable:
+    """Memoize `func` on its (already converted) arguments.
+
+    `cache=True` or `"memory"` keeps results in an in-process LRU cache;
+    `cache="disk"` additionally persists them (pickled) in sqlite under
+    `DOPY_HOME`, so later runs reuse them. The key includes the function's
+    source, so editing a task invalidates its entries. Exceptions are never
+    cached.
+    """
+    if cache not in (True, "memory", "disk"):
+        raise ValueError(f"Invalid cache option for '{name}': {cache!r}")
+    if maxsize is None:
+        maxsize = DEFAULT_MAXSIZE
+    elif not isinstance(maxsize, int) or maxsize < 1:
+        # 0 would not cache anything; leave `cache` off instead.
+        raise ValueError(f"Invalid cache_maxsize for '{name}': {maxsize!r}")
+    memory = MemoryCache(maxsize, ttl)
+    disk = DiskCache(name, maxsize, ttl) if cache == "disk" else None
+    _caches[name] = (memory, disk)
+
+    def lookup(key: str) -> Any:
+        value = memory.get(key)
+        if value is _MISSING and disk is not None:
+            value, created = disk.get(key)
+            if value is not _MISSING:
+                memory.set(key, value, created)
+        return value
+
+    def store(key: str, value: Any) -> None:
+        memory.set(key, value)
+        if disk is not None:
+            disk.set(key, value)
+
+    if inspect.iscoroutinefunction(func):
+
+        @wraps(func)
+        async def async_memoized(*args, **kwargs):
+            key = invocation_key(func, args, kwargs)
+            value = lookup(key)
+            if value is _MISSING:
+                value = await func(*args, **kwargs)
+                store(key, value)
+            return value
+
+        return async_memoized
+
+    @wraps(func)
+    def memoized(*args, **kwargs):
+        key = invocation_key(func, args, kwargs)
+        value = lookup(key)
+        if value is _MISSING:
+            value = func(*args, **kwargs)
+            store(key, value)
+        return value
+
+    return memoized
+
+
+def clear() -> None:
+    """Drop every in-process cache and the persistent store."""
+    for memory, _ in _caches.values():
+        memory.clear()
+    try:
+        os.remove(db_path())
+    except FileNotFoundError:
+        pass
+
+
+def stats() -> list[tuple[str, int, int, int, int]]:
+    """Return `(command, entries, bytes, hits, misses)` rows.
+
+    Persistent counts come from the store; commands cached in memory during
+    this process add their own hits (and, without a store, their misses).
+    """
+    rows: dict[str, list[int]] = {}
+    if os.path.exists(db_path()):
+        with closing(sqlite3.connect(db_path())) as conn, conn:
+            conn.executescript(DiskCache._SCHEMA)
+            for command, hits, misses in conn.execute("SELECT * FROM stats"):
+                rows[command] = [0, 0, hits, misses]
+            for command, count, size in conn.execute(
+                "SELECT command, COUNT(*), SUM(LENGTH(value)) FROM entries "
+                "GROUP BY command"
+            ):
+                row = rows.setdefault(command, [0, 0, 0, 0])
+                row[0], row[1] = count, size or 0
+    for command, (memory, disk) in _caches.items():
+        if memory.hits or memory.misses:
+            row = rows.setdefault(command, [0, 0, 0, 0])
+            row[2] += memory.hits
+            if disk is None:
+                row[3] += memory.misses
+    return [(command, *row) for command, row in sorted(rows.items())]
@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import IO, Any, TextIO
+
+SPILL_SIZE = 1 << 20
+"""Characters of a task's buffered output kept in memory before it is
+spilled to a temporary file."""
+
+OUTPUT_MODES = ("group", "prefix", "raw")
+"""How the output of parallel tasks is shown, see `Router`."""
+
+_local = threading.local()
+_write_lock = threading.Lock()
+
+task_sink: ContextVar[TextIO | None] = ContextVar("dopy_task_sink", default=None)
+"""Sink of an async command; those share one thread, so a thread-local
+cannot tell them apart (see `dopy.aio`)."""
+
+
+def current_sink() -> TextIO | None:
+    """Return the stream capturing the current thread's (or task's) output."""
+    return task_sink.get() or getattr(_local, "sink", None)
+
+
+class RoutedStream:
+    """Text stream proxy that sends writes to the current thread's sink.
+
+    Threads without a sink write straight through to the wrapped stream.
+    """
+
+    def __init__(self, stream: TextIO):
+        self._stream = stream
+
+    def write(self, s: str) -> int:
+        return (current_sink() or self._stream).write(s)
+
+    def flush(self) -> None:
+        sink = current_sink()
+        if sink is None:
+            self._stream.flush()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._stream, name)
+
+
+class Spool:
+    """Text buffer that stays in memory up to `SPILL_SIZE`, then in a file.
+
+    With `path` the buffer is that file from the start, so a log file and
+    the buffer replayed to the terminal are one copy of the output.
+    """
+
+    def __init__(self, path: str | None = None):
+        self.file: IO[str]
+        if path is None:
+            self.file = tempfile.SpooledTemporaryFile(  # noqa: SIM115
+                max_size=SPILL_SIZE, mode="w+", encoding="utf-8"
+            )
+        else:
+            self.file = open(path, "w+", encoding="utf-8")  # noqa: SIM115
+
+    def write(self, s: str) -> int:
+        return self.file.write(s)
+
+    def flush(self) -> None:
+        pass
+
+    def getvalue(self) -> str:
+        self.file.seek(0)
+        value = self.file.read()
+        self.file.seek(0, os.SEEK_END)
+        return value
+
+    def replay(self, stream: TextIO) -> None:
+        """Write the buffered output to `stream` as one block."""
+        self.file.seek(0)
+        with _write_lock:
+            shutil.copyfileobj(self.file, stream)
+        self.file.seek(0, os.SEEK_END)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class LineSink:
+    """Writes complete lines to `stream` as they arrive, each one prefixed.
+
+    An unfinished last line is held back until it is completed or the sink
+    is closed. With `log`, the unprefixed output is also written there.
+    """
+
+    def __init__(self, stream: TextIO, prefix: str = "", log: IO[str] | None = None):
+        self.stream = stream
+        self.prefix = prefix
+        self.log = log
+        self._pending = ""
+
+    def write(self, s: str) -> int:
+        if self.log is not None:
+            self.log.write(s)
+        if not self.prefix:
+            with _write_lock:
+                return self.stream.write(s)
+        text = self._pending + s
+        end = text.rfind("\n") + 1
+        self._pending = text[end:]
+        if end:
+            lines = text[:end].splitlines(keepends=True)
+            with _write_lock:
+                self.stream.write("".join(self.prefix + line for line in lines))
+        return len(s)
+
+    def flush(self) -> None:
+        pass
+
+    def getvalue(self) -> str:
+        # Already shown while the task ran.
+        return ""
+
+    def replay(self, stream: TextIO) -> None:
+        pass
+
+    def close(self) -> None:
+        if self._pending:
+            with _write_lock:
+                self.stream.write(self.prefix + self._pending + "\n")
+            self._pending = ""
+        if self.log is not None:
+            self.log.close()
+
+
+class Router:
+    """Decides where the output of each task of an invocation goes.
+
+    - `group`: parallel tasks are buffered in a `Spool` and written as one
+      block when they finish; sequential tasks write straight through.
+    - `prefix`: every line is written when complete, prefixed with
+      `[task] `.
+    - `raw`: everything is written straight through, possibly interleaved.
+
+    With `log_dir`, each task's output is also written to
+    `<log_dir>/<task>.log` (`<task>.2.log` and so on for repeated tasks).
+    """
+
+    def __init__(self, mode: str = "group", log_dir: str | None = None):
+        if mode not in OUTPUT_MODES:
+            raise ValueError(
+                f"Unknown output mode {mode!r}, use one of {', '.join(OUTPUT_MODES)}"
+            )
+        self.mode = mode
+        self.log_dir = log_dir
+        self._names: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def log_path(self, name: str) -> str | None:
+        if self.log_dir is None:
+            return None
+        with self._lock:
+            count = self._names[name] = self._names.get(name, 0) + 1
+        os.makedirs(self.log_dir, exist_ok=True)
+        suffix = f".{count}" if count > 1 else ""
+        return os.path.join(self.log_dir, f"{name}{suffix}.log")
+
+    def open(self, name: str, stream: TextIO, parallel: bool) -> Any:
+        """Return the sink for task `name`, or None to write straight through."""
+        mode = self.mode
+        if mode == "group" and not parallel:
+            mode = "raw"
+        if mode == "raw" and self.log_dir is None:
+            return None
+        path = self.log_path(name)
+        if mode == "group":
+            return Spool(path)
+        log = None if path is None else open(path, "w", encoding="utf-8")  # noqa: SIM115
+        return LineSink(stream, f"[{name}] " if mode == "prefix" else "", log)
+
+
+_router = Router()
+
+
+def _terminal(stream: TextIO) -> TextIO:
+    while isinstance(stream, RoutedStream):
+        stream = stream._stream
+    return stream
+
+
+@contextmanager
+def routing(mode: str = "group", log_dir: str | None = None) -> Iterator[Router]:
+    """Use a `Router` with `mode` and `log_dir` for the tasks run while active."""
+    global _router
+    previous, _router = _router, Router(mode, log_dir)
+    try:
+        yield _router
+    finally:
+        _router = previous
+
+
+@contextmanager
+def task_output(name: str, parallel: bool = True) -> Iterator[Any]:
+    """Send the current thread's output to the sink of task `name`.
+
+    Yields the sink (None when the output goes straight through), whose
+    `replay` writes buffered output and `getvalue` returns it. The sink is
+    closed by the caller after replaying it.
+    """
+    previous = current_sink()
+    sink = _router.open(name, previous or _terminal(sys.stdout), parallel)
+    if sink is None:
+        yield None
+        return
+    _local.sink = sink
+    try:
+        yield sink
+    finally:
+        _local.sink = previous
+        if not isinstance(sink, Spool):
+            sink.close()
+
+
+@contextmanager
+def redirect(sink: Any) -> Iterator[Any]:
+    """Send everything the current thread writes to `sink` while active.
+
+    `sink` needs `write` and `flush`, like a text stream.
+    """
+    previous = current_sink()
+    _local.sink = sink
+    try:
+        yield sink
+    finally:
+        _local.sink = previous
+
+
+@contextmanager
+def capture() -> Iterator[Spool]:
+    """Capture everything the current thread writes into a `Spool`."""
+    with redirect(Spool()) as buffer:
+        yield buffer
+
+
+@contextmanager
+def routed() -> Iterator[None]:
+    """Route `sys.stdout`/`sys.stderr` through `RoutedStream` while active."""
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout = RoutedStream(stdout)  # type: ignore[assignment]
+    sys.stderr = RoutedStream(stderr)  # type: ignore[assignment]
+    try:
+        yield
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
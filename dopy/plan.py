@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import inspect
+from typing import Any
+
+from dopy import history
+from dopy.command import OPTIONS
+from dopy.scheduler import Invocation, Task, _rank, build_graph, topological_order
+
+
+def format_duration(seconds: float) -> str:
+    if seconds < 1:
+        return f"{seconds * 1000:.0f}ms"
+    if seconds < 60:
+        return f"{seconds:.1f}s"
+    minutes, seconds = divmod(round(seconds), 60)
+    if minutes < 60:
+        return f"{minutes}m {seconds:02d}s"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m"
+
+
+def _bound(task: Task) -> inspect.BoundArguments:
+    bound = inspect.signature(task.fn).bind(*task.args, **task.kwargs)
+    bound.apply_defaults()
+    return bound
+
+
+def describe_arguments(task: Task) -> str:
+    """Return the converted arguments of `task` as `name=value` pairs."""
+    return " ".join(f"{key}={value!r}" for key, value in _bound(task).arguments.items())
+
+
+def shell_commands(task: Task) -> list[str]:
+    """Return the command strings an `@sh` task would run, without running them.
+
+    With `map=`, one string per element. Other commands yield none.
+    """
+    shell = getattr(task.fn, "__dopy_shell__", None)
+    if shell is None:
+        return []
+    bound = _bound(task)
+    param = OPTIONS.get(task.name, {}).get("map")
+    values = bound.arguments.get(param) if param else None
+    if not isinstance(values, (list, set, tuple)):
+        return [_render(shell, bound.args, bound.kwargs)]
+    commands = []
+    for value in values:
+        bound.arguments[param] = value
+        commands.append(_render(shell, bound.args, bound.kwargs))
+    return commands
+
+
+def _render(shell: Any, args: tuple, kwargs: dict) -> str:
+    command = shell(*args, **kwargs)
+    if inspect.isawaitable(command):
+        from dopy.aio import run
+
+        command = run(command)
+    return str(command)
+
+
+def format_plan(
+    commands: list[Invocation], jobs: int = 1, kwargs: dict[str, str] | None = None
+) -> str:
+    """Return what `run_commands` would run, in order, without running it.
+
+    Every step shows the command, its converted arguments, the expanded
+    `@sh` command strings and its estimated duration from `dopy.history`
+    (`?` for a command that never ran). The total is the sum of the known
+    estimates; with `jobs` it is the critical path instead.
+    """
+    tasks = build_graph(commands, kwargs)
+    ordered = topological_order(tasks)
+    lines = []
+    total = 0.0
+    unknown = 0
+    for index, task in enumerate(ordered, 1):
+        cost = history.estimate(task.name)
+        if cost is None:
+            unknown += 1
+        else:
+            total += cost
+        label = f"{index:>3}. {task.name} {describe_arguments(task)}".rstrip()
+        estimate = "?" if cost is None else f"~{format_duration(cost)}"
+        lines.append(f"{label:<60} {estimate:>9}")
+        lines += [f"       $ {command}" for command in shell_commands(task)]
+    summary = f"Plan: {len(ordered)} step{'s' if len(ordered) != 1 else ''}"
+    if jobs > 1 and len(tasks) > 1:
+        _rank(tasks)
+        critical = max(task.rank for task in tasks)
+        summary += f", ~{format_duration(critical)} with -j {jobs}"
+    else:
+        summary += f", ~{format_duration(total)}"
+    if unknown:
+        summary += f" ({unknown} without history)"
+    return "\n".join([summary, *lines]) + "\n"
@@ -0,0 +1,177 @@
+from __future__ import annotations
+
+import inspect
+import multiprocessing
+import os
+import sys
+import threading
+import traceback
+from collections.abc import Callable
+from concurrent.futures import Executor
+from functools import wraps
+from typing import Any
+
+from dopy.exception import DopyException, InvalidCommandArgumentsException
+
+EXECUTORS = ("thread", "process")
+"""Values accepted by the `executor=` option; `thread` is the default."""
+
+_pool: Executor | None = None
+_lock = threading.Lock()
+_in_worker = False
+
+_INLINE: dict[str, Callable] = {}
+"""The commands registered with `executor="process"`, as run by a worker."""
+
+_loaded: set[str] = set()
+
+
+def _start_method() -> str:
+    methods = multiprocessing.get_all_start_methods()
+    return "forkserver" if "forkserver" in methods else "spawn"
+
+
+def _initializer() -> None:
+    global _in_worker
+    _in_worker = True
+
+
+def pool() -> Executor:
+    """Return the process pool shared by all `executor="process"` commands.
+
+    It is started on first use with one worker per core and reused for the
+    rest of the invocation. Workers come from a fork server (a fresh
+    interpreter elsewhere), so no thread or open file of the caller leaks
+    into them.
+    """
+    global _pool
+    with _lock:
+        if _pool is None:
+            from concurrent.futures import ProcessPoolExecutor
+
+            _pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context(_start_method()),
+                initializer=_initializer,
+            )
+        return _pool
+
+
+def shutdown() -> None:
+    """Stop the worker processes, if any were started."""
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+def _forget_pool() -> None:
+    # A forked child (daemon, watch mode) starts its own pool when needed.
+    global _pool
+    _pool = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_pool)
+
+
+def _load(path: str, module_name: str) -> None:
+    """Import the file defining a command, once per worker."""
+    if path in _loaded:
+        return
+    _loaded.add(path)
+    if module_name in sys.modules:
+        return
+    from dopy.command_loader import _load_module_from_path
+
+    _load_module_from_path(path, module_name)
+
+
+def _call(
+    path: str, module_name: str, name: str, args: tuple, kwargs: dict
+) -> tuple[str, Any, tuple[str, str, str] | None]:
+    """Run command `name` in a worker: `(output, result, error)`.
+
+    Exceptions are sent back as `(kind, message, traceback)` text since the
+    user's exception types may not survive pickling.
+    """
+    from dopy.output import capture, routed
+
+    func = _INLINE.get(name)
+    if func is None:
+        _load(path, module_name)
+        func = _INLINE.get(name)
+    if func is None:
+        message = f"Command '{name}' is not defined at the top level of {path}"
+        return "", None, ("dopy", message, "")
+    with routed(), capture() as buffer:
+        try:
+            result = func(*args, **kwargs)
+        except TypeError as e:
+            return buffer.getvalue(), None, ("args", str(e), traceback.format_exc())
+        except DopyException as e:
+            return buffer.getvalue(), None, ("dopy", str(e), traceback.format_exc())
+        except Exception as e:
+            message = f"{type(e).__name__}: {e}"
+            return buffer.getvalue(), None, ("error", message, traceback.format_exc())
+    return buffer.getvalue(), result, None
+
+
+def _raise(name: str, kind: str, message: str, trace: str) -> None:
+    error: DopyException
+    if kind == "args":
+        error = InvalidCommandArgumentsException(message)
+    elif kind == "dopy":
+        error = DopyException(message)
+    else:
+        error = DopyException(f"Command '{name}' failed in a worker process: {message}")
+    if trace:
+        error.add_note(trace.rstrip())
+    raise error
+
+
+def in_process_pool(wrapper: Callable, name: str, func: Callable) -> Callable:
+    """Make calls of `wrapper` run in a worker of `pool()`.
+
+    Wrappers cannot be pickled, so a call is sent as the path of the file
+    defining `func` plus the command name; the worker imports that file
+    once and runs its own copy of the command. Arguments are sent already
+    converted, and the worker's output is written when the call returns.
+    `TypeError` becomes `InvalidCommandArgumentsException` and any other
+    failure a `DopyException` carrying the worker's traceback as a note.
+    """
+    if inspect.iscoroutinefunction(func):
+        raise ValueError(f"Command '{name}': async commands cannot use a process pool")
+    original = inspect.unwrap(func)
+    path = inspect.getsourcefile(original) or original.__code__.co_filename
+    module_name = original.__module__
+    _INLINE[name] = wrapper
+
+    @wraps(wrapper)
+    def dispatch(*args, **kwargs):
+        if _in_worker:
+            return wrapper(*args, **kwargs)
+        from concurrent.futures.process import BrokenProcessPool
+
+        future = pool().submit(_call, path, module_name, name, args, kwargs)
+        try:
+            output, result, error = future.result()
+        except KeyboardInterrupt:
+            future.cancel()
+            raise
+        except BrokenProcessPool as e:
+            shutdown()
+            raise DopyException(f"Command '{name}': worker process died") from e
+        except Exception as e:
+            # Arguments or a result that cannot be pickled.
+            raise InvalidCommandArgumentsException(
+                f"Command '{name}' cannot run in a worker process: {e}"
+            ) from e
+        if output:
+            sys.stdout.write(output)
+        if error is not None:
+            _raise(name, *error)
+        return result
+
+    return dispatch
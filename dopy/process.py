@@ -0,0 +1,432 @@
+from __future__ import annotations
+
+import codecs
+import os
+import selectors
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections.abc import Iterator, Mapping
+from contextlib import contextmanager
+from typing import IO, Any, Self, TextIO
+
+from dopy import history, jobserver
+from dopy.output import current_sink
+
+CAPTURE_MEMORY_LIMIT = 1024 * 1024
+"""Captured output above this many bytes is spilled to a temporary file."""
+
+KILL_GRACE_PERIOD = 2.0
+"""Seconds between SIGTERM and SIGKILL when stopping a process group."""
+
+_CHUNK = 64 * 1024
+
+_running: set[Any] = set()
+"""`Popen` and `asyncio.subprocess.Process` objects of running commands."""
+_running_lock = threading.Lock()
+
+
+class ShellResult(str):
+    """The command string of an `@sh` command, together with how it ran.
+
+    Being a `str`, it compares equal to the command that was executed, so
+    existing callers keep working. `output` is only available when the
+    command ran with `capture=True`.
+    """
+
+    returncode: int
+    duration: float
+    rusage: Any
+    _output: IO[bytes] | None
+
+    def __new__(cls, command: str) -> Self:
+        result = super().__new__(cls, command)
+        result.returncode = 0
+        result.duration = 0.0
+        result.rusage = None
+        result._output = None
+        return result
+
+    @property
+    def child_cpu_time(self) -> float:
+        """User + system CPU seconds of the shell and its children."""
+        if self.rusage is None:
+            return 0.0
+        return self.rusage.ru_utime + self.rusage.ru_stime
+
+    def open_output(self) -> IO[bytes]:
+        """Return the captured stdout as a binary file, rewound to the start.
+
+        Large outputs live in a temporary file, so this is the way to
+        process them without reading everything into memory.
+        """
+        if self._output is None:
+            raise ValueError("Output was not captured; use capture=True.")
+        self._output.seek(0)
+        return self._output
+
+    @property
+    def output(self) -> str:
+        """The captured stdout, decoded as text."""
+        return self.open_output().read().decode(errors="replace")
+
+
+def _kill_group(proc: Any, sig: int = signal.SIGTERM) -> None:
+    try:
+        if not getattr(proc, "dopy_group", True):
+            # Shares dopy's process group (async terminal commands).
+            proc.send_signal(sig)
+        elif hasattr(os, "killpg"):
+            os.killpg(proc.pid, sig)
+        else:
+            proc.kill()
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _terminal() -> int | None:
+    """Return a descriptor of the terminal dopy runs in the foreground of."""
+    if not hasattr(os, "tcgetpgrp"):
+        return None
+    for fd in (0, 1, 2):
+        try:
+            if os.isatty(fd) and os.tcgetpgrp(fd) == os.getpgrp():
+                return fd
+        except OSError:
+            continue
+    return None
+
+
+def _set_foreground(fd: int, pgid: int) -> None:
+    # Taking the terminal back from the background raises SIGTTOU otherwise.
+    old = signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGTTOU})
+    try:
+        os.tcsetpgrp(fd, pgid)
+    except OSError:
+        pass
+    finally:
+        signal.pthread_sigmask(signal.SIG_SETMASK, old)
+
+
+@contextmanager
+def _foreground(proc: subprocess.Popen) -> Iterator[bool]:
+    """Hand the terminal to the process group of `proc` while in the block.
+
+    Yields whether it did: only when dopy itself is in the foreground.
+    """
+    fd = _terminal()
+    if fd is None:
+        yield False
+        return
+    _set_foreground(fd, proc.pid)
+    # The command may have touched the terminal before it was its own.
+    _kill_group(proc, signal.SIGCONT)
+    try:
+        yield True
+    finally:
+        _set_foreground(fd, os.getpgrp())
+
+
+@contextmanager
+def _forwarding(proc: subprocess.Popen) -> Iterator[list[int]]:
+    """Pass SIGINT and SIGTERM sent to dopy on to the command.
+
+    Yields the list of signals received. Handlers can only be installed in
+    the main thread; elsewhere nothing is forwarded.
+    """
+    received: list[int] = []
+    if threading.current_thread() is not threading.main_thread():
+        yield received
+        return
+
+    def forward(sig: int, frame: Any) -> None:
+        received.append(sig)
+        _kill_group(proc, sig)
+
+    previous = {
+        sig: signal.signal(sig, forward) for sig in (signal.SIGINT, signal.SIGTERM)
+    }
+    try:
+        yield received
+    finally:
+        for sig, handler in previous.items():
+            signal.signal(sig, handler)
+
+
+def _reap(proc: subprocess.Popen, deadline: float | None) -> Any:
+    """Wait for `proc` and return its resource usage (None if unsupported).
+
+    Raises `subprocess.TimeoutExpired` once `deadline` has passed.
+    """
+    if not hasattr(os, "wait4"):
+        proc.wait(None if deadline is None else max(deadline - time.monotonic(), 0))
+        return None
+    flags = 0 if deadline is None else os.WNOHANG
+    delay = 0.001
+    while True:
+        pid, status, rusage = os.wait4(proc.pid, flags)
+        if pid:
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            return rusage
+        assert deadline is not None
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise subprocess.TimeoutExpired(proc.args, 0)
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 0.05)
+
+
+def _pump(
+    proc: subprocess.Popen,
+    stdout: TextIO,
+    stderr: TextIO,
+    capture: IO[bytes] | None,
+    deadline: float | None,
+) -> None:
+    """Stream the child's pipes to `stdout`/`stderr` until both are closed."""
+    decoders = {}
+    targets = {}
+    with selectors.DefaultSelector() as selector:
+        for pipe, target in ((proc.stdout, stdout), (proc.stderr, stderr)):
+            if pipe is None:
+                continue
+            os.set_blocking(pipe.fileno(), False)
+            selector.register(pipe, selectors.EVENT_READ)
+            decoders[pipe] = codecs.getincrementaldecoder("utf-8")("replace")
+            targets[pipe] = target
+        while selector.get_map():
+            timeout = None
+            if deadline is not None:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    raise subprocess.TimeoutExpired(proc.args, 0)
+            for key, _ in selector.select(timeout):
+                pipe = key.fileobj
+                data = os.read(key.fd, _CHUNK)
+                if not data:
+                    selector.unregister(pipe)
+                    text = decoders[pipe].decode(b"", final=True)
+                else:
+                    text = decoders[pipe].decode(data)
+                    if capture is not None and pipe is proc.stdout:
+                        capture.write(data)
+                if text:
+                    targets[pipe].write(text)
+
+
+def run_shell(
+    command: str,
+    *,
+    capture: bool = False,
+    timeout: float | None = None,
+    env: Mapping[str, str] | None = None,
+    cwd: str | os.PathLike[str] | None = None,
+) -> ShellResult:
+    """Run `command` through the shell and report how it went.
+
+    The command runs in its own process group, which is terminated together
+    with all its children when dopy is interrupted (Ctrl-C), when `timeout`
+    seconds pass (raising `subprocess.TimeoutExpired`) or when a parallel
+    run is cancelled (see `terminate_running`). A command writing to the
+    terminal keeps it: its group becomes the terminal's foreground group
+    while it runs, so password prompts, pagers and editors work, and
+    SIGINT/SIGTERM sent to dopy are forwarded to it. `env` entries are added to
+    the current environment and `cwd` sets the working directory. While a
+    jobserver is active, `MAKEFLAGS` lets nested `make`/`dopy` runs join it
+    (see `dopy.jobserver`).
+
+    Without `capture` and without an output sink for the calling thread
+    (see `dopy.output.capture`) the command inherits the terminal. Otherwise
+    stdout and stderr are streamed through non-blocking pipes to the sink or
+    to `sys.stdout`/`sys.stderr`; with `capture=True` stdout is also kept in
+    a temporary file that only stays in memory while it is small.
+    """
+    sink = current_sink()
+    piped = capture or sink is not None
+    start = time.monotonic()
+    deadline = None if timeout is None else start + timeout
+    child_env, pass_fds = jobserver.child_env(env)
+    proc = subprocess.Popen(
+        command,
+        shell=True,
+        env=child_env,
+        pass_fds=pass_fds,
+        cwd=cwd,
+        stdout=subprocess.PIPE if piped else None,
+        stderr=subprocess.PIPE if piped else None,
+        # Piped commands leave the terminal alone; terminal commands keep it
+        # (see `_foreground`) in a process group of their own.
+        start_new_session=piped,
+        process_group=None if piped else 0,
+    )
+    # Owned by the returned result, which exposes it through `open_output`.
+    output = (
+        tempfile.SpooledTemporaryFile(max_size=CAPTURE_MEMORY_LIMIT)  # noqa: SIM115
+        if capture
+        else None
+    )
+    result = ShellResult(command)
+    result._output = output
+    with _running_lock:
+        _running.add(proc)
+    try:
+        if piped:
+            _pump(
+                proc,
+                sink or sys.stdout,
+                sink or sys.stderr,
+                output,
+                deadline,
+            )
+            result.rusage = _reap(proc, deadline)
+        else:
+            with _forwarding(proc) as received, _foreground(proc) as foreground:
+                result.rusage = _reap(proc, deadline)
+            _reraise(received, foreground and proc.returncode == -signal.SIGINT)
+        history.account(result.rusage)
+    except subprocess.TimeoutExpired:
+        _stop(proc)
+        raise subprocess.TimeoutExpired(command, timeout or 0) from None
+    except KeyboardInterrupt:
+        _stop(proc, signal.SIGINT)
+        raise
+    except BaseException:
+        _stop(proc)
+        raise
+    finally:
+        with _running_lock:
+            _running.discard(proc)
+        for pipe in (proc.stdout, proc.stderr):
+            if pipe is not None:
+                pipe.close()
+    result.returncode = proc.returncode
+    result.duration = time.monotonic() - start
+    return result
+
+
+def _reraise(received: list[int], interrupted: bool) -> None:
+    """Let dopy stop like its terminal command did, once that has exited.
+
+    A SIGTERM forwarded to the command is delivered to dopy again; Ctrl-C,
+    forwarded or typed while the command had the terminal, becomes
+    `KeyboardInterrupt`.
+    """
+    if signal.SIGTERM in received:
+        signal.raise_signal(signal.SIGTERM)
+    if interrupted or signal.SIGINT in received:
+        raise KeyboardInterrupt
+
+
+async def run_shell_async(
+    command: str,
+    *,
+    capture: bool = False,
+    timeout: float | None = None,
+    env: Mapping[str, str] | None = None,
+    cwd: str | os.PathLike[str] | None = None,
+) -> ShellResult:
+    """Coroutine version of `run_shell` built on `asyncio`.
+
+    Behaves like `run_shell` (streaming, `capture`, `timeout`) but lets many
+    commands run concurrently on one event loop. Piped commands run in their
+    own process group; terminal ones stay in dopy's, and only the shell is
+    signalled when they are stopped.
+    When the awaiting task is cancelled, the process group is stopped.
+    `rusage` is not available for these commands.
+    """
+    import asyncio
+
+    sink = current_sink()
+    piped = capture or sink is not None
+    start = time.monotonic()
+    child_env, pass_fds = jobserver.child_env(env)
+    proc = await asyncio.create_subprocess_shell(
+        command,
+        env=child_env,
+        pass_fds=pass_fds,
+        cwd=cwd,
+        stdout=subprocess.PIPE if piped else None,
+        stderr=subprocess.PIPE if piped else None,
+        # Several may run at once, so terminal commands stay in dopy's
+        # foreground process group instead of getting the terminal.
+        start_new_session=piped,
+    )
+    proc.dopy_group = piped  # type: ignore[attr-defined]
+    # Owned by the returned result, which exposes it through `open_output`.
+    output = (
+        tempfile.SpooledTemporaryFile(max_size=CAPTURE_MEMORY_LIMIT)  # noqa: SIM115
+        if capture
+        else None
+    )
+    result = ShellResult(command)
+    result._output = output
+
+    async def pump(stream: Any, target: TextIO, keep: IO[bytes] | None) -> None:
+        decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        while data := await stream.read(_CHUNK):
+            if keep is not None:
+                keep.write(data)
+            text = decoder.decode(data)
+            if text:
+                target.write(text)
+        text = decoder.decode(b"", final=True)
+        if text:
+            target.write(text)
+
+    async def communicate() -> None:
+        if piped:
+            await asyncio.gather(
+                pump(proc.stdout, sink or sys.stdout, output),
+                pump(proc.stderr, sink or sys.stderr, None),
+            )
+        await proc.wait()
+
+    with _running_lock:
+        _running.add(proc)
+    try:
+        await asyncio.wait_for(communicate(), timeout)
+    except TimeoutError:
+        await _stop_async(proc)
+        raise subprocess.TimeoutExpired(command, timeout or 0) from None
+    except BaseException:
+        await _stop_async(proc)
+        raise
+    finally:
+        with _running_lock:
+            _running.discard(proc)
+    result.returncode = proc.returncode or 0
+    result.duration = time.monotonic() - start
+    return result
+
+
+async def _stop_async(proc: Any, sig: int = signal.SIGTERM) -> None:
+    """`_stop` for an `asyncio.subprocess.Process`."""
+    import asyncio
+
+    _kill_group(proc, sig)
+    try:
+        await asyncio.wait_for(proc.wait(), KILL_GRACE_PERIOD)
+    except TimeoutError:
+        _kill_group(proc, signal.SIGKILL)
+        await proc.wait()
+
+
+def _stop(proc: subprocess.Popen, sig: int = signal.SIGTERM) -> None:
+    """Signal the process group of `proc`, escalating to SIGKILL."""
+    _kill_group(proc, sig)
+    try:
+        proc.wait(KILL_GRACE_PERIOD)
+    except subprocess.TimeoutExpired:
+        _kill_group(proc, signal.SIGKILL)
+        proc.wait()
+
+
+def terminate_running() -> None:
+    """Terminate the process groups of all running shell commands."""
+    with _running_lock:
+        procs = list(_running)
+    for proc in procs:
+        _kill_group(proc)
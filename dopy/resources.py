@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import os
+import re
+import threading
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from typing import Any, ClassVar, NamedTuple
+
+from dopy.config import DOPY_HOME
+
+_SIZE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?\s*$", re.IGNORECASE)
+_UNITS = {"": 1, "k": 1 << 10, "m": 1 << 20, "g": 1 << 30, "t": 1 << 40}
+
+
+class Requirements(NamedTuple):
+    """Resources a command declares with `cpus=`, `mem=` and `lock=`."""
+
+    cpus: int
+    mem: int
+    locks: tuple[str, ...]
+
+
+def parse_size(size: int | str) -> int:
+    """Return `size` in bytes: an int, or a string such as `"512M"` or `"8G"`."""
+    if isinstance(size, int):
+        return size
+    match = _SIZE.match(size)
+    if match is None:
+        raise ValueError(f"Invalid memory size {size!r}")
+    return int(float(match.group(1)) * _UNITS[match.group(2).lower()])
+
+
+def requirements(options: dict[str, Any]) -> Requirements:
+    """Return the `Requirements` given in a command's decorator options.
+
+    Raises `ValueError` for invalid values.
+    """
+    cpus = options.get("cpus", 0)
+    if not isinstance(cpus, int) or cpus < 0:
+        raise ValueError(f"cpus must be a non-negative integer, not {cpus!r}")
+    locks = options.get("lock", ())
+    if isinstance(locks, str):
+        locks = (locks,)
+    return Requirements(cpus, parse_size(options.get("mem", 0)), tuple(sorted(locks)))
+
+
+def available_cpus() -> int:
+    """Return the number of cores this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def available_memory() -> int | None:
+    """Return `MemAvailable` from `/proc/meminfo` in bytes, None if unknown."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def lock_path(name: str) -> str:
+    safe = re.sub(r"[^\w.-]", "_", name)
+    return os.path.join(DOPY_HOME, "locks", f"{safe}.lock")
+
+
+class NamedLock:
+    """A lock shared by every dopy process of the user, by name.
+
+    It is an `flock` on `DOPY_HOME/locks/<name>.lock`, released by the
+    kernel if the process dies. Each acquisition opens the file anew, so
+    two threads of one process exclude each other as well. Without
+    `fcntl` (Windows) the lock only works within the process.
+    """
+
+    _local: ClassVar[dict[str, threading.Lock]] = {}
+    _local_guard: ClassVar[threading.Lock] = threading.Lock()
+
+    def __init__(self, name: str):
+        self.name = name
+        self._fd: int | None = None
+        with self._local_guard:
+            self._fallback = self._local.setdefault(name, threading.Lock())
+
+    def acquire(self, blocking: bool = True) -> bool:
+        try:
+            import fcntl
+        except ImportError:
+            return self._fallback.acquire(blocking)
+        path = lock_path(self.name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        if self._fd is None:
+            self._fallback.release()
+            return
+        # Closing the file drops the flock.
+        os.close(self._fd)
+        self._fd = None
+
+
+@contextmanager
+def holding(names: Iterable[str]) -> Iterator[None]:
+    """Hold the named locks (acquired in sorted order) while in the block."""
+    held = []
+    try:
+        for name in sorted(names):
+            lock = NamedLock(name)
+            lock.acquire()
+            held.append(lock)
+        yield
+    finally:
+        for lock in reversed(held):
+            lock.release()
+
+
+class Admission:
+    """Decides which ready tasks may start, for `dopy.scheduler.run_tasks`.
+
+    A task is admitted while the cores and memory declared by the running
+    tasks leave room for its own, and it can take all of its named locks
+    without waiting. Memory is also checked against what the system has
+    available right now, to account for other processes. A task asking for
+    more than the machine has still runs, alone among those declaring the
+    same resource.
+
+    With `jobs` at most that many tasks run; with `jobs=0` a task without
+    `cpus=` counts as one core, so the cores alone set the limit.
+    """
+
+    def __init__(self, jobs: int):
+        self.jobs = jobs
+        self.cpus = available_cpus()
+        self.mem = available_memory()
+        self.used_cpus = 0
+        self.used_mem = 0
+        self.running = 0
+        self._held: dict[int, list[NamedLock]] = {}
+
+    def _cpus(self, needs: Requirements) -> int:
+        cpus = needs.cpus or (1 if self.jobs == 0 else 0)
+        return min(cpus, self.cpus)
+
+    def _fits(self, needs: Requirements) -> bool:
+        if self.jobs and self.running >= self.jobs:
+            return False
+        if self.used_cpus + self._cpus(needs) > self.cpus:
+            return False
+        if not needs.mem or self.mem is None:
+            return True
+        if needs.mem > self.mem:
+            return not self.used_mem
+        if self.used_mem + needs.mem > self.mem:
+            return False
+        available = available_memory()
+        return available is None or needs.mem <= available
+
+    def admit(self, key: int, needs: Requirements) -> bool:
+        """Reserve `needs` for the task `key` and return True if it may start."""
+        if not self._fits(needs):
+            return False
+        held: list[NamedLock] = []
+        for name in needs.locks:
+            lock = NamedLock(name)
+            if not lock.acquire(blocking=False):
+                for other in held:
+                    other.release()
+                return False
+            held.append(lock)
+        self._held[key] = held
+        self.running += 1
+        self.used_cpus += self._cpus(needs)
+        self.used_mem += needs.mem
+        return True
+
+    def close(self) -> None:
+        """Release the locks of tasks that were never released."""
+        for held in self._held.values():
+            for lock in reversed(held):
+                lock.release()
+        self._held.clear()
+
+    def release(self, key: int, needs: Requirements) -> None:
+        """Give back what `admit` reserved for the task `key`."""
+        for lock in reversed(self._held.pop(key, [])):
+            lock.release()
+        self.running -= 1
+        self.used_cpus -= self._cpus(needs)
+        self.used_mem -= needs.mem
@@ -0,0 +1,302 @@
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from contextlib import nullcontext
+from typing import Any
+
+from dopy import history
+from dopy.command import DEPENDENCIES, OPTIONS
+from dopy.command_utils import execute_command, get_command, resolve_arguments
+from dopy.exception import DependencyCycleException
+from dopy.jobserver import Jobserver, serving
+from dopy.output import routed, task_output
+from dopy.process import terminate_running
+from dopy.resources import Admission, holding, requirements
+
+Invocation = tuple[Callable, list[Any], dict[str, Any]]
+
+POLL_INTERVAL = 0.1
+"""Seconds between two attempts to start tasks waiting for a lock."""
+
+
+class Task:
+    """One node of the execution graph: a command with resolved arguments."""
+
+    def __init__(self, fn: Callable, args: list[Any], kwargs: dict[str, Any]):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.name: str = fn.__name__
+        self.deps: list[Task] = []
+        self.dependents: list[Task] = []
+        self.expanded = False
+        self.rank = 0.0
+        self.needs = requirements(OPTIONS.get(self.name, {}))
+
+    def __repr__(self) -> str:
+        return f"Task({self.name!r}, {self.args!r}, {self.kwargs!r})"
+
+
+def build_graph(
+    commands: list[Invocation], kwargs: dict[str, str] | None = None
+) -> list[Task]:
+    """Turn parsed `commands` into tasks linked by their declared dependencies.
+
+    Every invocation from the command line becomes a task. Prerequisites are
+    added once per run, resolved from the shared `key=value` `kwargs`; a
+    prerequisite that is also invoked explicitly reuses that invocation.
+    Raises `DependencyCycleException` for cyclic dependencies and
+    `CommandNotFoundException` for unknown prerequisites.
+    """
+    kwargs = kwargs or {}
+    tasks = [Task(fn, args, kw) for fn, args, kw in commands]
+    by_name: dict[str, Task] = {}
+    for task in tasks:
+        by_name.setdefault(task.name, task)
+
+    def expand(task: Task, stack: list[str]) -> None:
+        if task.expanded:
+            return
+        task.expanded = True
+        for dep_name in DEPENDENCIES.get(task.name, ()):
+            if dep_name in stack:
+                cycle = " -> ".join([*stack, dep_name])
+                raise DependencyCycleException(f"Dependency cycle: {cycle}")
+            dep = by_name.get(dep_name)
+            if dep is None:
+                fn = get_command(dep_name)
+                dep = Task(fn, *resolve_arguments(fn, [], kwargs))
+                by_name[dep_name] = dep
+                tasks.append(dep)
+            if dep not in task.deps:
+                task.deps.append(dep)
+                dep.dependents.append(task)
+            expand(dep, [*stack, dep_name])
+
+    for task in list(tasks):
+        expand(task, [task.name])
+    return tasks
+
+
+def topological_order(tasks: list[Task]) -> list[Task]:
+    """Return `tasks` with every prerequisite before its dependents.
+
+    Apart from that, the command-line order is preserved.
+    """
+    ordered: list[Task] = []
+    seen: set[int] = set()
+
+    def visit(task: Task) -> None:
+        if id(task) in seen:
+            return
+        seen.add(id(task))
+        for dep in task.deps:
+            visit(dep)
+        ordered.append(task)
+
+    for task in tasks:
+        visit(task)
+    return ordered
+
+
+DEFAULT_COST = 1.0
+"""Estimated duration in seconds of a command that never ran before."""
+
+
+def estimate_cost(task: Task) -> float:
+    """Return the expected duration of `task`, used to find the critical path.
+
+    This is the median of its recent runs (see `dopy.history`), or
+    `DEFAULT_COST` without history.
+    """
+    cost = history.estimate(task.name)
+    return DEFAULT_COST if cost is None else cost
+
+
+def _rank(tasks: list[Task]) -> None:
+    """Set each task's rank to the cost of the longest chain it starts."""
+    for task in reversed(topological_order(tasks)):
+        after = max((dependent.rank for dependent in task.dependents), default=0.0)
+        task.rank = estimate_cost(task) + after
+
+
+def _execute(task: Task, remote: Any = None) -> None:
+    if remote is not None:
+        with history.recording(task.name, tuple(task.args), task.kwargs):
+            remote.call(task.name, task.args, task.kwargs)
+    else:
+        execute_command(task.fn, *task.args, **task.kwargs)
+
+
+def _execute_captured(
+    task: Task,
+    remote: Any = None,
+    server: Jobserver | None = None,
+    stop: threading.Event | None = None,
+) -> Any:
+    """Run one task with its output sent to its sink, returning that sink.
+
+    With a `server`, the task first waits for one of its job slots; it is
+    skipped (returning None) if `stop` is set meanwhile. If the task fails,
+    its sink is attached to the exception as `dopy_sink` so the output can
+    still be shown.
+    """
+    with server.slot(stop) if server is not None else nullcontext(True) as free:
+        if not free:
+            return None
+        with task_output(task.name) as sink:
+            try:
+                _execute(task, remote)
+            except BaseException as e:
+                e.dopy_sink = sink  # type: ignore[attr-defined]
+                raise
+        return sink
+
+
+def _replay(sink: Any, stream: Any) -> None:
+    if sink is not None:
+        sink.replay(stream)
+        sink.close()
+
+
+def run_tasks(tasks: list[Task], jobs: int = 1, remote: Any = None) -> None:
+    """Execute a task graph, running up to `jobs` ready tasks at the same time.
+
+    With a single job the tasks run in topological order, writing directly
+    to the terminal. Otherwise ready tasks are started in daemon threads by
+    decreasing rank (critical path first, then command-line order) as soon
+    as the cores, memory and named locks they declare are available (see
+    `dopy.resources.Admission`); with `jobs=0` only those resources limit
+    how many run at once. `@sh` commands become parallel subprocesses.
+    Each task's output goes through the active `dopy.output.Router`: by
+    default it is buffered and written as one block when the task
+    finishes. The first failure (or Ctrl-C) cancels tasks that have not
+    started yet, terminates running shell commands and is re-raised without
+    waiting for running Python commands: they are abandoned, and stop when
+    dopy exits.
+
+    Local parallel runs also hand out their slots through a make-compatible
+    jobserver (see `dopy.jobserver`): every task holds one while it runs,
+    and `make -j` or `dopy -j` started by `@sh` commands share the rest.
+    Under a parent `make` or `dopy`, its jobserver is joined instead.
+
+    With a `dopy.worker.Remote`, every task runs on one of its workers
+    instead of in this process; the graph is still scheduled here. Named
+    locks are always taken, also by a single job.
+
+    Every task that ran is buffered in `dopy.history`, which writes its
+    runs in batches and when dopy exits.
+    """
+    _run_tasks(tasks, jobs, remote)
+
+
+def _run_tasks(tasks: list[Task], jobs: int, remote: Any) -> None:
+    if jobs == 1 or len(tasks) <= 1:
+        with routed():
+            for task in topological_order(tasks):
+                with (
+                    holding(task.needs.locks),
+                    task_output(task.name, parallel=False),
+                ):
+                    _execute(task, remote)
+        return
+
+    _rank(tasks)
+    position = {id(task): i for i, task in enumerate(tasks)}
+    waiting = {id(task): len(task.deps) for task in tasks}
+    ready = [task for task in tasks if not task.deps]
+    stdout = sys.stdout
+    admission = Admission(max(jobs, 0))
+    slots = jobs if jobs > 0 else admission.cpus
+    stop = threading.Event()
+    running: dict[Future, Task] = {}
+    try:
+        with (
+            routed(),
+            serving(slots) if remote is None else nullcontext() as server,
+        ):
+            while ready or running:
+                ready.sort(key=lambda t: (-t.rank, position[id(t)]))
+                for task in list(ready):
+                    if admission.admit(id(task), task.needs):
+                        ready.remove(task)
+                        running[
+                            _start(_execute_captured, task, remote, server, stop)
+                        ] = task
+                if not running:
+                    # Blocked by locks or memory of other processes.
+                    time.sleep(POLL_INTERVAL)
+                    continue
+                done, _ = wait(
+                    running,
+                    timeout=POLL_INTERVAL if ready else None,
+                    return_when=FIRST_COMPLETED,
+                )
+                for future in done:
+                    task = running.pop(future)
+                    admission.release(id(task), task.needs)
+                    error = future.exception()
+                    if error is not None:
+                        _cancel(running, stop)
+                        _replay(getattr(error, "dopy_sink", None), stdout)
+                        raise error
+                    _replay(future.result(), stdout)
+                    for dependent in task.dependents:
+                        waiting[id(dependent)] -= 1
+                        if waiting[id(dependent)] == 0:
+                            ready.append(dependent)
+    except BaseException:
+        # A failure or Ctrl-C: stop the running commands instead of waiting.
+        _cancel(running, stop)
+        raise
+    finally:
+        admission.close()
+
+
+def _start(fn: Callable[..., Any], *args: Any) -> Future:
+    """Run `fn(*args)` in a daemon thread and return its future.
+
+    Unlike a `ThreadPoolExecutor`'s workers, daemon threads are not joined
+    when the interpreter exits, so an abandoned Python command cannot keep
+    dopy alive after a failure or Ctrl-C.
+    """
+    future: Future = Future()
+
+    def run() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+def _cancel(running: dict[Future, Task], stop: threading.Event) -> None:
+    stop.set()
+    for future in running:
+        future.cancel()
+    terminate_running()
+
+
+def run_commands(
+    commands: list[Invocation],
+    jobs: int = 1,
+    kwargs: dict[str, str] | None = None,
+    remote: Any = None,
+) -> None:
+    """Execute parsed `commands` together with their prerequisites.
+
+    `kwargs` are the raw `key=value` arguments of the run, used to resolve
+    the arguments of prerequisites that were not invoked explicitly. See
+    `run_tasks` for `remote`.
+    """
+    run_tasks(build_graph(commands, kwargs), jobs=jobs, remote=remote)
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import ast
+import hashlib
+import json
+import os
+from typing import Any
+
+from dopy.config import DOPY_HOME
+
+STUBS_VERSION = 1
+"""Bumped whenever the layout of a cached scan changes."""
+
+REGISTRARS = frozenset({"command", "sh", "echo"})
+"""Decorators that register commands, besides names imported from dopy."""
+
+
+def _cache_path(path: str) -> str:
+    key = f"{STUBS_VERSION}\0{os.path.abspath(path)}"
+    digest = hashlib.sha256(key.encode()).hexdigest()[:32]
+    return os.path.join(DOPY_HOME, "cache", "stubs", f"{digest}.json")
+
+
+def _registrars(tree: ast.Module) -> set[str]:
+    """Return the decorator names that register commands in `tree`."""
+    names = set(REGISTRARS)
+    for node in tree.body:
+        if isinstance(node, ast.ImportFrom) and (node.module or "").split(".")[0] == (
+            "dopy"
+        ):
+            names.update(alias.asname or alias.name for alias in node.names)
+        elif isinstance(node, ast.FunctionDef) and any(
+            _name(d) == "dopy_command" for d in node.decorator_list
+        ):
+            names.add(node.name)
+    names.discard("dopy_command")
+    return names
+
+
+def _name(decorator: ast.expr) -> str | None:
+    if isinstance(decorator, ast.Call):
+        decorator = decorator.func
+    if isinstance(decorator, ast.Name):
+        return decorator.id
+    if isinstance(decorator, ast.Attribute):
+        return decorator.attr
+    return None
+
+
+def _describe(arg: ast.arg, kind: str, default: ast.expr | None) -> dict[str, Any]:
+    """Mirror `dopy.command_helper.describe_parameters` for a parameter."""
+    if kind == "VAR_POSITIONAL":
+        desc = f"*{arg.arg}"
+    elif kind == "VAR_KEYWORD":
+        desc = f"**{arg.arg}"
+    else:
+        desc = ast.unparse(arg.annotation) if arg.annotation else ""
+        if default is not None:
+            desc += f"{' ' if desc else ''}Default={ast.unparse(default)}"
+    return {
+        "name": arg.arg,
+        "kind": kind,
+        "default": default is not None,
+        "signature": [f"{arg.arg}=", desc],
+    }
+
+
+def _parameters(args: ast.arguments) -> list[dict[str, Any]]:
+    positional = [*args.posonlyargs, *args.args]
+    defaults: list[ast.expr | None] = [None] * (
+        len(positional) - len(args.defaults)
+    ) + list(args.defaults)
+    params = [
+        _describe(
+            arg,
+            "POSITIONAL_ONLY" if i < len(args.posonlyargs) else "POSITIONAL_OR_KEYWORD",
+            default,
+        )
+        for i, (arg, default) in enumerate(zip(positional, defaults))
+    ]
+    if args.vararg:
+        params.append(_describe(args.vararg, "VAR_POSITIONAL", None))
+    params += [
+        _describe(arg, "KEYWORD_ONLY", default)
+        for arg, default in zip(args.kwonlyargs, args.kw_defaults)
+    ]
+    if args.kwarg:
+        params.append(_describe(args.kwarg, "VAR_KEYWORD", None))
+    return params
+
+
+def parse(source: str, filename: str = "<tasks>") -> list[dict[str, Any]]:
+    """Return index entries for the commands a module defines, without running it.
+
+    Only top-level functions decorated with `command`, `sh`, `echo`, a name
+    imported from dopy or a factory decorated with `dopy_command` in the same
+    file are found; each entry has the command's name, short doc and
+    parameters like `dopy.command_helper.describe_command`.
+    """
+    tree = ast.parse(source, filename)
+    registrars = _registrars(tree)
+    entries = []
+    for node in tree.body:
+        if not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        if not any(_name(d) in registrars for d in node.decorator_list):
+            continue
+        doc = (ast.get_docstring(node) or "").strip().split("\n")[0]
+        entries.append(
+            {"name": node.name, "doc": doc, "params": _parameters(node.args)}
+        )
+    return entries
+
+
+def scan(path: str) -> list[dict[str, Any]]:
+    """Return `parse` of the file at `path`, cached by its mtime and size.
+
+    A file that cannot be parsed yields no stubs; its errors are reported
+    when it is imported.
+    """
+    st = os.stat(path)
+    state = [st.st_mtime_ns, st.st_size]
+    cache = _cache_path(path)
+    try:
+        with open(cache, encoding="utf-8") as f:
+            data = json.load(f)
+        if data["state"] == state:
+            return data["commands"]
+    except (OSError, ValueError, KeyError):
+        pass
+    try:
+        with open(path, encoding="utf-8") as f:
+            commands = parse(f.read(), path)
+    except (SyntaxError, ValueError):
+        return []
+    try:
+        os.makedirs(os.path.dirname(cache), exist_ok=True)
+        tmp = f"{cache}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"state": state, "commands": commands}, f)
+        os.replace(tmp, cache)
+    except OSError:
+        # Like the command index, the cache must not break a read-only home.
+        pass
+    return commands
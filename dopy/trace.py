@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any
+
+PROFILE_DIR = os.path.join(".dopy", "profile")
+"""Where `--profile` writes one cProfile dump per top-level command."""
+
+_tracer: Tracer | None = None
+_local = threading.local()
+
+
+class Span:
+    """Timing of one command call, nested calls included.
+
+    `cpu` is the calling thread's CPU time; it stays 0 for async commands
+    awaited by other async commands, which share the event loop's thread.
+    """
+
+    def __init__(self, name: str, depth: int, start: float):
+        self.name = name
+        self.depth = depth
+        self.thread = threading.get_ident()
+        self.start = start
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.child_cpu = 0.0
+        self.status = 0
+
+
+class Tracer:
+    """Collects a `Span` for every command call while it is active.
+
+    With `profile_dir`, every top-level call (depth 0) additionally runs
+    under `cProfile` and its stats are dumped to `<profile_dir>/<name>.prof`.
+    """
+
+    def __init__(self, profile_dir: str | None = None):
+        self.profile_dir = profile_dir
+        self.origin = time.perf_counter()
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+
+    def call(self, name: str, fn: Callable, args: tuple, kwargs: dict) -> Any:
+        stack = _local.__dict__.setdefault("stack", [])
+        span = Span(name, len(stack), time.perf_counter() - self.origin)
+        with self._lock:
+            self.spans.append(span)
+        profiler = self._start_profiler() if not stack else None
+        stack.append(span)
+        cpu = time.thread_time()
+        pending = False
+        try:
+            result = fn(*args, **kwargs)
+            if inspect.isawaitable(result):
+                # An async command awaited by another one: its span ends
+                # when the awaitable does.
+                pending = True
+                return self._finish(span, result)
+            self._record_shell(span, result)
+            return result
+        except BaseException as e:
+            self._record_error(span, e)
+            raise
+        finally:
+            if not pending:
+                span.cpu = time.thread_time() - cpu
+                span.wall = time.perf_counter() - self.origin - span.start
+            stack.pop()
+            if profiler is not None:
+                self._dump_profile(profiler, name)
+
+    async def _finish(self, span: Span, awaitable: Any) -> Any:
+        try:
+            result = await awaitable
+        except BaseException as e:
+            self._record_error(span, e)
+            raise
+        else:
+            self._record_shell(span, result)
+            return result
+        finally:
+            span.wall = time.perf_counter() - self.origin - span.start
+
+    def _record_error(self, span: Span, error: BaseException) -> None:
+        span.status = 130 if isinstance(error, KeyboardInterrupt) else 1
+        self._record_shell(span, getattr(error, "dopy_result", None))
+
+    @staticmethod
+    def _record_shell(span: Span, result: Any) -> None:
+        from dopy.process import ShellResult
+
+        if isinstance(result, ShellResult):
+            span.child_cpu = result.child_cpu_time
+            span.status = result.returncode
+
+    def _start_profiler(self) -> Any:
+        if self.profile_dir is None:
+            return None
+        import cProfile
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another thread is being profiled already (Python 3.12+).
+            return None
+        return profiler
+
+    def _dump_profile(self, profiler: Any, name: str) -> None:
+        profiler.disable()
+        assert self.profile_dir is not None
+        os.makedirs(self.profile_dir, exist_ok=True)
+        profiler.dump_stats(os.path.join(self.profile_dir, f"{name}.prof"))
+
+    def summary(self) -> str:
+        """Return a table of all calls, nested calls indented below callers."""
+        lines = [f"{'command':32} {'wall':>9} {'cpu':>9} {'child cpu':>9} status"]
+        for span in sorted(self.spans, key=lambda s: s.start):
+            label = "  " * span.depth + span.name
+            lines.append(
+                f"{label:32} {span.wall:>8.3f}s {span.cpu:>8.3f}s"
+                f" {span.child_cpu:>8.3f}s {span.status:>6}"
+            )
+        return "\n".join(lines) + "\n"
+
+    def chrome_trace(self) -> dict[str, Any]:
+        """Return the spans in Chrome trace-event format (for Perfetto)."""
+        pid = os.getpid()
+        events = [
+            {
+                "name": span.name,
+                "cat": "dopy",
+                "ph": "X",
+                "ts": span.start * 1e6,
+                "dur": span.wall * 1e6,
+                "pid": pid,
+                "tid": span.thread,
+                "args": {
+                    "depth": span.depth,
+                    "cpu_s": span.cpu,
+                    "child_cpu_s": span.child_cpu,
+                    "status": span.status,
+                },
+            }
+            for span in self.spans
+        ]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def traced(wrapper: Callable, name: str) -> Callable:
+    """Wrap a registered command so its calls are recorded while tracing.
+
+    Without an active tracer the only cost is one global lookup per call.
+    """
+
+    @wraps(wrapper)
+    def traced_wrapper(*args, **kwargs):
+        tracer = _tracer
+        if tracer is None:
+            return wrapper(*args, **kwargs)
+        return tracer.call(name, wrapper, args, kwargs)
+
+    return traced_wrapper
+
+
+@contextmanager
+def tracing(trace_out: str | None = None, profile: bool = False) -> Iterator[Tracer]:
+    """Record every command call while active.
+
+    On exit (also after a failure) the Chrome trace is written to
+    `trace_out`, and with `profile` a summary table is printed to stderr
+    and cProfile dumps are kept in `PROFILE_DIR`.
+    """
+    global _tracer
+    tracer = Tracer(PROFILE_DIR if profile else None)
+    _tracer = tracer
+    try:
+        yield tracer
+    finally:
+        _tracer = None
+        if trace_out:
+            with open(trace_out, "w") as f:
+                json.dump(tracer.chrome_trace(), f)
+        if profile:
+            sys.stderr.write(tracer.summary())
@@ -0,0 +1,408 @@
+from __future__ import annotations
+
+import abc
+import fnmatch
+import glob
+import os
+import signal
+import struct
+import sys
+import threading
+import time
+from collections.abc import Iterable
+
+DEBOUNCE = 0.2
+"""Seconds without further changes before a batch of changes triggers a run."""
+
+POLL_INTERVAL = 0.5
+"""Seconds between two scans of the polling watcher."""
+
+IGNORED_DIRS = frozenset(
+    {
+        ".git",
+        ".hg",
+        ".dopy",
+        "__pycache__",
+        ".venv",
+        "venv",
+        "node_modules",
+        ".mypy_cache",
+        ".pytest_cache",
+        ".ruff_cache",
+        ".tox",
+        ".nox",
+    }
+)
+"""Directories that are never watched (VCS data, caches, virtualenvs)."""
+
+
+def _base(pattern: str) -> str:
+    """Return the longest leading part of a glob pattern without wildcards."""
+    parts = []
+    for part in pattern.split(os.sep):
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    return os.sep.join(parts) or "."
+
+
+class Watcher(abc.ABC):
+    """Reports changed files below `roots` (directories or single files)."""
+
+    def __init__(self, roots: Iterable[str]):
+        roots = {os.path.abspath(root) for root in roots}
+        self.dirs = sorted(root for root in roots if os.path.isdir(root))
+        self.files = {root for root in roots if not os.path.isdir(root)}
+
+    def relevant(self, path: str) -> bool:
+        if path in self.files:
+            return True
+        parts = path.split(os.sep)
+        if IGNORED_DIRS.intersection(parts[:-1]):
+            return False
+        return any(path.startswith(d + os.sep) for d in self.dirs)
+
+    @abc.abstractmethod
+    def poll(self, timeout: float) -> set[str]:
+        """Wait up to `timeout` seconds and return the changed paths."""
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> Watcher:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class PollingWatcher(Watcher):
+    """Portable watcher comparing `(mtime, size)` snapshots of the tree."""
+
+    def __init__(self, roots: Iterable[str], interval: float = POLL_INTERVAL):
+        super().__init__(roots)
+        self.interval = interval
+        self._snapshot = self._scan()
+        self._scanned = time.monotonic()
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        snapshot = {}
+        for path in self.files:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            snapshot[path] = (st.st_mtime_ns, st.st_size)
+        for root in self.dirs:
+            for dirpath, dirnames, filenames in os.walk(root):
+                dirnames[:] = [d for d in dirnames if d not in IGNORED_DIRS]
+                for name in filenames:
+                    path = os.path.join(dirpath, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    snapshot[path] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def poll(self, timeout: float) -> set[str]:
+        wait = self._scanned + self.interval - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return set()
+        time.sleep(max(wait, 0))
+        snapshot = self._scan()
+        self._scanned = time.monotonic()
+        old, self._snapshot = self._snapshot, snapshot
+        changed = {path for path in snapshot if old.get(path) != snapshot[path]}
+        changed.update(path for path in old if path not in snapshot)
+        return changed
+
+
+class InotifyWatcher(Watcher):
+    """Linux watcher using inotify through `ctypes` (no extra dependency).
+
+    Directories are watched recursively; new directories are added as they
+    appear. Raises `OSError` when inotify is unavailable or the watch limit
+    is reached, in which case `make_watcher` falls back to polling.
+    """
+
+    _EVENT = struct.Struct("iIII")
+    _IN_MODIFY = 0x2
+    _IN_ATTRIB = 0x4
+    _IN_CLOSE_WRITE = 0x8
+    _IN_MOVED_FROM = 0x40
+    _IN_MOVED_TO = 0x80
+    _IN_CREATE = 0x100
+    _IN_DELETE = 0x200
+    _IN_ISDIR = 0x40000000
+    _MASK = (
+        _IN_MODIFY
+        | _IN_ATTRIB
+        | _IN_CLOSE_WRITE
+        | _IN_MOVED_FROM
+        | _IN_MOVED_TO
+        | _IN_CREATE
+        | _IN_DELETE
+    )
+
+    def __init__(self, roots: Iterable[str]):
+        import ctypes
+        import ctypes.util
+
+        super().__init__(roots)
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self._libc = libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._dirs: dict[int, str] = {}
+        try:
+            for root in self.dirs:
+                self._add_tree(root)
+            for path in self.files:
+                self._add(os.path.dirname(path))
+        except OSError:
+            self.close()
+            raise
+
+    def _add(self, directory: str) -> None:
+        import ctypes
+
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), self._MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), directory)
+        self._dirs[wd] = directory
+
+    def _add_tree(self, root: str) -> None:
+        for dirpath, dirnames, _ in os.walk(root):
+            dirnames[:] = [d for d in dirnames if d not in IGNORED_DIRS]
+            self._add(dirpath)
+
+    def poll(self, timeout: float) -> set[str]:
+        import select
+
+        changed: set[str] = set()
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return changed
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            directory = self._dirs.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & self._IN_ISDIR:
+                if mask & (self._IN_CREATE | self._IN_MOVED_TO) and (
+                    os.path.basename(path) not in IGNORED_DIRS
+                    and self.relevant(os.path.join(path, ""))
+                ):
+                    try:
+                        self._add_tree(path)
+                    except OSError:
+                        pass
+                continue
+            if self.relevant(path):
+                changed.add(path)
+        return changed
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def make_watcher(roots: Iterable[str]) -> Watcher:
+    """Return an inotify watcher on Linux, a polling watcher otherwise."""
+    roots = list(roots)
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(roots)
+        except OSError:
+            pass
+    return PollingWatcher(roots)
+
+
+def settle(watcher: Watcher, debounce: float = DEBOUNCE) -> set[str]:
+    """Collect further changes until none arrive for `debounce` seconds."""
+    changed: set[str] = set()
+    while True:
+        more = watcher.poll(debounce)
+        if not more:
+            return changed
+        changed |= more
+
+
+def watched_paths(args: list[str], kwargs: dict[str, str]) -> tuple[list, list]:
+    """Return the roots to watch for `args` and the output patterns to ignore.
+
+    When the invoked tasks (or their prerequisites) declare `inputs`, only
+    those paths are watched; otherwise the whole project is. The `do.py`
+    files and task modules are always watched, so edits reload them.
+    """
+    from dopy.command import OPTIONS
+    from dopy.command_loader import sources
+    from dopy.command_utils import parse_args
+    from dopy.incremental import as_patterns
+    from dopy.scheduler import build_graph
+
+    inputs: list[str] = []
+    outputs: list[str] = []
+    for task in build_graph(parse_args(args), kwargs):
+        options = OPTIONS.get(task.name, {})
+        inputs += as_patterns(options.get("inputs", ()))
+        outputs += as_patterns(options.get("outputs", ()))
+    roots = [_base(pattern) for pattern in inputs] or ["."]
+    roots += [path for path, _, _ in sources() if os.path.exists(path)]
+    return roots, [os.path.abspath(pattern) for pattern in outputs]
+
+
+class Job:
+    """One run of the command list, in a forked child where possible.
+
+    Forking keeps the parent's loaded modules and lets a run be cancelled
+    as a whole: on SIGTERM the child terminates its shell commands and
+    exits immediately.
+    """
+
+    def __init__(self, args: list[str], jobs: int, kwargs: dict[str, str]):
+        self.status: int | None = None
+        self.pid = 0
+        self._thread: threading.Thread | None = None
+        if hasattr(os, "fork"):
+            sys.stdout.flush()
+            sys.stderr.flush()
+            self.pid = os.fork()
+            if self.pid == 0:
+                signal.signal(signal.SIGTERM, _terminate)
+                code = _run(args, jobs, kwargs)
+                from dopy import history
+
+                # os._exit skips the atexit hooks.
+                history.flush()
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(code)
+        else:
+            self._thread = threading.Thread(
+                target=lambda: setattr(self, "status", _run(args, jobs, kwargs)),
+                daemon=True,
+            )
+            self._thread.start()
+
+    def done(self) -> bool:
+        if self._thread is not None:
+            return not self._thread.is_alive()
+        if self.status is None:
+            pid, status = os.waitpid(self.pid, os.WNOHANG)
+            if pid:
+                self.status = os.waitstatus_to_exitcode(status)
+        return self.status is not None
+
+    def cancel(self) -> None:
+        if self.done():
+            return
+        if self._thread is not None:
+            from dopy.process import terminate_running
+
+            terminate_running()
+            self._thread.join()
+            return
+        from dopy.process import KILL_GRACE_PERIOD
+
+        os.kill(self.pid, signal.SIGTERM)
+        deadline = time.monotonic() + KILL_GRACE_PERIOD * 2
+        while not self.done():
+            if time.monotonic() > deadline:
+                os.kill(self.pid, signal.SIGKILL)
+                os.waitpid(self.pid, 0)
+                self.status = -signal.SIGKILL
+                return
+            time.sleep(0.01)
+
+
+def _terminate(*_) -> None:
+    """SIGTERM handler of a forked job: stop its shell commands and exit."""
+    from dopy.process import terminate_running
+
+    terminate_running()
+    os._exit(143)
+
+
+def _run(args: list[str], jobs: int, kwargs: dict[str, str]) -> int:
+    from dopy.cli import print_error
+    from dopy.command_utils import parse_args
+    from dopy.scheduler import run_commands
+
+    try:
+        run_commands(parse_args(args), jobs=jobs, kwargs=kwargs)
+    except Exception as e:
+        print_error(e)
+        return 1
+    return 0
+
+
+def _status(message: str) -> None:
+    sys.stderr.write(f"dopy: {message}\n")
+    sys.stderr.flush()
+
+
+def watch(
+    args: list[str],
+    jobs: int = 1,
+    kwargs: dict[str, str] | None = None,
+    debounce: float = DEBOUNCE,
+) -> None:
+    """Run `args`, then run them again whenever watched files change.
+
+    The process (with its loaded `do.py` files and imports) stays alive
+    between runs. Changes are coalesced until `debounce` seconds pass
+    without another one; a run still in progress is cancelled first. If a
+    `do.py` changed, the commands are reloaded before the next run. Stops
+    on Ctrl-C.
+    """
+    from dopy.command_loader import load_commands, sources
+
+    kwargs = kwargs or {}
+    roots, outputs = watched_paths(args, kwargs)
+    modules = {os.path.abspath(path) for path, _, _ in sources()}
+    with make_watcher(roots) as watcher:
+        _status(f"watching {', '.join(roots)} ({type(watcher).__name__})")
+        job = Job(args, jobs, kwargs)
+        reported = False
+        try:
+            while True:
+                changed = watcher.poll(0.1)
+                if changed:
+                    changed |= settle(watcher, debounce)
+                changed = {
+                    path
+                    for path in changed
+                    if not any(fnmatch.fnmatch(path, o) for o in outputs)
+                }
+                if not changed:
+                    if not reported and job.done():
+                        reported = True
+                        result = "done" if job.status == 0 else "failed"
+                        _status(f"{result}, waiting for changes")
+                    continue
+                if not job.done():
+                    _status("change detected, cancelling the running job")
+                    job.cancel()
+                if changed & modules:
+                    load_commands()
+                _status(f"{len(changed)} file(s) changed, running again")
+                job = Job(args, jobs, kwargs)
+                reported = False
+        except KeyboardInterrupt:
+            job.cancel()
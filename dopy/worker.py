@@ -0,0 +1,474 @@
+from __future__ import annotations
+
+import datetime
+import hmac
+import itertools
+import json
+import os
+import pathlib
+import queue
+import socket
+import struct
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any
+
+from dopy import history
+from dopy.config import DOPY_HOME
+from dopy.daemon import _recv_exact
+from dopy.exception import DopyException, InvalidCommandArgumentsException
+
+HEARTBEAT_INTERVAL = 1.0
+"""Seconds between two heartbeats of a worker."""
+
+HEARTBEAT_TIMEOUT = 5.0
+"""Seconds of silence after which a client gives a worker up."""
+
+MAX_FRAME = 64 << 20
+"""Largest accepted frame, in bytes."""
+
+MAX_AUTH_FRAME = 4096
+"""Largest accepted first frame, sent before the client is authenticated."""
+
+TOKEN_ENV = "DOPY_WORKER_TOKEN"
+"""Environment variable holding the secret shared by workers and clients."""
+
+_HEADER = struct.Struct("!I")
+
+
+class WorkerLost(DopyException):
+    """Raised when a worker stops answering while running a command"""
+
+
+def parse_address(address: str) -> tuple[socket.AddressFamily, Any]:
+    """Return the socket family and address for `host:port` or a socket path."""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and "/" not in address:
+        return socket.AF_INET, (host or "127.0.0.1", int(port))
+    return socket.AF_UNIX, address
+
+
+def default_address() -> str:
+    """Return the Unix socket a worker listens on without an address."""
+    return os.path.join(DOPY_HOME, "worker.sock")
+
+
+def worker_token(token: str | None = None) -> str:
+    """Return `token`, or the one in `DOPY_WORKER_TOKEN`.
+
+    Raises `DopyException` if neither is set: anyone reaching a worker can
+    run shell commands with arguments of their choice.
+    """
+    token = token or os.environ.get(TOKEN_ENV)
+    if not token:
+        raise DopyException(f"Set {TOKEN_ENV} to a secret shared with the workers.")
+    return token
+
+
+def send_frame(conn: socket.socket, message: dict, lock: threading.Lock) -> None:
+    """Send `message` as a length-prefixed JSON frame."""
+    data = json.dumps(message).encode()
+    with lock:
+        conn.sendall(_HEADER.pack(len(data)) + data)
+
+
+def recv_frame(conn: socket.socket, limit: int = MAX_FRAME) -> dict:
+    """Receive one frame sent by `send_frame`, of at most `limit` bytes."""
+    size = _HEADER.unpack(_recv_exact(conn, _HEADER.size))[0]
+    if size > limit:
+        raise ConnectionError(f"Frame of {size} bytes is too large.")
+    return json.loads(_recv_exact(conn, size))
+
+
+def encode(value: Any) -> Any:
+    """Encode a converted argument (see `dopy.binder`) as JSON data."""
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    if isinstance(value, list):
+        return [encode(item) for item in value]
+    if isinstance(value, (tuple, set, frozenset)):
+        kind = "tuple" if isinstance(value, tuple) else "set"
+        return {"__dopy__": kind, "items": [encode(item) for item in value]}
+    if isinstance(value, pathlib.PurePath):
+        return {"__dopy__": "path", "value": str(value)}
+    if isinstance(value, datetime.datetime):
+        return {"__dopy__": "datetime", "value": value.isoformat()}
+    if isinstance(value, dict):
+        return {"__dopy__": "dict", "items": [[k, encode(v)] for k, v in value.items()]}
+    raise InvalidCommandArgumentsException(
+        f"{type(value).__name__} arguments cannot be sent to a worker"
+    )
+
+
+def decode(data: Any) -> Any:
+    """Invert `encode`."""
+    if isinstance(data, list):
+        return [decode(item) for item in data]
+    if not isinstance(data, dict):
+        return data
+    kind = data["__dopy__"]
+    if kind == "tuple":
+        return tuple(decode(item) for item in data["items"])
+    if kind == "set":
+        return {decode(item) for item in data["items"]}
+    if kind == "path":
+        return pathlib.Path(data["value"])
+    if kind == "datetime":
+        return datetime.datetime.fromisoformat(data["value"])
+    return {key: decode(value) for key, value in data["items"]}
+
+
+class FrameSink:
+    """Output sink streaming writes back to the client as `output` frames."""
+
+    def __init__(self, conn: socket.socket, lock: threading.Lock, task_id: int):
+        self.conn = conn
+        self.lock = lock
+        self.task_id = task_id
+
+    def write(self, s: str) -> int:
+        if s:
+            try:
+                send_frame(
+                    self.conn,
+                    {"type": "output", "id": self.task_id, "data": s},
+                    self.lock,
+                )
+            except OSError:
+                # The client is gone; the command still runs to completion.
+                pass
+        return len(s)
+
+    def flush(self) -> None:
+        pass
+
+
+class WorkerServer:
+    """Serves command invocations of this process's registry over a socket.
+
+    Every connection is a client session. Its first frame must be an `auth`
+    frame carrying the shared `token` (see `worker_token`); otherwise the
+    connection is closed. After a `hello` frame announcing the worker's
+    `slots`, the client sends `run` frames and receives
+    `output` frames while the command runs and one `done` frame at the end.
+    Up to `slots` commands run at the same time across all sessions, and a
+    `heartbeat` frame is sent every `HEARTBEAT_INTERVAL` seconds.
+    """
+
+    def __init__(
+        self, address: str, slots: int | None = None, token: str | None = None
+    ):
+        self.address = address
+        self.token = worker_token(token)
+        self.slots = slots or os.cpu_count() or 1
+        self._pool = ThreadPoolExecutor(max_workers=self.slots)
+        self._stop = threading.Event()
+        self._server: socket.socket | None = None
+        self._connections: set[socket.socket] = set()
+
+    def bind(self) -> str:
+        """Start listening and return the address (with the actual port)."""
+        family, address = parse_address(self.address)
+        server = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_UNIX:
+            if os.path.exists(address):
+                os.unlink(address)
+        else:
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(address)
+        if family == socket.AF_UNIX:
+            # Before listen(), so no one connects while it is still open.
+            os.chmod(address, 0o600)
+        server.listen(64)
+        server.settimeout(0.2)
+        self._server = server
+        if family != socket.AF_UNIX:
+            host, port = server.getsockname()[:2]
+            self.address = f"{host}:{port}"
+        return self.address
+
+    def serve_forever(self) -> None:
+        from dopy.output import routed
+
+        if self._server is None:
+            self.bind()
+        assert self._server is not None
+        with routed(), self._server:
+            while not self._stop.is_set():
+                try:
+                    conn, _ = self._server.accept()
+                except TimeoutError:
+                    continue
+                except OSError:
+                    break
+                self._connections.add(conn)
+                threading.Thread(
+                    target=self._session, args=(conn,), daemon=True
+                ).start()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def stop(self) -> None:
+        """Stop accepting and drop every session, as if the worker died."""
+        self._stop.set()
+        for conn in list(self._connections):
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _session(self, conn: socket.socket) -> None:
+        lock = threading.Lock()
+        closed = threading.Event()
+
+        def heartbeat() -> None:
+            while not closed.wait(HEARTBEAT_INTERVAL):
+                try:
+                    send_frame(conn, {"type": "heartbeat"}, lock)
+                except OSError:
+                    return
+
+        try:
+            if not self._authenticate(conn, lock):
+                return
+            send_frame(conn, {"type": "hello", "slots": self.slots}, lock)
+            threading.Thread(target=heartbeat, daemon=True).start()
+            while True:
+                message = recv_frame(conn)
+                if message.get("type") == "run":
+                    self._pool.submit(self._run, conn, lock, message)
+        except (OSError, ValueError, RuntimeError):
+            pass
+        finally:
+            closed.set()
+            self._connections.discard(conn)
+            conn.close()
+
+    def _authenticate(self, conn: socket.socket, lock: threading.Lock) -> bool:
+        conn.settimeout(HEARTBEAT_TIMEOUT)
+        message = recv_frame(conn, MAX_AUTH_FRAME)
+        token = message.get("token") if message.get("type") == "auth" else None
+        if not isinstance(token, str) or not hmac.compare_digest(
+            token.encode(), self.token.encode()
+        ):
+            send_frame(conn, {"type": "denied", "error": "Invalid worker token"}, lock)
+            return False
+        conn.settimeout(None)
+        return True
+
+    def _run(self, conn: socket.socket, lock: threading.Lock, message: dict) -> None:
+        from dopy.command_utils import execute_command, get_command
+        from dopy.output import redirect
+
+        done: dict[str, Any] = {"type": "done", "id": message["id"], "ok": True}
+        with redirect(FrameSink(conn, lock, message["id"])):
+            try:
+                fn = get_command(message["name"])
+                execute_command(
+                    fn,
+                    *decode(message["args"]),
+                    **{k: decode(v) for k, v in message["kwargs"].items()},
+                )
+            except InvalidCommandArgumentsException as e:
+                done.update(ok=False, kind="args", error=str(e))
+            except DopyException as e:
+                done.update(ok=False, kind="dopy", error=str(e))
+            except Exception as e:
+                done.update(ok=False, kind="error", error=f"{type(e).__name__}: {e}")
+        try:
+            send_frame(conn, done, lock)
+        except OSError:
+            pass
+        history.flush()
+
+
+class Connection:
+    """Client side of one worker session."""
+
+    def __init__(self, address: str, token: str | None = None):
+        self.address = address
+        family, target = parse_address(address)
+        self.conn = socket.socket(family, socket.SOCK_STREAM)
+        self.conn.settimeout(HEARTBEAT_TIMEOUT)
+        self.conn.connect(target)
+        self._lock = threading.Lock()
+        auth = {"type": "auth", "token": worker_token(token)}
+        send_frame(self.conn, auth, self._lock)
+        hello = recv_frame(self.conn)
+        if hello.get("type") == "denied":
+            self.conn.close()
+            raise ConnectionError(hello["error"])
+        self.slots: int = hello["slots"]
+        self.alive = True
+        self.running = 0
+        self._pending: dict[int, queue.Queue] = {}
+        self._ids = itertools.count()
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def _read(self) -> None:
+        try:
+            while True:
+                message = recv_frame(self.conn)
+                box = self._pending.get(message.get("id", -1))
+                if box is not None:
+                    box.put(message)
+        except (OSError, ValueError):
+            # Closed, or silent for longer than HEARTBEAT_TIMEOUT.
+            self.alive = False
+            for box in list(self._pending.values()):
+                box.put({"type": "lost"})
+
+    def run(self, name: str, args: list, kwargs: dict) -> None:
+        """Run a command on the worker, writing its output to `sys.stdout`.
+
+        Raises `WorkerLost` if the worker dies or goes silent meanwhile.
+        """
+        task_id = next(self._ids)
+        box: queue.Queue = queue.Queue()
+        self._pending[task_id] = box
+        try:
+            if not self.alive:
+                raise WorkerLost(f"Worker {self.address} is gone")
+            message = {
+                "type": "run",
+                "id": task_id,
+                "name": name,
+                "args": args,
+                "kwargs": kwargs,
+            }
+            try:
+                send_frame(self.conn, message, self._lock)
+            except OSError as e:
+                self.alive = False
+                raise WorkerLost(f"Worker {self.address} is gone") from e
+            while True:
+                reply = box.get()
+                if reply["type"] == "output":
+                    sys.stdout.write(reply["data"])
+                elif reply["type"] == "lost":
+                    raise WorkerLost(f"Worker {self.address} stopped answering")
+                else:
+                    break
+        finally:
+            del self._pending[task_id]
+        if reply["ok"]:
+            return
+        if reply["kind"] == "args":
+            raise InvalidCommandArgumentsException(reply["error"])
+        if reply["kind"] == "dopy":
+            raise DopyException(reply["error"])
+        raise DopyException(
+            f"Command '{name}' failed on worker {self.address}: {reply['error']}"
+        )
+
+    def close(self) -> None:
+        self.alive = False
+        try:
+            self.conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.conn.close()
+
+
+class Remote:
+    """Runs commands on a set of workers.
+
+    Each call goes to the live worker with the lowest load (running
+    commands per slot). When a worker is lost, the call is retried on
+    another one, at most `retries` times. `token` defaults to
+    `DOPY_WORKER_TOKEN`.
+    """
+
+    def __init__(
+        self, addresses: list[str], retries: int = 2, token: str | None = None
+    ):
+        token = worker_token(token)
+        self.retries = retries
+        self.connections: list[Connection] = []
+        self._lock = threading.Lock()
+        errors = []
+        for address in addresses:
+            try:
+                self.connections.append(Connection(address, token))
+            except (OSError, ValueError) as e:
+                errors.append(f"{address}: {e}")
+        if not self.connections:
+            raise DopyException(f"No worker available ({'; '.join(errors)})")
+
+    @property
+    def slots(self) -> int:
+        return sum(c.slots for c in self.connections if c.alive)
+
+    def _pick(self) -> Connection:
+        with self._lock:
+            alive = [c for c in self.connections if c.alive]
+            if not alive:
+                raise DopyException("No worker available")
+            connection = min(alive, key=lambda c: c.running / c.slots)
+            connection.running += 1
+            return connection
+
+    def call(self, name: str, args: list[Any], kwargs: dict[str, Any]) -> None:
+        """Run the invocation `(name, args, kwargs)` from `parse_args` remotely."""
+        encoded_args = encode(list(args))
+        encoded_kwargs = {key: encode(value) for key, value in kwargs.items()}
+        attempt = 0
+        while True:
+            connection = self._pick()
+            try:
+                connection.run(name, encoded_args, encoded_kwargs)
+                return
+            except WorkerLost:
+                attempt += 1
+                if attempt > self.retries:
+                    raise
+                sys.stderr.write(
+                    f"dopy: worker {connection.address} lost, retrying '{name}'\n"
+                )
+            finally:
+                with self._lock:
+                    connection.running -= 1
+
+    def close(self) -> None:
+        for connection in self.connections:
+            connection.close()
+
+    def __enter__(self) -> Remote:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def main(argv: list[str] | None = None) -> int:
+    """`dopy worker [ADDRESS [SLOTS]]`: serve the current project.
+
+    Listens on `default_address()` without an address; a `HOST:PORT`
+    without a host means loopback. Requires `DOPY_WORKER_TOKEN`.
+    """
+    from dopy.command_loader import ensure_commands_loaded
+
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) > 2 or (len(argv) == 2 and not argv[1].isdigit()):
+        print("usage: dopy worker [HOST:PORT|SOCKET_PATH [SLOTS]]", file=sys.stderr)
+        return 2
+    address = argv[0] if argv else default_address()
+    try:
+        server = WorkerServer(address, int(argv[1]) if len(argv) > 1 else None)
+    except DopyException as e:
+        print(f"dopy worker: {e}", file=sys.stderr)
+        return 2
+    ensure_commands_loaded()
+    if parse_address(address)[0] == socket.AF_UNIX:
+        os.makedirs(os.path.dirname(os.path.abspath(address)), exist_ok=True)
+    print(f"dopy worker listening on {server.bind()}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,37 @@
+import pytest
+
+from dopy import (
+    artifacts,
+    command_index,
+    command_loader,
+    daemon,
+    history,
+    memo,
+    resources,
+    stubs,
+    worker,
+)
+
+
+@pytest.fixture(autouse=True)
+def dopy_home(tmp_path, monkeypatch):
+    """Keep caches, history and locks of every test out of `~/.dopy`."""
+    home = str(tmp_path / "dopy-home")
+    monkeypatch.setenv("DOPY_HOME", home)
+    modules = (
+        command_index,
+        command_loader,
+        daemon,
+        history,
+        memo,
+        resources,
+        stubs,
+        worker,
+    )
+    for module in modules:
+        monkeypatch.setattr(module, "DOPY_HOME", home)
+    monkeypatch.setattr(artifacts, "ARTIFACT_DIR", f"{home}/cache/artifacts")
+    # Runs still buffered at exit would be written to the real home.
+    monkeypatch.setattr(history, "_pending", [])
+    monkeypatch.setattr(history, "_estimates", None)
+    return home
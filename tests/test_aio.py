@@ -0,0 +1,85 @@
+import asyncio
+import time
+
+import pytest
+
+from dopy import aio
+from dopy.command import COMMANDS, DEPENDENCIES, OPTIONS, command, echo, sh
+from dopy.output import capture, routed
+
+NAMES = ("_nap", "_loop_id", "_gather", "_shout", "_fail", "_answer", "_cached")
+
+
+@pytest.fixture(autouse=True)
+def cleanup(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    yield
+    for name in NAMES:
+        for registry in (COMMANDS, DEPENDENCIES, OPTIONS):
+            registry.pop(name, None)
+
+
+def test_async_command_runs_on_the_shared_loop():
+    @command
+    async def _loop_id():
+        return id(asyncio.get_running_loop())
+
+    assert _loop_id() == _loop_id() == id(aio.shared_loop())
+
+
+def test_async_commands_overlap_when_awaited_together():
+    @command
+    async def _nap():
+        await asyncio.sleep(0.2)
+        return "rested"
+
+    @command
+    async def _gather():
+        return await asyncio.gather(*(_nap() for _ in range(5)))
+
+    start = time.monotonic()
+    assert _gather() == ["rested"] * 5
+    assert time.monotonic() - start < 0.8
+
+
+def test_async_sh_streams_into_the_callers_sink():
+    @sh(capture=True)
+    async def _shout(word: str):
+        return f"echo {word}"
+
+    with routed(), capture() as buffer:
+        result = _shout("hey")
+    assert buffer.getvalue() == "hey\n"
+    assert result == "echo hey" and result.output == "hey\n"
+
+
+def test_async_sh_raises_on_failure():
+    @sh
+    async def _fail():
+        return "exit 4"
+
+    with pytest.raises(RuntimeError, match="exit code 4"):
+        _fail()
+
+
+def test_async_echo_prints_the_awaited_result(capsys):
+    @echo
+    async def _answer():
+        return 42
+
+    assert _answer() == 42
+    assert capsys.readouterr().out == "42\n"
+
+
+def test_async_command_with_cache_and_inputs(tmp_path):
+    (tmp_path / "in.txt").write_text("x")
+    calls = []
+
+    @command(cache=True, inputs="in.txt")
+    async def _cached():
+        calls.append(1)
+        return "done"
+
+    assert _cached() == "done"
+    assert _cached() is None  # up to date
+    assert calls == [1]
@@ -30,3 +30,31 @@ def say():
     result = runner.invoke(app_mod.app, ["say"])
     assert result.exit_code == 0
     assert "hello-e2e" in result.stdout
+
+
+def test_app_runs_commands_in_parallel(tmp_path, monkeypatch):
+    proj = tmp_path / "proj"
+    proj.mkdir()
+    proj.joinpath("do.py").write_text(dedent("""
+from dopy import command, sh
+
+@command
+def first():
+    print('first-out')
+
+@sh
+def second():
+    return 'echo second-out'
+"""))
+
+    monkeypatch.chdir(proj)
+    loader = importlib.import_module("dopy.command_loader")
+    importlib.reload(loader)
+    loader.load_commands()
+    app_mod = importlib.import_module("dopy.app")
+    importlib.reload(app_mod)
+
+    result = CliRunner().invoke(app_mod.app, ["-j", "2", "first", "second"])
+    assert result.exit_code == 0
+    assert "first-out" in result.stdout
+    assert "second-out" in result.stdout
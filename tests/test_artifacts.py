@@ -0,0 +1,131 @@
+import os
+
+import pytest
+
+from dopy import incremental
+from dopy.artifacts import ArtifactStore, Artifacts
+from dopy.command import COMMANDS, DEPENDENCIES, OPTIONS, sh
+
+
+@pytest.fixture(autouse=True)
+def project(tmp_path, monkeypatch):
+    (tmp_path / "proj").mkdir()
+    monkeypatch.chdir(tmp_path / "proj")
+    yield tmp_path
+    for registry in (COMMANDS, DEPENDENCIES, OPTIONS):
+        registry.pop("_build", None)
+
+
+def make_build(store, runs, **options):
+    @sh(
+        inputs="src.txt",
+        outputs=["out/app", "out/log.txt"],
+        artifacts=store,
+        capture=True,
+        **options,
+    )
+    def _build():
+        return (
+            f"echo run >> {runs} && mkdir -p out && tr a-z A-Z < src.txt > out/app"
+            " && chmod +x out/app && echo built | tee out/log.txt"
+        )
+
+    return _build
+
+
+def runs(project):
+    return open(project / "runs").read().count("run")
+
+
+def test_outputs_are_restored_instead_of_rerun(project):
+    store = str(project / "cas")
+    build = make_build(store, project / "runs")
+    open("src.txt", "w").write("hello")
+
+    assert build().output == "built\n"
+    os.remove("out/app")
+    result = build()
+    assert runs(project) == 1
+    assert open("out/app").read() == "HELLO"
+    assert os.access("out/app", os.X_OK)
+    assert result.output == "built\n"
+
+
+def test_key_covers_command_inputs_and_env(project, monkeypatch):
+    artifacts = Artifacts("t", inputs="src.txt", env=["CC"], store=str(project / "c"))
+    open("src.txt", "w").write("a")
+    monkeypatch.setenv("CC", "gcc")
+    key = artifacts.key("make")
+    assert artifacts.key("make") == key
+    assert artifacts.key("make -j2") != key
+    monkeypatch.setenv("CC", "clang")
+    assert artifacts.key("make") != key
+    monkeypatch.setenv("CC", "gcc")
+    open("src.txt", "w").write("b")
+    assert artifacts.key("make") != key
+
+
+def test_key_only_hashes_changed_inputs(project, monkeypatch):
+    artifacts = Artifacts("t", inputs="src.txt", store=str(project / "c"))
+    open("src.txt", "w").write("a")
+    key = artifacts.key("make")
+    hashed = []
+    real_hash = incremental._hash_file
+    monkeypatch.setattr(
+        incremental, "_hash_file", lambda path: hashed.append(path) or real_hash(path)
+    )
+    assert artifacts.key("make") == key
+    assert hashed == []
+    open("src.txt", "w").write("ab")
+    assert artifacts.key("make") != key
+    assert hashed == ["src.txt"]
+
+
+def test_shared_store_serves_another_checkout(project, monkeypatch):
+    store = str(project / "shared")
+    build = make_build(store, project / "runs")
+    open("src.txt", "w").write("abc")
+    build()
+
+    other = project / "other"
+    other.mkdir()
+    monkeypatch.chdir(other)
+    open("src.txt", "w").write("abc")
+    build()
+    assert runs(project) == 1
+    assert open("out/app").read() == "ABC"
+
+
+def test_failed_or_partial_runs_are_not_cached(project):
+    store = ArtifactStore(str(project / "cas"))
+    artifacts = Artifacts("t", outputs=["a", "b"], store=store)
+    open("a", "w").write("x")
+    artifacts.save("key")
+    assert store.load("key") is None
+
+
+def test_hard_links_share_the_blob(project):
+    store = ArtifactStore(str(project / "cas"), hard_links=True)
+    artifacts = Artifacts("t", outputs="a", store=store)
+    open("a", "w").write("x")
+    artifacts.save("key")
+    os.remove("a")
+    artifacts.restore("key")
+    digest, _ = store.load("key")["files"]["a"]
+    assert os.path.samefile("a", store._blob(digest))
+
+
+def test_least_recently_used_blobs_are_evicted(project):
+    store = ArtifactStore(str(project / "cas"), max_size=10)
+    for i, name in enumerate(["old", "mid", "new"]):
+        open(name, "w").write(name * 2)
+        digest, _ = store.put(name)
+        os.utime(store._blob(digest), ns=(i, i * 10**9))
+    store.evict()
+    remaining = sorted(
+        name
+        for _, _, names in os.walk(os.path.join(store.root, "blobs"))
+        for name in names
+    )
+    assert len(remaining) == 1
+    assert remaining == [store.put("new")[0]]
@@ -0,0 +1,61 @@
+import io
+
+import pytest
+
+from dopy import batch
+from dopy.command import COMMANDS, DEPENDENCIES, OPTIONS, command
+
+
+@pytest.fixture
+def add():
+    @command
+    def _add(a: int, b: int = 1):
+        if a < 0:
+            raise ValueError("negative")
+        print(a + b)
+
+    yield
+    for registry in (COMMANDS, DEPENDENCIES, OPTIONS):
+        registry.pop("_add", None)
+
+
+@pytest.mark.parametrize(
+    "line, argv",
+    [
+        ("_add 1 b=2", ["_add", "1", "b=2"]),
+        ("_add 'two words'", ["_add", "two words"]),
+        ('["_add", 3]', ["_add", "3"]),
+        ('{"argv": ["_add", "b=4"]}', ["_add", "b=4"]),
+        ("   ", None),
+        ("# comment", None),
+    ],
+)
+def test_parse_line(line, argv):
+    assert batch.parse_line(line) == argv
+
+
+def test_parse_line_rejects_json_without_argv():
+    with pytest.raises(ValueError):
+        batch.parse_line('{"cmd": "_add"}')
+
+
+def test_run_batch_reports_each_line(add, tmp_path, capsys):
+    source = tmp_path / "batch.txt"
+    source.write_text("_add 1 b=2\n\n_add -5\n{broken\n_missing\n_add 10\n")
+    summary = batch.run_batch(str(source))
+    out, err = capsys.readouterr()
+    assert out == "3\n11\n"
+    assert (summary.ok, summary.failed) == (2, 3)
+    assert "line 1: ok" in err
+    assert "line 3: failed: negative" in err
+    assert "line 5: failed: Command '_missing' not found." in err
+    assert "5 invocations, 2 ok, 3 failed" in err
+
+
+def test_run_batch_in_parallel_from_stdin(add, monkeypatch, capsys):
+    lines = "".join(f"_add {i}\n" for i in range(50))
+    monkeypatch.setattr("sys.stdin", io.StringIO(lines))
+    summary = batch.run_batch("-", jobs=4)
+    out = capsys.readouterr().out
+    assert (summary.ok, summary.failed) == (50, 0)
+    assert sorted(map(int, out.split())) == list(range(1, 51))
@@ -0,0 +1,88 @@
+import datetime
+import inspect
+import pathlib
+
+import pytest
+
+from dopy import binder as b
+from dopy.command import COMMANDS, command
+
+
+@pytest.fixture(autouse=True)
+def cleanup():
+    yield
+    COMMANDS.pop("_bound", None)
+
+
+def test_binder_is_attached_at_registration():
+    @command
+    def _bound(n: int):
+        return n
+
+    binder = _bound.__dopy_binder__
+    assert isinstance(binder, b.Binder)
+    assert b.binder_for(_bound) is binder
+
+
+def test_signature_is_analysed_once(monkeypatch):
+    @command
+    def _bound(n: int, tags: list[int] | None = None):
+        return n
+
+    calls = []
+    real = inspect.signature
+    monkeypatch.setattr(inspect, "signature", lambda fn: calls.append(fn) or real(fn))
+    binder = b.binder_for(_bound)
+    for _ in range(3):
+        assert binder.bind(["1"], {"tags": "x"}) == ([1], {"tags": "x"})
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize(
+    "annotation, value, expected",
+    [
+        (int, "7", 7),
+        (int, "x", "x"),
+        (float, "1.5", 1.5),
+        (bool, "yes", True),
+        (bool, "off", False),
+        (bool, "maybe", "maybe"),
+        (pathlib.Path, "/tmp", pathlib.Path("/tmp")),
+        (datetime.datetime, "2025-01-02", datetime.datetime(2025, 1, 2)),
+        (datetime.datetime, "not a date", "not a date"),
+        (list[int], "1, 2,x", [1, 2, "x"]),
+        (set[str], "a,b,a", {"a", "b"}),
+        (tuple[int, ...], "1,2", (1, 2)),
+        (list, "a,b", "a,b"),
+        (list[int], "", []),
+        (inspect.Parameter.empty, "raw", "raw"),
+        (dict, "raw", "raw"),
+    ],
+)
+def test_compiled_converters(annotation, value, expected):
+    assert b.compile_converter(annotation)(value) == expected
+
+
+def test_converters_are_cached_per_annotation():
+    assert b.compile_converter(list[int]) is b.compile_converter(list[int])
+
+
+def test_bind_matches_resolution_rules():
+    def f(name: str, num: int = 1, *rest: int, flag: bool = False):
+        return None
+
+    binder = b.Binder(f)
+    # positional wins over keyword, extra positionals use *rest's annotation
+    assert binder.bind(["n", "2", "3"], {"name": "kw", "flag": "1"}) == (
+        ["n", 2, 3],
+        {"flag": True},
+    )
+    assert binder.bind([], {"num": "5", "unknown": "x"}) == ([], {"num": 5})
+
+
+def test_large_list_binding():
+    def f(values: list[int]):
+        return None
+
+    pos, _ = b.Binder(f).bind([",".join(map(str, range(5000)))], {})
+    assert pos[0] == list(range(5000))
@@ -0,0 +1,100 @@
+import os
+import subprocess
+import sys
+from textwrap import dedent
+
+import pytest
+
+from dopy import cli
+from dopy import command_loader
+from dopy.command import COMMANDS
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    proj = tmp_path / "proj"
+    proj.mkdir()
+    proj.joinpath("do.py").write_text(dedent("""
+        from dopy import command
+
+        @command
+        def greet(name: str, times: int = 1):
+            print(("hi " + name + ";") * times)
+
+        @command
+        def boom():
+            raise RuntimeError("kaboom")
+
+        @command
+        def interrupted():
+            raise KeyboardInterrupt
+
+        @command
+        def worker(mode: str = "user"):
+            print("worker command", mode)
+    """))
+    monkeypatch.setattr(command_loader, "DOPY_HOME", str(tmp_path / "home"))
+    monkeypatch.setattr(command_loader, "_loaded", False)
+    monkeypatch.chdir(proj)
+    yield proj
+    COMMANDS.pop("greet", None)
+    COMMANDS.pop("boom", None)
+    COMMANDS.pop("interrupted", None)
+    COMMANDS.pop("worker", None)
+
+
+@pytest.mark.parametrize(
+    "argv, plain",
+    [
+        (["build"], True),
+        (["greet", "name=x", "pos"], True),
+        ([], False),
+        (["--help"], False),
+        (["greet", "-h"], False),
+        (["-j", "2", "greet"], False),
+    ],
+)
+def test_is_plain_dispatch(argv, plain):
+    assert cli._is_plain_dispatch(argv) is plain
+
+
+def test_is_plain_dispatch_defers_completion(monkeypatch):
+    monkeypatch.setenv("_DOPY_COMPLETE", "complete_zsh")
+    assert cli._is_plain_dispatch(["greet"]) is False
+
+
+def test_run_executes_commands(project, capsys):
+    assert cli.run(["greet", "bob", "times=2"]) == 0
+    assert "hi bob;hi bob;" in capsys.readouterr().out
+
+
+def test_run_reports_errors(project, capsys):
+    assert cli.run(["boom"]) == 1
+    assert "kaboom" in capsys.readouterr().out
+
+
+def test_run_reports_interrupts(project, capsys):
+    assert cli.run(["interrupted"]) == 130
+    assert capsys.readouterr().err == "Aborted!\n"
+
+
+def test_user_command_named_worker_wins(project, capsys):
+    assert cli.dispatch(["worker", "mine"]) == 0
+    assert "worker command mine" in capsys.readouterr().out
+
+
+def test_fast_path_does_not_import_typer_or_rich(project, tmp_path):
+    code = dedent("""
+        import sys
+        from dopy.cli import main
+        assert main(["greet", "x"]) == 0
+        assert "typer" not in sys.modules, "typer imported"
+        assert "rich" not in sys.modules, "rich imported"
+    """)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, DOPY_HOME=str(tmp_path / "home"), PYTHONPATH=root)
+    proc = subprocess.run(
+        [sys.executable, "-c", code], cwd=project, env=env, capture_output=True
+    )
+    assert proc.returncode == 0, proc.stderr.decode()
+    assert b"hi x;" in proc.stdout
@@ -0,0 +1,105 @@
+import importlib
+import os
+from textwrap import dedent
+
+import pytest
+
+from dopy import command_helper as ch
+from dopy import command_index as ci
+from dopy import command_loader
+from dopy.command import COMMANDS
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    home = tmp_path / "home"
+    home.mkdir()
+    proj = tmp_path / "proj"
+    proj.mkdir()
+    proj.joinpath("do.py").write_text(
+        dedent("""
+        from dopy import command
+
+        @command
+        def indexed(name: str, count: int = 1):
+            \"\"\"Indexed command\"\"\"
+            print(name * count)
+    """)
+    )
+    monkeypatch.setattr(command_loader, "DOPY_HOME", str(home))
+    monkeypatch.setattr(ci, "DOPY_HOME", str(home))
+    monkeypatch.setattr(command_loader, "_loaded", False)
+    monkeypatch.chdir(proj)
+    COMMANDS.pop("indexed", None)
+    yield proj
+    COMMANDS.pop("indexed", None)
+    ci.INDEX.clear()
+
+
+def _forget_commands():
+    COMMANDS.pop("indexed", None)
+    command_loader._loaded = False
+
+
+def test_first_load_imports_and_writes_index(project, tmp_path):
+    assert ci.load_index() is False
+    assert "indexed" in COMMANDS
+    assert command_loader._loaded
+    assert ci.INDEX == {}
+    assert os.listdir(tmp_path / "home" / "cache" / "index")
+
+
+def test_fresh_index_answers_without_importing(project):
+    ci.load_index()
+    _forget_commands()
+
+    assert ci.load_index() is True
+    assert "indexed" not in COMMANDS
+    assert not command_loader._loaded
+    assert ("indexed", "Indexed command") in ch.all_commands_for_help("ind")
+
+    ctx = type("Ctx", (), {"params": {"args": ["indexed"]}})()
+    assert ch.complete_commands(ctx, "") == [("name=", "str")]
+
+
+def test_changed_do_py_invalidates_index(project):
+    ci.load_index()
+    _forget_commands()
+    do_py = project / "do.py"
+    do_py.write_text(do_py.read_text().replace("Indexed command", "Changed"))
+
+    assert ci.load_index() is False
+    assert "indexed" in COMMANDS
+
+
+def test_touched_but_unchanged_do_py_stays_fresh(project):
+    ci.load_index()
+    _forget_commands()
+    do_py = project / "do.py"
+    st = do_py.stat()
+    os.utime(do_py, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+    assert ci.load_index() is True
+    assert ci.load_index() is True
+
+
+def test_index_is_keyed_by_interpreter(project, monkeypatch):
+    ci.load_index()
+    _forget_commands()
+    monkeypatch.setattr(ci, "_interpreter", lambda: "other-python")
+
+    assert ci.load_index() is False
+
+
+def test_app_dispatch_imports_indexed_command(project):
+    from typer.testing import CliRunner
+
+    ci.load_index()
+    _forget_commands()
+    app_mod = importlib.import_module("dopy.app")
+    importlib.reload(app_mod)
+    assert "indexed" not in COMMANDS
+
+    result = CliRunner().invoke(app_mod.app, ["indexed", "ab", "count=2"])
+    assert result.exit_code == 0
+    assert "abab" in result.stdout
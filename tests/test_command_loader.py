@@ -83,3 +83,82 @@ def test_loader_handles_spec_none(tmp_path, monkeypatch):
 
     # call should return without raising
     loader.load_commands()
+
+
+@pytest.fixture
+def lazy_project(tmp_path, monkeypatch):
+    from dopy import stubs
+
+    home = tmp_path / "home"
+    (home / "tasks").mkdir(parents=True)
+    proj = tmp_path / "proj"
+    (proj / "do").mkdir(parents=True)
+    write_do(home, """
+from dopy import command
+
+@command
+def lz_eager():
+    return 'home eager'
+""")
+    (home / "tasks" / "shared.py").write_text(dedent("""
+from dopy import command
+
+@command
+def lz_shared():
+    \"\"\"From the home task library\"\"\"
+    return 'home task'
+
+@command
+def lz_override():
+    return 'home task'
+"""))
+    write_do(proj, """
+from dopy import command
+
+@command
+def lz_override():
+    return 'cwd do.py'
+""")
+    (proj / "do" / "build.py").write_text(dedent("""
+from dopy import command
+
+@command
+def lz_eager():
+    return 'cwd task'
+"""))
+    loader = importlib.import_module("dopy.command_loader")
+    monkeypatch.setattr(loader, "DOPY_HOME", str(home))
+    monkeypatch.setattr(stubs, "DOPY_HOME", str(home))
+    monkeypatch.chdir(proj)
+    yield loader
+    cmd = importlib.import_module("dopy.command")
+    for name in ("lz_eager", "lz_shared", "lz_override"):
+        for registry in (cmd.COMMANDS, cmd.DEPENDENCIES, cmd.OPTIONS):
+            registry.pop(name, None)
+    loader.LAZY.clear()
+    loader.STUBS.clear()
+
+
+def test_task_modules_are_imported_on_first_use(lazy_project):
+    from dopy.command import COMMANDS
+    from dopy.command_utils import get_command
+
+    lazy_project.load_commands()
+    assert set(lazy_project.LAZY) == {"lz_shared", "lz_eager"}
+    assert lazy_project.STUBS["lz_shared"]["doc"] == "From the home task library"
+    assert "lz_shared" not in COMMANDS
+    assert "lz_eager" not in COMMANDS
+
+    assert get_command("lz_shared")() == "home task"
+    assert "lz_shared" not in lazy_project.LAZY
+
+
+def test_lazy_modules_keep_the_override_order(lazy_project):
+    from dopy.command_utils import get_command
+
+    lazy_project.load_commands()
+    # The cwd task module overrides the eager home do.py ...
+    assert get_command("lz_eager")() == "cwd task"
+    # ... and importing the home task module keeps the cwd do.py command.
+    get_command("lz_shared")
+    assert get_command("lz_override")() == "cwd do.py"
@@ -0,0 +1,90 @@
+import os
+import subprocess
+import sys
+from textwrap import dedent
+
+import pytest
+
+from dopy import cli, command_index, command_loader, completion
+from dopy.command import COMMANDS
+from dopy.command_index import INDEX
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    proj = tmp_path / "proj"
+    proj.mkdir()
+    proj.joinpath("do.py").write_text(dedent('''
+        from dopy import command
+
+        @command
+        def greet(name: str, times: int = 1):
+            """Say hello"""
+
+        @command
+        def grow():
+            pass
+    '''))
+    for module in (command_loader, command_index):
+        monkeypatch.setattr(module, "DOPY_HOME", str(tmp_path / "home"))
+    monkeypatch.setattr(command_loader, "_loaded", False)
+    monkeypatch.chdir(proj)
+    yield proj
+    for name in ("greet", "grow"):
+        COMMANDS.pop(name, None)
+    INDEX.clear()
+
+
+def test_split_arg_string_keeps_unfinished_quote():
+    assert completion.split_arg_string("dopy greet 'bo") == ["dopy", "greet", "bo"]
+
+
+def test_zsh_completes_command_names(project, monkeypatch, capsys):
+    monkeypatch.setenv("_TYPER_COMPLETE_ARGS", "dopy gr")
+    assert completion.complete_shell("complete_zsh") == 0
+    assert capsys.readouterr().out == (
+        "_arguments '*: :((\"greet\":\"Say hello\"\n\"grow\"))'\n"
+    )
+
+
+def test_bash_completes_missing_parameters(project, monkeypatch, capsys):
+    monkeypatch.setenv("COMP_WORDS", "dopy greet ")
+    monkeypatch.setenv("COMP_CWORD", "2")
+    assert completion.complete_shell("complete_bash") == 0
+    assert capsys.readouterr().out == "name=\n"
+
+
+@pytest.mark.parametrize(
+    "instruction, line", [("source_zsh", "dopy "), ("complete_zsh", "dopy -")]
+)
+def test_requests_needing_typer_are_not_handled(monkeypatch, instruction, line):
+    monkeypatch.setenv("_TYPER_COMPLETE_ARGS", line)
+    assert completion.complete_shell(instruction) is None
+
+
+def test_dunder_complete_mode(project, capsys):
+    assert cli.dispatch(["__complete", "greet", "x", "gr"]) == 0
+    assert capsys.readouterr().out == "greet\tSay hello\ngrow\n"
+
+
+def test_completion_does_not_import_typer_or_rich(project, tmp_path):
+    code = dedent("""
+        import sys
+        from dopy.cli import main
+        assert main([]) == 0
+        assert "typer" not in sys.modules, "typer imported"
+        assert "rich" not in sys.modules, "rich imported"
+    """)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(
+        os.environ,
+        DOPY_HOME=str(tmp_path / "home"),
+        PYTHONPATH=root,
+        _DOPY_COMPLETE="complete_zsh",
+        _TYPER_COMPLETE_ARGS="dopy g",
+    )
+    proc = subprocess.run(
+        [sys.executable, "-c", code], cwd=project, env=env, capture_output=True
+    )
+    assert proc.returncode == 0, proc.stderr.decode()
+    assert b'"greet":"Say hello"' in proc.stdout
@@ -0,0 +1,100 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+from textwrap import dedent
+
+import pytest
+
+from dopy import daemon
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def served(tmp_path, monkeypatch):
+    home = tmp_path / "home"
+    home.mkdir()
+    proj = tmp_path / "proj"
+    proj.mkdir()
+    proj.joinpath("do.py").write_text(dedent("""
+        import os
+        from dopy import command
+
+        @command
+        def where(code: int = 0):
+            print("pid", os.getpid(), "cwd", os.getcwd(), os.environ.get("MARK"))
+            if code:
+                raise SystemExit(code)
+    """))
+    env = dict(os.environ, DOPY_HOME=str(home), PYTHONPATH=ROOT)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "dopy.daemon", "serve"], cwd=tmp_path, env=env
+    )
+    monkeypatch.setattr(daemon, "DOPY_HOME", str(home))
+    deadline = time.monotonic() + 10
+    while not daemon.is_running():
+        assert time.monotonic() < deadline, "daemon did not start"
+        time.sleep(0.05)
+    yield proj, dict(env, DOPY_DAEMON="1")
+    server.terminate()
+    server.wait(5)
+
+
+def _client(proj, env, *argv):
+    code = "import sys; from dopy.cli import main; sys.exit(main(sys.argv[1:]))"
+    return subprocess.run(
+        [sys.executable, "-c", code, *argv],
+        cwd=proj,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+
+
+def test_forward_without_daemon_returns_none(tmp_path, monkeypatch):
+    monkeypatch.setattr(daemon, "DOPY_HOME", str(tmp_path))
+    assert daemon.forward(["anything"]) is None
+    assert not daemon.is_running()
+
+
+def test_socket_is_private(served):
+    assert os.stat(daemon.socket_path()).st_mode & 0o777 == 0o600
+
+
+def test_silent_clients_time_out(monkeypatch):
+    monkeypatch.setattr(daemon, "REQUEST_TIMEOUT", 0.1)
+    client, conn = socket.socketpair()
+    with client, conn, pytest.raises(TimeoutError):
+        daemon.Server("unused").handle(conn)
+
+
+def test_requests_run_in_the_daemon(served):
+    proj, env = served
+    first = _client(proj, dict(env, MARK="one"), "where")
+    second = _client(proj, dict(env, MARK="two"), "where")
+    assert first.returncode == 0, first.stderr
+    _, pid1, _, cwd, mark1 = first.stdout.split()
+    _, pid2, _, _, mark2 = second.stdout.split()
+    # Each request runs in its own forked child, with the client's cwd/env.
+    assert pid1 != pid2
+    assert cwd == str(proj)
+    assert (mark1, mark2) == ("one", "two")
+
+
+def test_exit_code_and_errors_are_forwarded(served):
+    proj, env = served
+    assert _client(proj, env, "where", "code=3").returncode == 3
+    missing = _client(proj, env, "nope")
+    assert missing.returncode == 1
+    assert "not found" in missing.stdout
+
+
+def test_changed_do_py_is_reloaded(served):
+    proj, env = served
+    assert _client(proj, env, "where").returncode == 0
+    do_py = proj / "do.py"
+    do_py.write_text(do_py.read_text() + "\n@command\ndef added():\n    print('new')\n")
+    result = _client(proj, env, "added")
+    assert result.stdout.strip() == "new"
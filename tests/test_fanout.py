@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+
+from dopy.command import COMMANDS, DEPENDENCIES, OPTIONS, command, echo
+from dopy.command_utils import parse_args
+from dopy.exception import FanOutException
+from dopy.output import capture, routed
+
+NAMES = ("_double", "_deploy", "_nap", "_fail_some", "_shout")
+
+
+@pytest.fixture(autouse=True)
+def cleanup():
+    yield
+    for name in NAMES:
+        for registry in (COMMANDS, DEPENDENCIES, OPTIONS):
+            registry.pop(name, None)
+
+
+def test_map_expands_a_cli_list_and_converts_each_element():
+    @command(map="n")
+    def _double(n: int):
+        return n * 2
+
+    [(fn, args, kwargs)] = parse_args(["_double", "n=1,2,3"])
+    assert kwargs == {"n": [1, 2, 3]}
+    assert fn(*args, **kwargs) == [2, 4, 6]
+    assert _double(5) == 10
+
+
+def test_map_works_for_positional_arguments():
+    @command(map="region")
+    def _deploy(env: str, region: str):
+        return f"{env}-{region}"
+
+    [(fn, args, kwargs)] = parse_args(["_deploy", "prod", "eu,us"])
+    assert fn(*args, **kwargs) == ["prod-eu", "prod-us"]
+
+
+def test_map_runs_elements_in_parallel_up_to_map_jobs():
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    @command(map="n", map_jobs=2)
+    def _nap(n: int):
+        with lock:
+            active.append(n)
+            peak.append(len(active))
+        time.sleep(0.1)
+        with lock:
+            active.remove(n)
+        return n
+
+    assert _nap([1, 2, 3, 4]) == [1, 2, 3, 4]
+    assert max(peak) == 2
+
+
+def test_map_aggregates_failures_after_running_every_element():
+    ran = []
+
+    @command(map="n")
+    def _fail_some(n: int):
+        ran.append(n)
+        if n % 2:
+            raise ValueError(f"odd {n}")
+        return n
+
+    with pytest.raises(FanOutException, match="2 of 4 runs of '_fail_some'") as info:
+        _fail_some([1, 2, 3, 4])
+    assert sorted(ran) == [1, 2, 3, 4]
+    assert [value for value, _ in info.value.errors] == [1, 3]
+    assert info.value.results == [None, 2, None, 4]
+
+
+def test_map_prints_each_elements_output_as_one_block():
+    @echo(map="word")
+    def _shout(word: str):
+        time.sleep(0.05 if word == "a" else 0)
+        print(f"{word}1")
+        return f"{word}2"
+
+    with routed(), capture() as buffer:
+        _shout(["a", "b"])
+    assert buffer.getvalue() == "b1\nb2\na1\na2\n"
+
+
+def test_map_needs_an_existing_parameter():
+    with pytest.raises(ValueError, match="no parameter"):
+
+        @command(map="missing")
+        def _double(n: int):
+            return n
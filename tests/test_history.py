@@ -0,0 +1,112 @@
+import time
+
+import pytest
+
+from dopy import history, scheduler
+from dopy.command import COMMANDS, DEPENDENCIES, OPTIONS, command, sh
+from dopy.command_utils import execute_command
+from dopy.history import Run
+
+
+@pytest.fixture(autouse=True)
+def home(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, "DOPY_HOME", str(tmp_path))
+    monkeypatch.setattr(history, "_estimates", None)
+    monkeypatch.setattr(history, "_pending", [])
+    yield
+    for registry in (COMMANDS, DEPENDENCIES, OPTIONS):
+        for name in ("_step", "_broken", "_alloc"):
+            registry.pop(name, None)
+
+
+def run(command, started, duration, status=0):
+    return Run(command, "", started, duration, status, 0, 0.0)
+
+
+def test_estimate_is_the_median_of_recent_successful_runs(monkeypatch):
+    monkeypatch.setattr(history, "SAMPLES", 3)
+    history.record(
+        [
+            run("build", 1.0, 100.0),
+            run("build", 2.0, 4.0),
+            run("build", 3.0, 2.0),
+            run("build", 4.0, 3.0),
+            run("build", 5.0, 50.0, status=1),
+        ]
+    )
+    assert history.estimate("build") == 3.0
+    assert history.estimate("test") is None
+
+
+def test_store_is_compacted(monkeypatch):
+    monkeypatch.setattr(history, "KEEP", 2)
+    monkeypatch.setattr(history, "COMPACT_EVERY", 4)
+    history.record([run("a", float(i), float(i)) for i in range(3)])
+    assert history.estimates() == {"a": 1.0}
+    history.record([run("a", 3.0, 3.0), run("b", 0.0, 1.0)])
+    assert history.estimates() == {"a": 2.5, "b": 1.0}
+
+
+def test_calls_are_recorded_with_arguments_and_resources():
+    @command
+    def _step(n: int):
+        pass
+
+    @command
+    def _broken():
+        raise RuntimeError("boom")
+
+    @sh
+    def _alloc():
+        return "python3 -c 'x = bytearray(64 << 20); sum(range(10**6))'"
+
+    task = scheduler.Task(_step, [1], {})
+    assert scheduler.estimate_cost(task) == scheduler.DEFAULT_COST
+    scheduler.run_commands([(_step, [1], {}), (_step, [2], {}), (_alloc, [], {})])
+    with pytest.raises(RuntimeError):
+        scheduler.run_commands([(_broken, [], {})])
+    history.flush()
+    assert scheduler.estimate_cost(task) < 1.0
+
+    conn = history._connect()
+    rows = conn.execute("SELECT * FROM runs ORDER BY started").fetchall()
+    conn.close()
+    runs = [Run(*row) for row in rows]
+    assert [(r.command, r.status) for r in runs] == [
+        ("_step", 0),
+        ("_step", 0),
+        ("_alloc", 0),
+        ("_broken", 1),
+    ]
+    assert runs[0].args == history.args_hash((1,), {})
+    assert runs[0].args != runs[1].args
+    assert runs[2].rss > 64 << 20
+    assert runs[2].child_cpu > 0
+
+
+def test_recording_is_cheap():
+    @command
+    def _step():
+        pass
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        execute_command(_step)
+    history.flush()
+    assert (time.perf_counter() - start) / 1000 < 1e-3
+
+
+def test_stats_report_percentiles_and_regressions():
+    history.record([run("fast", float(i), float(10 - i % 10)) for i in range(100)])
+    history.record(
+        [run("slow", float(i), 1.0) for i in range(20)]
+        + [run("slow", 20.0 + i, 2.0) for i in range(3)]
+        + [run("slow", 30.0, 9.0, status=1)]
+    )
+    fast, slow = history.stats()
+    assert (fast.p50, fast.p95, fast.p99) == (5.0, 10.0, 10.0)
+    assert not fast.regressed
+    assert (slow.runs, slow.failures, slow.last) == (24, 1, 2.0)
+    assert slow.baseline == 1.0
+    assert slow.regressed
+    assert [row.command for row in history.stats(["slow"])] == ["slow"]
@@ -0,0 +1,128 @@
+import os
+
+import pytest
+
+from dopy import incremental as inc
+from dopy.command import COMMANDS, OPTIONS, command, sh
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "a.txt").write_text("a")
+    (tmp_path / "src" / "nested").mkdir()
+    (tmp_path / "src" / "nested" / "b.txt").write_text("b")
+    yield tmp_path
+    for name in ("_build", "_stamp", "_shell"):
+        COMMANDS.pop(name, None)
+        OPTIONS.pop(name, None)
+
+
+def test_fingerprint_walks_directories_and_globs(project):
+    by_dir = inc.fingerprint(["src"])
+    by_glob = inc.fingerprint(["src/**/*.txt"])
+    assert set(by_dir) == {"src/a.txt", os.path.join("src", "nested", "b.txt")}
+    assert set(by_glob) == set(by_dir)
+
+
+def test_fingerprint_reuses_hash_when_stat_matches(project, monkeypatch):
+    first = inc.fingerprint(["src"])
+    monkeypatch.setattr(inc, "_hash_file", lambda path: pytest.fail("rehashed"))
+    assert inc.fingerprint(["src"], first) == first
+
+
+def test_invocation_key_ignores_set_order():
+    def f(tags):
+        pass
+
+    assert inc.invocation_key(f, ({"a", "b", "c"},), {}) == inc.invocation_key(
+        f, ({"c", "b", "a"},), {}
+    )
+    assert inc.invocation_key(f, (1,), {}) != inc.invocation_key(f, (2,), {})
+
+
+def test_command_skipped_until_inputs_change(project, capsys):
+    runs = []
+
+    @command(inputs=["src/**/*.txt"], outputs="out.txt")
+    def _build(flavour: str = "plain"):
+        runs.append(flavour)
+        (project / "out.txt").write_text("built")
+
+    _build()
+    _build()
+    assert runs == ["plain"]
+    assert "'_build' is up to date" in capsys.readouterr().err
+
+    _build("fancy")
+    assert runs == ["plain", "fancy"]
+
+    (project / "src" / "a.txt").write_text("changed")
+    _build("fancy")
+    assert runs == ["plain", "fancy", "fancy"]
+
+    (project / "out.txt").unlink()
+    _build("fancy")
+    assert len(runs) == 4
+
+
+def test_input_edited_during_the_run_is_not_recorded(project):
+    runs = []
+
+    @command(inputs="src/a.txt", outputs="out.txt")
+    def _build():
+        runs.append(1)
+        (project / "out.txt").write_text("built")
+        (project / "src" / "a.txt").write_text("edited meanwhile")
+
+    _build()
+    _build()
+    assert len(runs) == 2
+
+
+def test_touch_without_content_change_is_up_to_date(project):
+    runs = []
+
+    @command(inputs="src")
+    def _stamp():
+        runs.append(1)
+
+    _stamp()
+    st = os.stat("src/a.txt")
+    os.utime("src/a.txt", ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    _stamp()
+    assert runs == [1]
+
+
+def test_failed_run_is_not_recorded(project):
+    calls = []
+
+    @command(inputs="src")
+    def _stamp():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("first run fails")
+
+    with pytest.raises(RuntimeError):
+        _stamp()
+    _stamp()
+    _stamp()
+    assert len(calls) == 2
+
+
+def test_sh_with_outputs(project):
+    @sh(outputs="made.txt")
+    def _shell():
+        return "echo made > made.txt"
+
+    assert _shell() == "echo made > made.txt"
+    assert _shell() is None
+
+
+def test_unknown_option_is_rejected():
+    with pytest.raises(TypeError, match="inptus"):
+
+        @command(inptus="src")
+        def _build():
+            pass
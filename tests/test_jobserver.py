@@ -0,0 +1,93 @@
+import shutil
+import threading
+import time
+
+import pytest
+
+from dopy import jobserver, scheduler
+from dopy.command import COMMANDS, DEPENDENCIES, OPTIONS, sh
+from dopy.jobserver import IMPLICIT, create, from_makeflags
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch):
+    # Ignore a jobserver of a make running the tests.
+    monkeypatch.setattr(jobserver, "_parsed", True)
+    monkeypatch.setattr(jobserver, "_inherited", None)
+    monkeypatch.setattr(jobserver, "POLL_INTERVAL", 0.01)
+    yield
+    for name in ("_nested",):
+        for registry in (COMMANDS, DEPENDENCIES, OPTIONS):
+            registry.pop(name, None)
+
+
+def test_makeflags_are_merged():
+    assert jobserver._makeflags("", 4, 3, 4) == "-j4 --jobserver-auth=3,4"
+    assert (
+        jobserver._makeflags("ks -j2 --jobserver-auth=7,8 -- X=1", 3, 5, 6)
+        == "-j3 --jobserver-auth=5,6 -ks -- X=1"
+    )
+
+
+def test_tokens_are_shared_with_joined_clients():
+    server = create(3)
+    client = from_makeflags(server.makeflags)
+    try:
+        assert client is not None
+        assert client.child_fds == server.child_fds
+        tokens = [server.acquire(), client.acquire(), client.acquire()]
+        assert tokens == [IMPLICIT, IMPLICIT, b"+"]
+        # Two slots besides the implicit one: the pool is now empty.
+        assert server.acquire() == b"+"
+        stop = threading.Event()
+        stop.set()
+        assert server.acquire(stop) is None
+        client.release(tokens[2])
+        assert server.acquire(stop) == b"+"
+    finally:
+        server.close()
+    assert from_makeflags("-j2 --jobserver-auth=99,98") is None
+    assert from_makeflags("-j2 --jobserver-auth=fifo:/nonexistent") is None
+
+
+def test_waiting_for_a_slot_stops():
+    server = create(1)
+    try:
+        assert server.acquire() == IMPLICIT
+        stop = threading.Event()
+        threading.Timer(0.05, stop.set).start()
+        with server.slot(stop) as free:
+            assert not free
+    finally:
+        server.close()
+
+
+@pytest.mark.skipif(shutil.which("make") is None, reason="needs GNU make")
+def test_nested_make_shares_the_slots(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    targets = " ".join(f"t{i}" for i in range(6))
+    (tmp_path / "Makefile").write_text(
+        f"all: {targets}\n"
+        f"{targets}:\n"
+        "\t@echo start $$(date +%s.%N) >> log; sleep 0.2;"
+        " echo end $$(date +%s.%N) >> log\n"
+    )
+
+    @sh
+    def _nested(n: int):
+        return "make -s"
+
+    start = time.monotonic()
+    scheduler.run_commands([(_nested, [n], {}) for n in range(2)], jobs=3)
+    events = []
+    with open("log") as log:
+        for line in log:
+            kind, stamp = line.split()
+            events.append((float(stamp), 1 if kind == "start" else -1))
+    running = peak = 0
+    for _, change in sorted(events):
+        running += change
+        peak = max(peak, running)
+    assert len(events) == 24
+    assert peak <= 3
+    assert time.monotonic() - start >= 0.2 * 12 / 3
@@ -0,0 +1,110 @@
+import time
+
+import pytest
+
+from dopy import memo
+from dopy.command import COMMANDS, OPTIONS, command
+
+
+@pytest.fixture(autouse=True)
+def home(tmp_path, monkeypatch):
+    monkeypatch.setattr(memo, "DOPY_HOME", str(tmp_path))
+    monkeypatch.setattr(memo, "_caches", {})
+    yield tmp_path
+    COMMANDS.pop("_cached", None)
+    OPTIONS.pop("_cached", None)
+
+
+def counting():
+    calls = []
+
+    def f(x):
+        calls.append(x)
+        return x * 2
+
+    return f, calls
+
+
+def test_memory_cache_reuses_results():
+    f, calls = counting()
+    cached = memo.memoize(f, "f")
+    assert [cached(1), cached(1), cached(2)] == [2, 2, 4]
+    assert calls == [1, 2]
+
+
+def test_memory_cache_evicts_least_recently_used():
+    f, calls = counting()
+    cached = memo.memoize(f, "f", maxsize=2)
+    cached(1), cached(2), cached(1), cached(3), cached(1), cached(2)
+    assert calls == [1, 2, 3, 2]
+
+
+def test_ttl_expires_entries(monkeypatch):
+    f, calls = counting()
+    cached = memo.memoize(f, "f", ttl=10)
+    now = time.time()
+    monkeypatch.setattr(memo.time, "time", lambda: now)
+    cached(1)
+    monkeypatch.setattr(memo.time, "time", lambda: now + 11)
+    cached(1)
+    assert calls == [1, 1]
+
+
+def test_disk_cache_survives_a_new_process():
+    f, calls = counting()
+    memo.memoize(f, "f", "disk")(1)
+    memo._caches.clear()
+    assert memo.memoize(f, "f", "disk")(1) == 2
+    assert calls == [1]
+    assert memo.stats() == [("f", 1, memo.stats()[0][2], 1, 1)]
+
+
+def test_disk_cache_is_size_bounded():
+    f, calls = counting()
+    cached = memo.memoize(f, "f", "disk", maxsize=2)
+    for x in (1, 2, 3):
+        cached(x)
+    assert memo.stats()[0][1] == 2
+
+
+def test_exceptions_are_not_cached():
+    calls = []
+
+    def f():
+        calls.append(1)
+        raise ValueError("boom")
+
+    cached = memo.memoize(f, "f")
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            cached()
+    assert len(calls) == 2
+
+
+def test_clear_drops_everything():
+    f, calls = counting()
+    cached = memo.memoize(f, "f", "disk")
+    cached(1)
+    memo.clear()
+    cached(1)
+    assert calls == [1, 1]
+
+
+def test_invalid_cache_option():
+    with pytest.raises(ValueError, match="Invalid cache option"):
+        memo.memoize(lambda: None, "f", "redis")
+    with pytest.raises(ValueError, match="Invalid cache_maxsize"):
+        memo.memoize(lambda: None, "f", maxsize=0)
+
+
+def test_command_option_memoizes_the_body():
+    calls = []
+
+    @command(cache=True)
+    def _cached(n: int):
+        calls.append(n)
+        return n
+
+    COMMANDS["_cached"](3)
+    COMMANDS["_cached"](3)
+    assert calls == [3]
@@ -0,0 +1,85 @@
+import io
+
+import pytest
+
+from dopy import output, scheduler
+from dopy.command import COMMANDS, echo, sh
+from dopy.output import LineSink, Router, Spool, routing
+
+
+@pytest.fixture(autouse=True)
+def clean_commands():
+    yield
+    for name in ("_words", "_sh_words"):
+        COMMANDS.pop(name, None)
+
+
+def test_spool_spills_to_a_file(monkeypatch):
+    monkeypatch.setattr(output, "SPILL_SIZE", 10)
+    spool = Spool()
+    spool.write("a" * 8)
+    assert not spool.file._rolled
+    spool.write("b" * 8)
+    assert spool.file._rolled
+    stream = io.StringIO()
+    spool.replay(stream)
+    assert stream.getvalue() == spool.getvalue() == "a" * 8 + "b" * 8
+
+
+def test_line_sink_prefixes_complete_lines():
+    stream = io.StringIO()
+    sink = LineSink(stream, "[t] ")
+    sink.write("one\ntw")
+    assert stream.getvalue() == "[t] one\n"
+    sink.write("o\nthree")
+    sink.close()
+    assert stream.getvalue() == "[t] one\n[t] two\n[t] three\n"
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError, match="Unknown output mode"):
+        Router("fancy")
+
+
+def test_prefix_mode_labels_parallel_output(capsys):
+    @echo
+    def _words(word: str):
+        return f"{word}\n{word}"
+
+    @sh
+    def _sh_words():
+        return "echo shell"
+
+    with routing("prefix"):
+        scheduler.run_commands(
+            [(_words, ["a"], {}), (_words, ["b"], {}), (_sh_words, [], {})], jobs=3
+        )
+    lines = capsys.readouterr().out.splitlines()
+    assert (
+        sorted(lines) == ["[_sh_words] shell"] + ["[_words] a"] * 2 + ["[_words] b"] * 2
+    )
+
+
+def test_log_dir_keeps_one_file_per_task(tmp_path, capsys):
+    @echo
+    def _words(word: str):
+        return word
+
+    log_dir = tmp_path / "logs"
+    with routing("group", str(log_dir)):
+        scheduler.run_commands([(_words, ["a"], {}), (_words, ["b"], {})], jobs=2)
+    assert sorted(capsys.readouterr().out.split()) == ["a", "b"]
+    logs = {p.name: p.read_text() for p in log_dir.iterdir()}
+    assert sorted(logs) == ["_words.2.log", "_words.log"]
+    assert sorted(logs.values()) == ["a\n", "b\n"]
+
+
+def test_log_dir_tees_sequential_output(tmp_path, capsys):
+    @echo
+    def _words(word: str):
+        return word
+
+    with routing("group", str(tmp_path)):
+        scheduler.run_commands([(_words, ["a"], {})])
+    assert capsys.readouterr().out == "a\n"
+    assert (tmp_path / "_words.log").read_text() == "a\n"
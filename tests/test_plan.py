@@ -0,0 +1,87 @@
+import pytest
+
+from dopy import history
+from dopy.history import Run
+from dopy.command import COMMANDS, DEPENDENCIES, OPTIONS, command, sh
+from dopy.plan import format_duration, format_plan
+
+NAMES = ("_compile", "_deploy", "_notify")
+
+
+@pytest.fixture(autouse=True)
+def home(tmp_path, monkeypatch):
+    monkeypatch.setattr(history, "DOPY_HOME", str(tmp_path))
+    monkeypatch.setattr(history, "_estimates", None)
+    monkeypatch.setattr(history, "_pending", [])
+    yield
+    for name in NAMES:
+        for registry in (COMMANDS, DEPENDENCIES, OPTIONS):
+            registry.pop(name, None)
+
+
+def test_format_duration():
+    assert format_duration(0.0123) == "12ms"
+    assert format_duration(4.25) == "4.2s"
+    assert format_duration(754) == "12m 34s"
+    assert format_duration(7300) == "2h 01m"
+
+
+def test_plan_lists_steps_without_running_them():
+    ran = []
+
+    @sh
+    def _compile(target: str = "app"):
+        ran.append(target)
+        return f"make {target}"
+
+    @sh(depends=["_compile"], map="region")
+    def _deploy(region: str, dry: bool = False):
+        return f"./deploy.sh {region}"
+
+    @command
+    def _notify(channel: str):
+        ran.append("notify")
+
+    history.record(
+        [
+            Run("_compile", "", 0.0, 90.0, 0, 0, 0.0),
+            Run("_deploy", "", 0.0, 30.0, 0, 0, 0.0),
+        ]
+    )
+    plan = format_plan(
+        [(_deploy, [["eu", "us"]], {}), (_notify, ["ops"], {})], kwargs={}
+    )
+    lines = plan.splitlines()
+    assert lines[0] == "Plan: 3 steps, ~2m 00s (1 without history)"
+    assert lines[1].startswith("  1. _compile target='app'")
+    assert lines[1].endswith("~1m 30s")
+    assert lines[2] == "       $ make app"
+    assert "_deploy region=['eu', 'us'] dry=False" in lines[3]
+    assert lines[4:6] == ["       $ ./deploy.sh eu", "       $ ./deploy.sh us"]
+    assert lines[6].startswith("  3. _notify channel='ops'")
+    assert lines[6].endswith("?")
+    assert ran == ["app"]
+
+
+def test_parallel_plan_shows_the_critical_path():
+    @command
+    def _compile():
+        pass
+
+    @command(depends=["_compile"])
+    def _deploy():
+        pass
+
+    @command
+    def _notify():
+        pass
+
+    history.record(
+        [
+            Run("_compile", "", 0.0, 10.0, 0, 0, 0.0),
+            Run("_deploy", "", 0.0, 5.0, 0, 0, 0.0),
+            Run("_notify", "", 0.0, 12.0, 0, 0, 0.0),
+        ]
+    )
+    plan = format_plan([(_deploy, [], {}), (_notify, [], {})], jobs=4)
+    assert plan.startswith("Plan: 3 steps, ~15.0s with -j 4\n")
@@ -0,0 +1,92 @@
+import os
+from textwrap import dedent
+
+import pytest
+
+from dopy import pool
+from dopy.command import COMMANDS, DEPENDENCIES, OPTIONS, command
+from dopy.command_loader import _load_module_from_path
+from dopy.exception import DopyException, InvalidCommandArgumentsException
+from dopy.output import capture, routed
+
+NAMES = ("_pid", "_square", "_boom", "_shout", "_nested")
+
+SOURCE = """
+import os
+from dopy import command, echo
+
+@command(executor="process")
+def _pid():
+    return os.getpid()
+
+@command(executor="process")
+def _square(n: int):
+    return n * n
+
+@command(executor="process")
+def _boom():
+    raise KeyError("missing")
+
+@echo(executor="process")
+def _shout(word: str):
+    print("working")
+    return word.upper()
+"""
+
+
+@pytest.fixture(scope="module", autouse=True)
+def stop_pool():
+    yield
+    pool.shutdown()
+
+
+@pytest.fixture(autouse=True)
+def commands(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "tasks.py").write_text(dedent(SOURCE))
+    _load_module_from_path(str(tmp_path / "tasks.py"), "pool_tasks")
+    yield
+    for name in NAMES:
+        for registry in (COMMANDS, DEPENDENCIES, OPTIONS):
+            registry.pop(name, None)
+
+
+def test_process_command_runs_in_a_worker():
+    assert COMMANDS["_square"](7) == 49
+    assert COMMANDS["_pid"]() != os.getpid()
+
+
+def test_worker_output_reaches_the_callers_sink():
+    with routed(), capture() as buffer:
+        assert COMMANDS["_shout"]("hey") == "HEY"
+    assert buffer.getvalue() == "working\nHEY\n"
+
+
+def test_worker_errors_are_mapped():
+    with pytest.raises(DopyException, match="KeyError: 'missing'") as info:
+        COMMANDS["_boom"]()
+    assert "Traceback" in info.value.__notes__[0]
+    with pytest.raises(InvalidCommandArgumentsException):
+        COMMANDS["_square"]()
+
+
+def test_unpicklable_arguments_are_rejected():
+    with pytest.raises(InvalidCommandArgumentsException, match="worker process"):
+        COMMANDS["_square"](lambda: 1)
+
+
+def test_commands_outside_a_module_are_reported():
+    @command(executor="process")
+    def _nested():
+        return 1
+
+    with pytest.raises(DopyException, match="top level"):
+        _nested()
+
+
+def test_unknown_executor_is_rejected():
+    with pytest.raises(ValueError, match="unknown executor"):
+
+        @command(executor="gpu")
+        def _nested():
+            return 1
@@ -0,0 +1,110 @@
+import os
+import subprocess
+import time
+
+import pytest
+
+from dopy import process
+from dopy.command import COMMANDS, sh
+from dopy.output import capture
+
+
+def test_exit_code_is_decoded():
+    assert process.run_shell("exit 3").returncode == 3
+    assert process.run_shell("true").returncode == 0
+
+
+def test_killed_by_signal_is_a_failure():
+    result = process.run_shell("kill -9 $$")
+    assert result.returncode == -9
+
+
+def test_capture_returns_output_and_timing():
+    result = process.run_shell("echo hello; echo oops >&2", capture=True)
+    assert result == "echo hello; echo oops >&2"
+    assert result.output == "hello\n"
+    assert result.duration >= 0
+    assert result.rusage is not None
+
+
+def test_large_capture_spills_to_disk():
+    size = process.CAPTURE_MEMORY_LIMIT * 2
+    result = process.run_shell(f"head -c {size} /dev/zero", capture=True)
+    assert result._output._rolled
+    with result.open_output() as f:
+        assert sum(len(chunk) for chunk in iter(lambda: f.read(65536), b"")) == size
+
+
+def test_output_without_capture_raises():
+    with pytest.raises(ValueError):
+        _ = process.run_shell("true").output
+
+
+def test_env_and_cwd(tmp_path):
+    result = process.run_shell(
+        "echo $DOPY_TEST_VAR; pwd",
+        capture=True,
+        env={"DOPY_TEST_VAR": "from-env"},
+        cwd=tmp_path,
+    )
+    assert result.output.split() == ["from-env", str(tmp_path)]
+
+
+def test_timeout_kills_the_process_group(tmp_path):
+    marker = tmp_path / "marker"
+    start = time.monotonic()
+    with pytest.raises(subprocess.TimeoutExpired):
+        process.run_shell(f"(sleep 1; touch {marker}) & sleep 30", timeout=0.2)
+    assert time.monotonic() - start < 5
+    time.sleep(1.2)
+    # The background child was part of the group and died with it.
+    assert not marker.exists()
+
+
+def test_terminal_commands_keep_the_session(tmp_path):
+    script = "import os; print(os.getsid(0), os.getpgid(0))"
+    process.run_shell(f'python -c "{script}" > ids', cwd=str(tmp_path))
+    sid, pgid = map(int, (tmp_path / "ids").read_text().split())
+    assert sid == os.getsid(0)
+    assert pgid != os.getpgid(0)
+
+    captured = process.run_shell(f'python -c "{script}"', capture=True)
+    assert int(captured.output.split()[0]) != os.getsid(0)
+
+
+def test_sink_receives_streamed_output():
+    with capture() as buffer:
+        process.run_shell("echo out; echo err >&2")
+    assert sorted(buffer.getvalue().split()) == ["err", "out"]
+
+
+def test_sh_options_and_failure():
+    COMMANDS.pop("_sh_opts", None)
+
+    @sh(capture=True, env={"WHO": "dopy"})
+    def _sh_opts(code: int = 0):
+        return f"echo hi $WHO; exit {code}"
+
+    try:
+        assert _sh_opts().output == "hi dopy\n"
+        with pytest.raises(RuntimeError, match="exit code 4"):
+            _sh_opts(4)
+    finally:
+        COMMANDS.pop("_sh_opts", None)
+
+
+def test_terminate_running_stops_commands():
+    import threading
+
+    results = []
+    thread = threading.Thread(
+        target=lambda: results.append(process.run_shell("sleep 30", capture=True))
+    )
+    thread.start()
+    deadline = time.monotonic() + 5
+    while not process._running and time.monotonic() < deadline:
+        time.sleep(0.01)
+    process.terminate_running()
+    thread.join(5)
+    assert results and results[0].returncode != 0
+    assert not process._running
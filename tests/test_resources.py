@@ -0,0 +1,139 @@
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from dopy import history, resources, scheduler
+from dopy.command import COMMANDS, DEPENDENCIES, OPTIONS, command
+from dopy.resources import NamedLock, parse_size, requirements
+
+NAMES = ("_heavy", "_light", "_locked")
+
+
+@pytest.fixture(autouse=True)
+def home(tmp_path, monkeypatch):
+    monkeypatch.setattr(resources, "DOPY_HOME", str(tmp_path))
+    monkeypatch.setattr(history, "DOPY_HOME", str(tmp_path))
+    monkeypatch.setattr(scheduler, "POLL_INTERVAL", 0.01)
+    yield
+    for name in NAMES:
+        for registry in (COMMANDS, DEPENDENCIES, OPTIONS):
+            registry.pop(name, None)
+
+
+class Gauge:
+    """Tracks how many commands run at the same time."""
+
+    def __init__(self):
+        self.now = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, seconds=0.05):
+        with self.lock:
+            self.now += 1
+            self.peak = max(self.peak, self.now)
+        time.sleep(seconds)
+        with self.lock:
+            self.now -= 1
+
+
+def test_parse_size_and_requirements():
+    assert parse_size("512M") == 512 << 20
+    assert parse_size("1.5GiB") == 3 << 29
+    assert parse_size(100) == 100
+    assert requirements({"cpus": 2, "mem": "1K", "lock": "db"}) == (2, 1024, ("db",))
+    with pytest.raises(ValueError, match="Command '_heavy'.*Invalid memory size"):
+
+        @command(mem="lots")
+        def _heavy():
+            pass
+
+
+def test_tasks_are_admitted_into_the_available_cores(monkeypatch):
+    monkeypatch.setattr(resources, "available_cpus", lambda: 4)
+    heavy, light = Gauge(), Gauge()
+
+    @command(cpus=3)
+    def _heavy(n: int):
+        heavy()
+
+    @command
+    def _light(n: int):
+        light()
+
+    scheduler.run_commands([(_heavy, [n], {}) for n in range(3)], jobs=8)
+    assert heavy.peak == 1
+    # With -j 0 the cores are the only limit.
+    scheduler.run_commands([(_light, [n], {}) for n in range(8)], jobs=0)
+    assert light.peak == 4
+
+
+def test_memory_is_reserved(monkeypatch):
+    monkeypatch.setattr(resources, "available_memory", lambda: 10 << 30)
+    gauge = Gauge()
+
+    @command(mem="6G")
+    def _heavy(n: int):
+        gauge()
+
+    @command(mem="64G")
+    def _light():
+        gauge()
+
+    scheduler.run_commands([(_heavy, [n], {}) for n in range(3)], jobs=3)
+    assert gauge.peak == 1
+    # Too big for the machine: still runs, alone.
+    scheduler.run_commands([(_light, [], {})], jobs=3)
+
+
+def test_named_lock_serialises_tasks():
+    gauge = Gauge()
+    free = Gauge()
+
+    @command(lock="db")
+    def _locked(n: int):
+        gauge()
+
+    @command
+    def _light(n: int):
+        free(0.1)
+
+    commands = [(_locked, [n], {}) for n in range(3)]
+    commands += [(_light, [n], {}) for n in range(2)]
+    scheduler.run_commands(commands, jobs=5)
+    assert gauge.peak == 1
+    assert free.peak == 2
+
+
+def test_lock_is_shared_with_other_processes(tmp_path):
+    started = []
+
+    @command(lock="docker")
+    def _locked():
+        started.append(time.monotonic())
+
+    (tmp_path / "locks").mkdir()
+    script = (
+        "import fcntl, sys, time\n"
+        "f = open(sys.argv[1], 'w')\n"
+        "fcntl.flock(f, fcntl.LOCK_EX)\n"
+        "print('locked', flush=True)\n"
+        "time.sleep(0.3)\n"
+    )
+    holder = subprocess.Popen(
+        [sys.executable, "-c", script, resources.lock_path("docker")],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    assert holder.stdout.readline() == "locked\n"
+    begin = time.monotonic()
+    scheduler.run_commands([(_locked, [], {})])
+    scheduler.run_commands([(_locked, [], {})] * 2, jobs=2)
+    holder.wait(5)
+    assert started[0] - begin > 0.15
+    lock = NamedLock("docker")
+    assert lock.acquire(blocking=False)
+    lock.release()
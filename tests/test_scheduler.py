@@ -0,0 +1,291 @@
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from textwrap import dedent
+
+import pytest
+
+from dopy import history, scheduler
+from dopy.command import COMMANDS, DEPENDENCIES, command, sh
+from dopy.exception import CommandNotFoundException, DependencyCycleException
+
+
+@pytest.fixture(autouse=True)
+def clean_commands(tmp_path, monkeypatch):
+    # Costs come from the run history; start every test without any.
+    monkeypatch.setattr(history, "DOPY_HOME", str(tmp_path))
+    monkeypatch.setattr(history, "_estimates", None)
+    yield
+    for name in ("_slow", "_noisy", "_fail", "_late", "_sh_out", "_sh_sleep"):
+        COMMANDS.pop(name, None)
+
+
+def test_sequential_by_default(capsys):
+    order = []
+
+    @command
+    def _slow(n: int):
+        order.append(n)
+
+    scheduler.run_commands([(_slow, [1], {}), (_slow, [2], {}), (_slow, [3], {})])
+    assert order == [1, 2, 3]
+
+
+def test_parallel_commands_overlap():
+    barrier = threading.Barrier(3, timeout=5)
+
+    @command
+    def _slow():
+        # Only passes if all three commands are running at the same time.
+        barrier.wait()
+
+    scheduler.run_commands([(_slow, [], {})] * 3, jobs=3)
+
+
+def test_parallel_output_is_not_interleaved(capsys):
+    @command
+    def _noisy(tag: str):
+        for i in range(20):
+            print(f"{tag}{i}")
+            time.sleep(0.001)
+
+    scheduler.run_commands([(_noisy, ["a"], {}), (_noisy, ["b"], {})], jobs=2)
+    lines = capsys.readouterr().out.split()
+    assert sorted(lines[:20]) == sorted(f"{lines[0][0]}{i}" for i in range(20))
+    assert len(lines) == 40
+
+
+def test_sh_output_is_captured_per_command(capsys):
+    @sh
+    def _sh_out(word: str):
+        return f"echo {word}"
+
+    scheduler.run_commands([(_sh_out, ["one"], {}), (_sh_out, ["two"], {})], jobs=2)
+    assert sorted(capsys.readouterr().out.split()) == ["one", "two"]
+
+
+def test_failure_cancels_remaining_commands(capsys):
+    ran = []
+
+    @command
+    def _fail():
+        print("partial output")
+        raise RuntimeError("boom")
+
+    @command
+    def _late():
+        ran.append(True)
+
+    commands = [(_fail, [], {})] + [(_late, [], {})] * 20
+    with pytest.raises(RuntimeError, match="boom"):
+        scheduler.run_commands(commands, jobs=2)
+    assert len(ran) < 20
+    assert "partial output" in capsys.readouterr().out
+
+
+def test_failure_terminates_running_shell_commands():
+    @sh
+    def _sh_sleep():
+        return "sleep 10"
+
+    @command
+    def _fail():
+        time.sleep(0.2)
+        raise RuntimeError("boom")
+
+    start = time.monotonic()
+    with pytest.raises(RuntimeError, match="boom"):
+        scheduler.run_commands([(_sh_sleep, [], {}), (_fail, [], {})], jobs=2)
+    assert time.monotonic() - start < 5
+    # The killed command is still recorded, after run_commands returned.
+    deadline = time.monotonic() + 5
+    while len(history._pending) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert [run.command for run in history._pending] == ["_fail", "_sh_sleep"]
+
+
+PARALLEL_DO_PY = """
+    import time
+    from dopy import command, sh
+
+    @sh
+    def s1():
+        return "sleep 30"
+
+    @command
+    def p1():
+        time.sleep(30)
+
+    @command
+    def p2():
+        time.sleep(30)
+
+    @command
+    def fail():
+        raise RuntimeError("boom")
+"""
+
+
+def _start_dopy(tmp_path, *argv):
+    (tmp_path / "do.py").write_text(dedent(PARALLEL_DO_PY))
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-c",
+            "import sys; from dopy.cli import main; sys.exit(main())",
+        ]
+        + list(argv),
+        cwd=tmp_path,
+        env=dict(os.environ, PYTHONPATH=root, DOPY_HOME=str(tmp_path / "home")),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+@pytest.mark.parametrize("commands", [["s1", "p1"], ["p1", "p2"]])
+def test_interrupt_stops_a_parallel_run(tmp_path, commands):
+    proc = _start_dopy(tmp_path, "-j", "2", *commands)
+    try:
+        time.sleep(1)
+        start = time.monotonic()
+        proc.send_signal(signal.SIGINT)
+        proc.wait(10)
+        assert time.monotonic() - start < 5
+        assert proc.returncode != 0
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def test_failure_does_not_wait_for_python_commands(tmp_path):
+    proc = _start_dopy(tmp_path, "-j", "2", "p1", "fail")
+    try:
+        start = time.monotonic()
+        proc.wait(20)
+        assert time.monotonic() - start < 10
+        assert proc.returncode == 1
+        assert b"boom" in proc.stdout.read()
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+class TestDependencies:
+    """Test `depends=[...]` and the task graph."""
+
+    @pytest.fixture(autouse=True)
+    def clean(self):
+        yield
+        for name in ("_a", "_b", "_c", "_d", "_env"):
+            COMMANDS.pop(name, None)
+            DEPENDENCIES.pop(name, None)
+
+    def test_decorator_records_edges(self):
+        @command(depends=["_a"])
+        def _b():
+            pass
+
+        assert COMMANDS["_b"] is _b
+        assert DEPENDENCIES["_b"] == ["_a"]
+
+    def test_shared_prerequisite_runs_once(self):
+        ran = []
+
+        @command
+        def _a():
+            ran.append("a")
+
+        @sh(depends=["_a"])
+        def _b():
+            ran.append("b")
+            return "true"
+
+        @command(depends=["_a"])
+        def _c():
+            ran.append("c")
+
+        scheduler.run_commands([(_b, [], {}), (_c, [], {})])
+        assert ran == ["a", "b", "c"]
+
+    def test_explicit_invocation_satisfies_dependency(self):
+        ran = []
+
+        @command(depends=["_a"])
+        def _b():
+            ran.append("b")
+
+        @command
+        def _a():
+            ran.append("a")
+
+        scheduler.run_commands([(_b, [], {}), (_a, [], {})])
+        assert ran == ["a", "b"]
+
+    def test_prerequisites_receive_shared_kwargs(self):
+        seen = []
+
+        @command
+        def _env(env: str = "dev"):
+            seen.append(env)
+
+        @command(depends=["_env"])
+        def _a():
+            pass
+
+        scheduler.run_commands([(_a, [], {})], kwargs={"env": "prod"})
+        assert seen == ["prod"]
+
+    def test_cycle_is_reported(self):
+        @command(depends=["_b"])
+        def _a():
+            pass
+
+        @command(depends=["_a"])
+        def _b():
+            pass
+
+        with pytest.raises(DependencyCycleException, match="_a -> _b -> _a"):
+            scheduler.run_commands([(_a, [], {})])
+
+    def test_unknown_prerequisite(self):
+        @command(depends=["_missing"])
+        def _a():
+            pass
+
+        with pytest.raises(CommandNotFoundException):
+            scheduler.run_commands([(_a, [], {})])
+
+    def test_parallel_respects_edges_and_critical_path(self):
+        ran = []
+        lock = threading.Lock()
+
+        def record(name):
+            with lock:
+                ran.append(name)
+
+        @command
+        def _a():
+            record("a")
+
+        @command(depends=["_a"])
+        def _b():
+            record("b")
+
+        @command(depends=["_b"])
+        def _c():
+            record("c")
+
+        @command
+        def _d():
+            record("d")
+
+        tasks = scheduler.build_graph([(_d, [], {}), (_c, [], {})])
+        scheduler.run_tasks(tasks, jobs=2)
+        assert ran.index("a") < ran.index("b") < ran.index("c")
+        assert sorted(ran) == ["a", "b", "c", "d"]
+        # `_a` starts the longest chain, so it outranks `_d`.
+        assert max(tasks, key=lambda t: t.rank).name == "_a"
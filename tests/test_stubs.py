@@ -0,0 +1,73 @@
+from textwrap import dedent
+
+from dopy.command import COMMANDS, command
+from dopy.command_helper import describe_command
+from dopy.stubs import parse, scan
+
+
+def test_parse_finds_decorated_top_level_functions():
+    entries = parse(
+        dedent("""
+        import dopy
+        from dopy import sh as shell, dopy_command
+
+        @dopy_command
+        def custom(func):
+            return func
+
+        @shell(depends=["x"])
+        def build(target: str, jobs: int = 2, *rest, flag=False, **extra):
+            \"\"\"Build it.
+
+            More text.
+            \"\"\"
+
+        @dopy.echo
+        async def hello():
+            pass
+
+        @custom
+        def styled():
+            pass
+
+        def helper():
+            pass
+
+        @staticmethod
+        def other():
+            pass
+    """)
+    )
+    assert [entry["name"] for entry in entries] == ["build", "hello", "styled"]
+    assert entries[0]["doc"] == "Build it."
+    assert [p["kind"] for p in entries[0]["params"]] == [
+        "POSITIONAL_OR_KEYWORD",
+        "POSITIONAL_OR_KEYWORD",
+        "VAR_POSITIONAL",
+        "KEYWORD_ONLY",
+        "VAR_KEYWORD",
+    ]
+
+
+def test_stub_parameters_match_the_imported_command():
+    source = dedent("""
+        def st_sample(name: str, count: int = 3, *, loud: bool = False):
+            \"\"\"Sample\"\"\"
+    """)
+    namespace: dict = {}
+    exec(source, namespace)
+    try:
+        live = describe_command("st_sample", command(namespace["st_sample"]))
+    finally:
+        COMMANDS.pop("st_sample", None)
+    [stub] = parse("from dopy import command\n@command" + source)
+    assert stub == live
+
+
+def test_scan_skips_files_with_syntax_errors(tmp_path, monkeypatch):
+    from dopy import stubs
+
+    monkeypatch.setattr(stubs, "DOPY_HOME", str(tmp_path))
+    path = tmp_path / "broken.py"
+    path.write_text("def (:\n")
+    assert scan(str(path)) == []
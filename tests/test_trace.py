@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from dopy import trace
+from dopy.command import COMMANDS, DEPENDENCIES, OPTIONS, command, sh
+
+
+@pytest.fixture
+def commands(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    @sh
+    def _inner(code: int = 0):
+        return f"exit {code}"
+
+    @command
+    def _outer():
+        _inner()
+        return "done"
+
+    yield _outer, _inner
+    for name in ("_inner", "_outer"):
+        for registry in (COMMANDS, DEPENDENCIES, OPTIONS):
+            registry.pop(name, None)
+
+
+def test_commands_run_untraced_by_default(commands):
+    outer, _ = commands
+    assert outer() == "done"
+    assert trace._tracer is None
+
+
+def test_nested_calls_are_recorded_with_depth(commands):
+    outer, _ = commands
+    with trace.tracing() as tracer:
+        outer()
+    spans = {span.name: span for span in tracer.spans}
+    assert spans["_outer"].depth == 0
+    assert spans["_inner"].depth == 1
+    assert spans["_outer"].wall >= spans["_inner"].wall
+    assert spans["_inner"].status == 0
+
+
+def test_failing_shell_command_records_exit_status(commands):
+    _, inner = commands
+    with trace.tracing() as tracer, pytest.raises(RuntimeError):
+        inner(3)
+    assert tracer.spans[0].status == 3
+
+
+def test_trace_out_writes_chrome_trace(commands, tmp_path):
+    outer, _ = commands
+    with trace.tracing(trace_out=str(tmp_path / "trace.json")):
+        outer()
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    assert [event["name"] for event in events] == ["_outer", "_inner"]
+    assert all(event["ph"] == "X" and event["dur"] >= 0 for event in events)
+
+
+def test_profile_prints_summary_and_dumps_top_level_calls(
+    commands, tmp_path, capsys
+):
+    outer, _ = commands
+    with trace.tracing(profile=True):
+        outer()
+    summary = capsys.readouterr().err
+    assert "_outer" in summary and "  _inner" in summary
+    assert (tmp_path / trace.PROFILE_DIR / "_outer.prof").exists()
+    assert not (tmp_path / trace.PROFILE_DIR / "_inner.prof").exists()
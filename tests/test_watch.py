@@ -0,0 +1,86 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+from textwrap import dedent
+
+import pytest
+
+from dopy import watch
+from dopy.command import COMMANDS, DEPENDENCIES, OPTIONS, command
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_base_strips_glob_part():
+    assert watch._base(os.path.join("src", "**", "*.py")) == "src"
+    assert watch._base("*.py") == "."
+    assert watch._base("pyproject.toml") == "pyproject.toml"
+
+
+def test_polling_watcher_reports_changes(tmp_path):
+    (tmp_path / "a.txt").write_text("a")
+    (tmp_path / ".git").mkdir()
+    watcher = watch.PollingWatcher([str(tmp_path)], interval=0)
+    (tmp_path / "a.txt").write_text("changed")
+    (tmp_path / "b.txt").write_text("b")
+    (tmp_path / ".git" / "index").write_text("ignored")
+    assert watcher.poll(0) == {str(tmp_path / "a.txt"), str(tmp_path / "b.txt")}
+    assert watcher.poll(0) == set()
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify")
+def test_inotify_watcher_follows_new_directories(tmp_path):
+    with watch.InotifyWatcher([str(tmp_path)]) as watcher:
+        (tmp_path / "pkg").mkdir()
+        assert watcher.poll(1) == set()
+        (tmp_path / "pkg" / "mod.py").write_text("x = 1")
+        changed = watch.settle(watcher, 0.1) | watcher.poll(0)
+        assert str(tmp_path / "pkg" / "mod.py") in changed
+
+
+def test_watched_paths_prefer_declared_inputs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    @command(inputs=["src/**/*.py"], outputs="build/*")
+    def _compile():
+        pass
+
+    try:
+        roots, outputs = watch.watched_paths(["_compile"], {})
+    finally:
+        for registry in (COMMANDS, DEPENDENCIES, OPTIONS):
+            registry.pop("_compile", None)
+    assert roots == ["src"]
+    assert outputs == [str(tmp_path / "build" / "*")]
+
+
+def test_watch_reruns_on_change(tmp_path):
+    (tmp_path / "src").mkdir()
+    (tmp_path / "do.py").write_text(
+        dedent("""
+        from dopy import command
+
+        @command(inputs="src")
+        def show():
+            print("run", open("src/value.txt").read(), flush=True)
+        """)
+    )
+    (tmp_path / "src" / "value.txt").write_text("one")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "dopy", "--watch", "show"],
+        cwd=tmp_path,
+        env=dict(os.environ, PYTHONPATH=ROOT, DOPY_HOME=str(tmp_path / "home")),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+    try:
+        assert proc.stdout.readline().strip() == "run one"
+        time.sleep(0.3)
+        (tmp_path / "src" / "value.txt").write_text("two")
+        assert proc.stdout.readline().strip() == "run two"
+    finally:
+        proc.send_signal(signal.SIGINT)
+        proc.wait(5)
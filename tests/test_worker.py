@@ -0,0 +1,196 @@
+import datetime
+import os
+import pathlib
+import socket
+import subprocess
+import sys
+import threading
+import time
+from textwrap import dedent
+
+import pytest
+
+from dopy import scheduler, worker
+from dopy.command import COMMANDS, DEPENDENCIES, OPTIONS, command, echo, sh
+from dopy.exception import DopyException, InvalidCommandArgumentsException
+from dopy.output import capture, routed
+from dopy.worker import Remote, WorkerLost, WorkerServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NAMES = ("_greet", "_shell", "_slow", "_bad")
+
+
+@pytest.fixture(autouse=True)
+def cleanup(monkeypatch):
+    monkeypatch.setenv(worker.TOKEN_ENV, "s3cret")
+    monkeypatch.setattr(worker, "HEARTBEAT_INTERVAL", 0.05)
+    monkeypatch.setattr(worker, "HEARTBEAT_TIMEOUT", 0.5)
+    yield
+    for name in NAMES:
+        for registry in (COMMANDS, DEPENDENCIES, OPTIONS):
+            registry.pop(name, None)
+
+
+@pytest.fixture
+def start_worker(tmp_path):
+    servers = []
+
+    def start(address=None, slots=2):
+        server = WorkerServer(address or "127.0.0.1:0", slots)
+        server.bind()
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def test_arguments_round_trip():
+    values = [
+        1,
+        "a",
+        [1.5, None],
+        (True,),
+        {"x"},
+        pathlib.Path("a/b"),
+        datetime.datetime(2024, 1, 2, 3, 4),
+        {"k": (1,)},
+    ]
+    assert worker.decode(worker.encode(values)) == values
+    with pytest.raises(InvalidCommandArgumentsException):
+        worker.encode(object())
+
+
+def test_parse_address():
+    assert worker.parse_address("host:80") == (socket.AF_INET, ("host", 80))
+    assert worker.parse_address(":80") == (socket.AF_INET, ("127.0.0.1", 80))
+    assert worker.parse_address("/tmp/w.sock") == (socket.AF_UNIX, "/tmp/w.sock")
+
+
+def test_workers_require_the_shared_token(start_worker, monkeypatch, tmp_path):
+    server = start_worker(str(tmp_path / "w.sock"))
+    assert os.stat(server.address).st_mode & 0o777 == 0o600
+    with pytest.raises(DopyException, match="No worker available.*token"):
+        Remote([server.address], token="wrong")
+    with Remote([server.address], token="s3cret") as remote:
+        assert remote.slots == 2
+
+    monkeypatch.delenv(worker.TOKEN_ENV)
+    with pytest.raises(DopyException, match=worker.TOKEN_ENV):
+        WorkerServer("127.0.0.1:0")
+    with pytest.raises(DopyException, match=worker.TOKEN_ENV):
+        Remote([server.address])
+    assert worker.main([str(tmp_path / "other.sock")]) == 2
+
+
+def test_output_is_streamed_back(start_worker, tmp_path):
+    @echo
+    def _greet(name: str, times: int = 1):
+        return " ".join([f"hi {name}"] * times)
+
+    @sh
+    def _shell():
+        return "echo from shell"
+
+    servers = [start_worker(), start_worker(str(tmp_path / "w.sock"))]
+    with Remote([s.address for s in servers]) as remote:
+        with routed(), capture() as buffer:
+            remote.call("_greet", ["bob"], {"times": 2})
+            remote.call("_shell", [], {})
+    assert buffer.getvalue() == "hi bob hi bob\nfrom shell\n"
+
+
+def test_errors_are_mapped(start_worker):
+    @command
+    def _bad(n: int):
+        raise KeyError(n)
+
+    with Remote([start_worker().address]) as remote:
+        with pytest.raises(DopyException, match="KeyError: 3"):
+            remote.call("_bad", [3], {})
+        with pytest.raises(InvalidCommandArgumentsException):
+            remote.call("_bad", [], {})
+        with pytest.raises(DopyException, match="not found"):
+            remote.call("_missing", [], {})
+
+
+def test_load_is_balanced_across_workers(start_worker):
+    seen = []
+
+    @command
+    def _slow(n: int):
+        seen.append(threading.current_thread().name)
+        time.sleep(0.2)
+
+    servers = [start_worker(slots=2), start_worker(slots=2)]
+    with Remote([s.address for s in servers]) as remote:
+        start = time.monotonic()
+        scheduler.run_commands(
+            [(_slow, [n], {}) for n in range(4)], jobs=remote.slots, remote=remote
+        )
+        assert time.monotonic() - start < 0.6
+        assert sorted(c.slots for c in remote.connections) == [2, 2]
+    assert len(seen) == 4
+
+
+def test_lost_worker_is_retried_elsewhere(start_worker):
+    @command
+    def _slow():
+        time.sleep(0.3)
+
+    first, second = start_worker(), start_worker()
+    with Remote([first.address, second.address]) as remote:
+        threading.Timer(0.05, first.stop).start()
+        remote.call("_slow", [], {})
+        assert [c.alive for c in remote.connections] == [False, True]
+
+
+def test_silent_worker_times_out(start_worker):
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+    address = "127.0.0.1:%d" % listener.getsockname()[1]
+
+    def hang():
+        conn, _ = listener.accept()
+        worker.send_frame(conn, {"type": "hello", "slots": 1}, threading.Lock())
+        time.sleep(2)
+        conn.close()
+
+    threading.Thread(target=hang, daemon=True).start()
+    with Remote([address], retries=0) as remote:
+        with pytest.raises(WorkerLost, match="stopped answering"):
+            remote.call("_anything", [], {})
+    listener.close()
+
+
+def test_worker_process_serves_its_project(tmp_path):
+    (tmp_path / "do.py").write_text(
+        dedent("""
+        from dopy import echo
+
+        @echo
+        def double(n: int):
+            return n * 2
+    """)
+    )
+    address = str(tmp_path / "worker.sock")
+    code = "import sys; from dopy.cli import main; sys.exit(main())"
+    proc = subprocess.Popen(
+        [sys.executable, "-c", code, "worker", address, "1"],
+        cwd=tmp_path,
+        env=dict(os.environ, PYTHONPATH=ROOT, DOPY_HOME=str(tmp_path / "home")),
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    try:
+        assert proc.stdout.readline().startswith("dopy worker listening")
+        with Remote([address]) as remote:
+            with routed(), capture() as buffer:
+                remote.call("double", [21], {})
+        assert buffer.getvalue() == "42\n"
+    finally:
+        proc.terminate()
+        proc.wait(5)